@@ -0,0 +1,91 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# 统计CLI冷启动：从开始导入到主菜单可以显示的时间，以及后台加载GameManager完成的时间
+# 用法: python -m benchmarks.import_time --runs 10
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+from src import config
+config.save_dir = sys.argv[1]
+config.story_pool_size = 0
+from src.main_cli import create_ui
+ui = create_ui()
+menu = time.perf_counter() - started
+ui.game_manager
+ready = time.perf_counter() - started
+print(json.dumps({"menu": menu, "game_manager": ready}))
+"""
+
+
+def run_child(code: list, *args) -> str:
+    return subprocess.run([sys.executable, *code, *args], cwd=ROOT, check=True, capture_output=True,
+                          text=True).stdout
+
+
+def timed_process(code: list) -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, *code], cwd=ROOT, check=True, capture_output=True)
+    return time.perf_counter() - started
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2] if values else None
+
+
+def slowest_imports(module: str, top: int) -> list:
+    # -X importtime的累计时间，找出主菜单路径上最慢的模块
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT, check=True,
+                            capture_output=True, text=True).stderr
+    rows = []
+    for line in output.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        rows.append((int(parts[1]) / 1000, parts[2].strip()))
+    rows.sort(reverse=True)
+    return [{"module": name, "cumulative_ms": ms} for ms, name in rows[:top]]
+
+
+def run(args) -> dict:
+    menu, ready, startup = [], [], []
+    with tempfile.TemporaryDirectory(prefix="il-import-") as save_dir:
+        for _ in range(args.runs):
+            result = json.loads(run_child(["-c", CHILD], save_dir))
+            menu.append(result["menu"] * 1000)
+            ready.append(result["game_manager"] * 1000)
+            startup.append(timed_process(["-c", "pass"]) * 1000)
+    report = {
+        "runs": args.runs,
+        "interpreter_startup_ms": median(startup),
+        "menu_ms": median(menu),
+        "game_manager_ready_ms": median(ready),
+        "target_ms": args.target_ms,
+        "within_target": median(menu) <= args.target_ms,
+        "slowest_menu_imports": slowest_imports("src.main_cli", args.top),
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CLI cold start benchmark")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--target-ms", type=float, default=200.0, help="budget for import to main menu")
+    parser.add_argument("--top", type=int, default=10, help="number of slowest imports to report")
+    args = parser.parse_args()
+    report = run(args)
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report["within_target"] else 1)
+
+
+if __name__ == '__main__':
+    main()
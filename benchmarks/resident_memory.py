@@ -0,0 +1,108 @@
+import argparse
+import gc
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from src import config
+
+# 整个进程的常驻内存随记录数的增长：记录、记忆向量、对话历史索引一起计算，而不只是RecordStore
+# 每种配置在单独的子进程中运行，RSS互不影响；不需要Ollama，记忆向量使用HashedEmbedder
+# 用法: python -m benchmarks.resident_memory --records 5000 20000
+
+
+def rss_bytes() -> int:
+    # Linux读取/proc，其他系统退回到峰值RSS
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def measure(records: int, hot_limit: int, seed: int, query_interval: int) -> dict:
+    config.record_hot_limit = hot_limit
+    config.record_archive_dir = tempfile.mkdtemp(prefix="il-mem-")
+    config.memory_enabled = True
+    # config必须在导入游戏模块之前修改
+    from benchmarks.save_load import sentence, synthetic_state
+    from src.game.model import GameRecord, RecordType
+
+    rng = random.Random(seed)
+    state = synthetic_state(0, seed)
+    gc.collect()
+    rss_start = rss_bytes()
+    tracemalloc.start()
+    traced_start = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    turn = 0
+    while len(state.records) < records:
+        state.add_record(GameRecord(record_type=RecordType.TURN_DESCRIPTION,
+                                    text=" ".join(sentence(rng, 15) for _ in range(8))))
+        state.add_record(GameRecord(record_type=RecordType.PLAYER_CHOICE, text=sentence(rng, 8)))
+        turn += 1
+        # 与游戏中相同，检索时才批量embedding并建立对话历史索引
+        if turn % query_interval == 0:
+            state.memory.rank(sentence(rng, 10))
+            state.history_index.search(rng.choice(["wolf", "森林", "relic"]))
+    state.memory.rank(sentence(rng, 10))
+    state.history_index.search("wolf")
+    seconds = time.perf_counter() - started
+    gc.collect()
+    traced = tracemalloc.get_traced_memory()[0] - traced_start
+    tracemalloc.stop()
+    report = {
+        "records": len(state.records),
+        "hot_limit": hot_limit,
+        "rss_growth_mb": round((rss_bytes() - rss_start) / 2 ** 20, 2),
+        "traced_growth_mb": round(traced / 2 ** 20, 2),
+        "archived_records": state.records.archived,
+        "archived_vectors": state.memory.archived,
+        "build_seconds": round(seconds, 2),
+    }
+    state.close()
+    return report
+
+
+def run(args) -> dict:
+    results = []
+    for records in args.records:
+        for hot_limit in (args.hot_limit, 0):
+            command = [sys.executable, "-m", "benchmarks.resident_memory", "--single", "--records", str(records),
+                       "--hot-limit", str(hot_limit), "--seed", str(args.seed),
+                       "--query-interval", str(args.query_interval)]
+            output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+            results.append(json.loads(output))
+    return {"embedding_dim": config.embedding_dim, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Whole-process resident memory growth on a synthetic game")
+    parser.add_argument("--records", type=int, nargs="+", default=[5000, 20000])
+    parser.add_argument("--hot-limit", type=int, default=config.record_hot_limit,
+                        help="compared against 0 (everything resident)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--query-interval", type=int, default=10, help="turns between retrievals")
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help="write the report to this JSON file")
+    args = parser.parse_args()
+    if args.single:
+        print(json.dumps(measure(args.records[0], args.hot_limit, args.seed, args.query_interval)))
+        return
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+
+
+if __name__ == '__main__':
+    main()
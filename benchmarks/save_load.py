@@ -0,0 +1,152 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from src import config
+
+# 在合成的N回合游戏上比较JSON存档的保存/读取时间和文件大小：旧格式(version 1)与新格式(version 2)的各种压缩方式
+# 不需要Ollama，记忆向量使用HashedEmbedder，读档时重新计算，不写入存档
+# 用法: python -m benchmarks.save_load --turns 1000 --runs 5
+
+WORDS = ["forest", "wolf", "lantern", "ruin", "tower", "river", "crystal", "oath", "blade", "merchant", "shadow",
+         "throne", "storm", "ancient", "relic", "gate", "mist", "hollow", "森林", "古老的", "剑", "狼群", "月光", "遗迹",
+         "商人", "誓言", "风暴", "王座"]
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def synthetic_state(turns: int, seed: int):
+    from src.game.game_state import GameState
+    from src.game.model import (Character, Choice, GameRecord, GameRound, GameStory, Item, KeyGameInformation,
+                                RecordType)
+
+    rng = random.Random(seed)
+    story = GameStory(title="Benchmark Saga", setting=sentence(rng, 40), main_conflict=sentence(rng, 30),
+                      key_characters=[Character(name=f"Character {i}", role="ally", description=sentence(rng, 20))
+                                      for i in range(4)],
+                      key_items=[Item(name=f"Relic {i}", description=sentence(rng, 12)) for i in range(3)])
+
+    def game_round() -> GameRound:
+        return GameRound(narrative=" ".join(sentence(rng, 15) for _ in range(8)),
+                         choices=[Choice(text=sentence(rng, 8), requires_roll=rng.random() < 0.3) for _ in range(3)],
+                         game_over=False)
+
+    state = GameState(game_story=story, current_round=game_round())
+    for turn in range(turns):
+        state.add_record(GameRecord(record_type=RecordType.TURN_DESCRIPTION, text=state.current_round.narrative))
+        state.add_record(GameRecord(record_type=RecordType.PLAYER_CHOICE, text=str(state.current_round.choices[0])))
+        if turn % 10 == 0:
+            item = Item(name=f"Item {turn}", description=sentence(rng, 10))
+            state.add_item(item)
+            state.add_record(GameRecord(record_type=RecordType.ITEM_ACQUIRED, text=str(item)))
+        state.current_round = game_round()
+    state.key_information = KeyGameInformation(plot_developments=[sentence(rng, 12) for _ in range(8)],
+                                               summary_of_recent_events=sentence(rng, 80))
+    state.summary_cursor = len(state.records)
+    state.summary_tiers = [[sentence(rng, 60) for _ in range(5)]]
+    if state.memory is not None:
+        # 向量在第一次保存前已经计算好，不计入保存时间
+        state.memory.flush()
+    return state
+
+
+def legacy_encode(state) -> bytes:
+    # version 1: 每个模型先编码成JSON字符串，外层再编码一次
+    return json.dumps({
+        "game_story": state.game_story.model_dump_json(),
+        "current_round": state.current_round.model_dump_json(),
+        "inventory": [item.model_dump_json() for item in state.inventory.values()],
+        "records": [json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+                    for record in state.records.to_dicts()],
+        "key_information": state.key_information.model_dump_json() if state.key_information else None,
+        "summary_cursor": state.summary_cursor,
+        "summary_tiers": state.summary_tiers,
+        "memory": state.memory.to_dict() if state.memory is not None else None,
+    }).encode("utf-8")
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def timed(fn, runs: int) -> float:
+    durations = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        durations.append((time.perf_counter() - started) * 1000)
+    return median(durations)
+
+
+def run(args) -> dict:
+    config.memory_enabled = not args.no_memory
+    # config必须在导入游戏模块之前修改
+    from src.game.serialization import compress, decode_state, encode_state, save_state, load_state
+
+    state = synthetic_state(args.turns, args.seed)
+    expected = state.records.to_dicts()
+    formats = {"v1": lambda: legacy_encode(state)}
+    for compression in args.compression:
+        formats[f"v2-{compression}"] = lambda compression=compression: encode_state(
+            state, compression="" if compression == "none" else compression)
+
+    report = {"turns": args.turns, "records": len(state.records), "memory": state.memory is not None,
+              "runs": args.runs, "formats": {}}
+    with tempfile.TemporaryDirectory(prefix="il-save-") as save_dir:
+        for name, encode in formats.items():
+            data = encode()
+            path = os.path.join(save_dir, f"{name}.json")
+            if name == "v1":
+                def save():
+                    with open(path, 'wb') as f:
+                        f.write(legacy_encode(state))
+            else:
+                compression = name.split("-", 1)[1]
+
+                def save(compression=compression):
+                    save_state(path, state, compression="" if compression == "none" else compression)
+            save()
+            loaded = load_state(path)
+            assert loaded.records.to_dicts() == expected and loaded.turns == state.turns
+            report["formats"][name] = {
+                "size_kb": round(len(data) / 1024, 1),
+                "encode_ms": round(timed(encode, args.runs), 2),
+                "decode_ms": round(timed(lambda: decode_state(data), args.runs), 2),
+                "save_ms": round(timed(save, args.runs), 2),
+                "load_ms": round(timed(lambda: load_state(path), args.runs), 2),
+            }
+    # 只压缩、不含编码的开销
+    raw = encode_state(state, compression="")
+    report["compress_only_ms"] = {compression: round(timed(lambda c=compression: compress(raw, c), args.runs), 2)
+                                  for compression in args.compression if compression != "none"}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON save/load benchmark on a synthetic game")
+    parser.add_argument("--turns", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compression", nargs="+", default=["none", "gzip", "zstd"],
+                        choices=["none", "gzip", "zstd"])
+    parser.add_argument("--no-memory", action="store_true", help="disable memory vectors in the save")
+    parser.add_argument("--output", help="write the report to this JSON file")
+    args = parser.parse_args()
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
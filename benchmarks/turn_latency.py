@@ -0,0 +1,187 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from src import config
+from src.llm.fake_ollama import FakeOllamaServer
+
+# 无界面地跑N个回合，统计回合延迟、prompt大小、存档/读档时间和内存增长
+# 用法: python -m benchmarks.turn_latency --turns 50 [--url http://localhost:11434]
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(p / 100 * (len(values) - 1)))))
+    return values[index]
+
+
+def summarize(values):
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "max": max(values) if values else None,
+        "mean": sum(values) / len(values) if values else None,
+    }
+
+
+def run(args) -> dict:
+    server = None
+    if args.url:
+        config.ollama_url = args.url
+    else:
+        server = FakeOllamaServer(token_rate=args.token_rate, ttft=args.ttft, malformed_rate=args.malformed_rate,
+                                  failure_rate=args.failure_rate, narrative_words=args.narrative_words,
+                                  load_time=args.load_time, seed=args.seed).start()
+        config.ollama_url = server.url
+    config.save_dir = args.save_dir or tempfile.mkdtemp(prefix="il-bench-")
+    config.save_format = args.save_format
+    config.debug = False
+    config.story_pool_size = 0
+    # 固定掷骰和采样种子，配合--cache replay可以逐回合复现同一局游戏
+    config.dice_seed = args.seed
+    config.llm_seed = args.seed
+    config.llm_cache = args.cache
+    if args.cache_dir:
+        config.llm_cache_dir = args.cache_dir
+    # config必须在导入游戏模块之前修改
+    from src.game.game_manager import GameManager
+    from src.llm.response_cache import get_response_cache
+    from src.llm.scheduler import scheduler
+    from src.llm.warmup import ModelWarmer
+
+    rng = random.Random(args.seed)
+    manager = GameManager()
+    save_times = []
+    save_game = manager.save_game
+
+    def timed_save(*a, **kw):
+        started = time.perf_counter()
+        save_game(*a, **kw)
+        save_times.append(time.perf_counter() - started)
+
+    manager.save_game = timed_save
+
+    warmer = ModelWarmer()
+    warm_up_time = None
+    if args.warmup:
+        started = time.perf_counter()
+        warmer.warm_up(wait=True)
+        warm_up_time = time.perf_counter() - started
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    if not manager.start_new_game([]):
+        raise RuntimeError("Failed to start a new game")
+    new_game_time = time.perf_counter() - started
+    memory_start = tracemalloc.get_traced_memory()[0]
+
+    turn_times, first_word_times, gm_prompt_tokens, rk_prompt_tokens, memory = [], [], [], [], []
+    # 与上一次同角色prompt相同的前缀占比，越高Ollama需要预填充的token越少
+    prefix_reuse = {"game_master": [], "record_keeper": []}
+    last_usage = dict()
+    failures = 0
+    for turn in range(args.turns):
+        current_round = manager.get_current_round()
+        if current_round.game_over:
+            break
+        first_word = []
+        turn_started = time.perf_counter()
+
+        def on_narrative(text):
+            if not first_word:
+                first_word.append(time.perf_counter() - turn_started)
+
+        manager.process_option(option=rng.choice(current_round.choices),
+                               on_narrative=on_narrative if args.stream else None)
+        turn_times.append(time.perf_counter() - turn_started)
+        if first_word:
+            first_word_times.append(first_word[0])
+        if manager.get_current_round() is current_round:
+            failures += 1
+        for context, prompt_tokens in ((manager.game_master.context, gm_prompt_tokens),
+                                       (manager.record_keeper.context, rk_prompt_tokens)):
+            # RK不是每回合都调用，只统计新的调用
+            if context.last_usage and context.last_usage is not last_usage.get(context.role):
+                prompt_tokens.append(context.last_usage["prompt_tokens"])
+                prefix_reuse[context.role].append(context.last_usage["prefix_reuse"])
+                last_usage[context.role] = context.last_usage
+        memory.append(tracemalloc.get_traced_memory()[0])
+
+    manager.commit_pending_summary()
+    manager.save_game()
+    save_file = manager.get_save_files()[0]
+    started = time.perf_counter()
+    GameManager().load_game(save_file)
+    load_time = time.perf_counter() - started
+    tracemalloc.stop()
+
+    report = {
+        "turns": len(turn_times),
+        "failed_turns": failures,
+        "new_game_seconds": new_game_time,
+        "turn_seconds": summarize(turn_times),
+        "first_word_seconds": summarize(first_word_times),
+        "gm_prompt_tokens": summarize(gm_prompt_tokens),
+        "rk_prompt_tokens": summarize(rk_prompt_tokens),
+        "gm_prefix_reuse": summarize(prefix_reuse["game_master"][1:]),
+        "rk_prefix_reuse": summarize(prefix_reuse["record_keeper"][1:]),
+        "save_seconds": summarize(save_times),
+        "load_seconds": load_time,
+        "memory_growth_bytes": (memory[-1] - memory_start) if memory else 0,
+        "memory_growth_bytes_per_turn": (memory[-1] - memory_start) / len(memory) if memory else 0,
+        "speculation": manager.get_speculation_stats(),
+        "gm_llm": manager.game_master.llm.stats,
+        "rk_llm": manager.record_keeper.llm.stats,
+        "warm_up_seconds": warm_up_time,
+        "warm_up": warmer.snapshot(),
+        "gm_llm_timings": manager.game_master.llm.timings,
+        "rk_llm_timings": manager.record_keeper.llm.timings,
+        "scheduler": scheduler.snapshot(),
+        "llm_cache": get_response_cache().snapshot() if get_response_cache() else None,
+        "server": server.stats if server else None,
+        "save_format": args.save_format,
+    }
+    if server:
+        server.stop()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless end-to-end turn latency benchmark")
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--url", help="benchmark a real Ollama instead of the built-in fake server")
+    parser.add_argument("--token-rate", type=float, default=400.0)
+    parser.add_argument("--ttft", type=float, default=0.05)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--narrative-words", type=int, default=120)
+    parser.add_argument("--load-time", type=float, default=0.0, help="fake model load time on first use")
+    parser.add_argument("--warmup", action="store_true", help="preload models before starting the game")
+    parser.add_argument("--save-format", default=config.save_format, choices=["journal", "json"])
+    parser.add_argument("--save-dir")
+    parser.add_argument("--stream", action="store_true", help="measure time to first narrative word")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache", default="off", choices=["off", "on", "replay"],
+                        help="LLM response cache; replay fails on any request that was not recorded")
+    parser.add_argument("--cache-dir", help="defaults to config.llm_cache_dir")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            f.write(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,47 +1,74 @@
-import os
+from __future__ import annotations
+
 import sys
 import time
+from typing import TYPE_CHECKING
 
-from colorama import init, Fore, Style
+from colorama import init, Fore
 
-from src.game.game_manager import GameManager
-from src.game.model import RecordType, GameRound
+from src.config import stream_narrative, release_models_on_quit
+from src.llm.metrics import TurnProfiler, add_hook
+from src.llm.warmup import ModelWarmer
+from .preload import BackgroundLoader
+from .renderer import Renderer
 from .text import Text
 from .text_zh import TextZH
 
+# 游戏模块会导入LLM相关依赖，只在用到时导入，主菜单可以立即显示
+if TYPE_CHECKING:
+    from src.game.game_manager import GameManager
+    from src.game.model import GameRound
+
 
 class CLIUI:
-    def __init__(self, game_manager: GameManager, language='Chinese'):
-        self.game_manager: GameManager = game_manager
+    SAVE_PAGE_SIZE = 10
+    HISTORY_PAGE_SIZE = 20
+
+    def __init__(self, game_manager: GameManager | BackgroundLoader[GameManager], language='Chinese', profile=False):
+        self._game_manager = game_manager
+        # --profile：每回合显示LLM调用明细
+        self.profiler = TurnProfiler() if profile else None
+        if self.profiler:
+            add_hook(self.profiler)
         if language == 'Chinese':
             self.text = TextZH
         else:
             self.text = Text
         init(autoreset=True)  # Initialize colorama
+        self.renderer = Renderer()
+        # 最近一次显示的回合，输入错误后重绘同一回合时不再重播打字机效果
+        self._shown_round = None
         self.DYNAMIC_OPTION_COLOR = Fore.CYAN
         self.FIXED_OPTION_COLOR = Fore.GREEN
         self.PROMPT_COLOR = Fore.MAGENTA
         self.ERROR_COLOR = Fore.RED
         self.TITLE_COLOR = Fore.YELLOW
 
+    @property
+    def game_manager(self) -> GameManager:
+        # 传入BackgroundLoader时，第一次用到GameManager才等待后台加载完成
+        if isinstance(self._game_manager, BackgroundLoader):
+            self._game_manager = self._game_manager.get()
+        return self._game_manager
+
     def clear_screen(self):
-        os.system('cls' if os.name == 'nt' else 'clear')
+        self.renderer.clear()
 
-    def print_slowly(self, text, delay=0.03, color=Fore.WHITE):
-        for char in text:
-            sys.stdout.write(color + char)
-            sys.stdout.flush()
-            time.sleep(delay)
-        print(Style.RESET_ALL)
+    def print_slowly(self, text, color=Fore.WHITE, newline=True):
+        self.renderer.typewriter(text, color, newline)
+
+    def pause(self, seconds=1):
+        self.renderer.flush()
+        time.sleep(seconds)
 
     def main_menu(self):
         while True:
             self.clear_screen()
             self.print_slowly(self.text.get('GAME_TITLE'), color=self.TITLE_COLOR)
-            print(self.DYNAMIC_OPTION_COLOR + f"1. {self.text.get('NEW_GAME')}")
-            print(self.DYNAMIC_OPTION_COLOR + f"2. {self.text.get('LOAD_GAME')}")
-            print(self.DYNAMIC_OPTION_COLOR + f"3. {self.text.get('QUIT')}")
-            choice = input(self.PROMPT_COLOR + self.text.get('ENTER_CHOICE') + Fore.WHITE)
+            self.renderer.line(f"1. {self.text.get('NEW_GAME')}", self.DYNAMIC_OPTION_COLOR)
+            self.renderer.line(f"2. {self.text.get('LOAD_GAME')}", self.DYNAMIC_OPTION_COLOR)
+            self.renderer.line(f"3. {self.text.get('QUIT')}", self.DYNAMIC_OPTION_COLOR)
+            choice = self.renderer.input(self.PROMPT_COLOR + self.text.get('ENTER_CHOICE') + Fore.WHITE)
             if choice == "1":
                 return "new_game"
             elif choice == "2":
@@ -49,34 +76,43 @@ class CLIUI:
             elif choice == "3":
                 return "quit"
             else:
-                print(self.ERROR_COLOR + self.text.get('INVALID_CHOICE'))
-                time.sleep(1)
+                self.renderer.line(self.text.get('INVALID_CHOICE'), self.ERROR_COLOR)
+                self.pause()
 
     def new_game_setup(self):
         keywords = []
         self.clear_screen()
         self.print_slowly(self.text.get('ENTER_KEYWORDS'), color=self.TITLE_COLOR)
         while True:
-            keyword = input(self.PROMPT_COLOR + self.text.get('KEYWORD_PROMPT') + Fore.WHITE)
+            keyword = self.renderer.input(self.PROMPT_COLOR + self.text.get('KEYWORD_PROMPT') + Fore.WHITE)
             if not keyword:
                 break
             keywords.append(keyword)
         return keywords
 
-    def display_round(self, current_round: GameRound):
-        self.clear_screen()
+    def display_round(self, current_round: GameRound, narrative_shown=False):
+        if narrative_shown:
+            # narrative已经流式输出，只补充物品和选项
+            self.renderer.line()
+        else:
+            self.clear_screen()
         for item in current_round.get_items:
-            print(Fore.MAGENTA + f"[Get Item] {item}")
+            self.renderer.line(f"[Get Item] {item}", Fore.MAGENTA)
         for item in current_round.lose_items:
-            print(Fore.MAGENTA + f"[Lose Item] {item}")
-        self.print_slowly(self.text.get('DIALOGUE_TITLE'), color=self.TITLE_COLOR)
-        self.print_slowly(current_round.narrative, color=Fore.WHITE)
-        print()
-        print(self.TITLE_COLOR + self.text.get('OPTIONS_TITLE'))
+            self.renderer.line(f"[Lose Item] {item}", Fore.MAGENTA)
+        if not narrative_shown:
+            self.renderer.line(self.text.get('DIALOGUE_TITLE'), self.TITLE_COLOR)
+            if current_round is self._shown_round:
+                self.renderer.line(current_round.narrative, Fore.WHITE)
+            else:
+                self.print_slowly(current_round.narrative, color=Fore.WHITE)
+        self._shown_round = current_round
+        self.renderer.line()
+        self.renderer.line(self.text.get('OPTIONS_TITLE'), self.TITLE_COLOR)
         options = current_round.choices
 
         for i, option in enumerate(options, 1):
-            print(self.DYNAMIC_OPTION_COLOR + f"{i}. {option}")
+            self.renderer.line(f"{i}. {option}", self.DYNAMIC_OPTION_COLOR)
 
         fixed_options = [
             self.text.get('USE_ITEM'),
@@ -84,79 +120,151 @@ class CLIUI:
             self.text.get('RETURN_TO_MAIN_MENU')
         ]
         for i, option in enumerate(fixed_options, len(options) + 1):
-            print(self.FIXED_OPTION_COLOR + f"{i}. {option}")
-        print()
+            self.renderer.line(f"{i}. {option}", self.FIXED_OPTION_COLOR)
+        self.renderer.line()
 
     def display_inventory(self):
         self.clear_screen()
         self.print_slowly(self.text.get('INVENTORY_TITLE'), color=self.TITLE_COLOR)
         inventory = self.game_manager.get_inventory()
         if not inventory:
-            print(self.ERROR_COLOR + self.text.get('INVENTORY_EMPTY'))
+            self.renderer.line(self.text.get('INVENTORY_EMPTY'), self.ERROR_COLOR)
         else:
             for item in inventory:
-                print(Fore.MAGENTA + f"- {item}")
-        input(self.PROMPT_COLOR + self.text.get('PRESS_ENTER') + Fore.WHITE)
+                self.renderer.line(f"- {item}", Fore.MAGENTA)
+        self.renderer.input(self.PROMPT_COLOR + self.text.get('PRESS_ENTER') + Fore.WHITE)
 
     def use_item(self):
         self.clear_screen()
         self.print_slowly(self.text.get('USE_ITEM_TITLE'), color=self.TITLE_COLOR)
         inventory = self.game_manager.get_inventory()
         if not inventory:
-            print(self.ERROR_COLOR + self.text.get('INVENTORY_EMPTY'))
+            self.renderer.line(self.text.get('INVENTORY_EMPTY'), self.ERROR_COLOR)
         else:
             for i, item in enumerate(inventory, 1):
-                print(self.DYNAMIC_OPTION_COLOR + f"{i}. {item}")
-            choice = input(self.PROMPT_COLOR + self.text.get('CHOOSE_ITEM') + Fore.WHITE)
+                self.renderer.line(f"{i}. {item}", self.DYNAMIC_OPTION_COLOR)
+            choice = self.renderer.input(self.PROMPT_COLOR + self.text.get('CHOOSE_ITEM') + Fore.WHITE)
             if choice.isdigit() and 1 <= int(choice) <= len(inventory):
                 item = inventory[int(choice) - 1]
-                print(self.TITLE_COLOR + self.text.get('USING_ITEM', item))
+                self.renderer.line(self.text.get('USING_ITEM', item), self.TITLE_COLOR)
                 self.game_manager.process_option(item=item)
-                print(self.DYNAMIC_OPTION_COLOR + self.text.get('ITEM_USED', item))
+                self.renderer.line(self.text.get('ITEM_USED', item), self.DYNAMIC_OPTION_COLOR)
             elif choice == "":
-                print(self.TITLE_COLOR + self.text.get('CANCELLED_ITEM_USE'))
+                self.renderer.line(self.text.get('CANCELLED_ITEM_USE'), self.TITLE_COLOR)
             else:
-                print(self.ERROR_COLOR + self.text.get('INVALID_CHOICE'))
-        input(self.PROMPT_COLOR + self.text.get('PRESS_ENTER') + Fore.WHITE)
+                self.renderer.line(self.text.get('INVALID_CHOICE'), self.ERROR_COLOR)
+        self.renderer.input(self.PROMPT_COLOR + self.text.get('PRESS_ENTER') + Fore.WHITE)
 
     def view_dialogue_history(self):
-        self.clear_screen()
-        self.print_slowly(self.text.get('HISTORY_TITLE'), color=self.TITLE_COLOR)
-        for record in self.game_manager.get_dialogue_history():
-            if record.record_type == RecordType.TURN_DESCRIPTION:
-                print(Fore.WHITE + str(record))
-            elif record.record_type == RecordType.PLAYER_CHOICE:
-                print(self.DYNAMIC_OPTION_COLOR + str(record))
-            elif record.record_type == RecordType.ITEM_ACQUIRED:
-                print(Fore.MAGENTA + str(record))
-            elif record.record_type == RecordType.ITEM_USED:
-                print(self.DYNAMIC_OPTION_COLOR + str(record))
-        input(self.PROMPT_COLOR + self.text.get('PRESS_ENTER') + Fore.WHITE)
+        from src.game.model import RecordType
+        colors = {
+            RecordType.TURN_DESCRIPTION: Fore.WHITE,
+            RecordType.PLAYER_CHOICE: self.DYNAMIC_OPTION_COLOR,
+            RecordType.ITEM_ACQUIRED: Fore.MAGENTA,
+            RecordType.ITEM_USED: self.DYNAMIC_OPTION_COLOR,
+            RecordType.ITEM_REMOVED: Fore.MAGENTA,
+        }
+        type_filters = [None] + list(RecordType)
+        records = self.game_manager.get_dialogue_history()
+        filter_index = 0
+        query = ""
+        # 匹配的记录下标，None表示不筛选，直接按记录下标分页
+        matches = None
+        page = None
+        while True:
+            total = len(records) if matches is None else len(matches)
+            pages = max(1, (total + self.HISTORY_PAGE_SIZE - 1) // self.HISTORY_PAGE_SIZE)
+            # 从最近的一页开始，每次只读取一页，早期记录从段文件中按需读取
+            page = pages - 1 if page is None else min(page, pages - 1)
+            self.clear_screen()
+            self.print_slowly(self.text.get('HISTORY_TITLE'), color=self.TITLE_COLOR)
+            start = page * self.HISTORY_PAGE_SIZE
+            stop = min(total, start + self.HISTORY_PAGE_SIZE)
+            if matches is None:
+                shown = records.page(start, stop)
+            else:
+                shown = [records[i] for i in matches[start:stop]]
+            if not shown:
+                self.renderer.line(self.text.get('HISTORY_NO_MATCH'), self.ERROR_COLOR)
+            for record in shown:
+                self.renderer.line(str(record), colors[record.record_type])
+            record_type = type_filters[filter_index]
+            type_name = self.text.get(f'RECORD_TYPE_{record_type.name}') if record_type else self.text.get(
+                'HISTORY_FILTER_ALL')
+            self.renderer.line(self.text.get('HISTORY_FILTER_INFO', type_name, query or "-"), self.TITLE_COLOR)
+            self.renderer.line(self.text.get('HISTORY_PAGE_INFO', page + 1, pages, min(start + 1, total), stop, total),
+                               self.TITLE_COLOR)
+            self.renderer.line(self.text.get('HISTORY_PAGE_CONTROLS'), self.FIXED_OPTION_COLOR)
+            choice = self.renderer.input(self.PROMPT_COLOR + self.text.get('ENTER_CHOICE') + Fore.WHITE).lower()
+            if choice == "n" and page < pages - 1:
+                page += 1
+                continue
+            elif choice == "p" and page > 0:
+                page -= 1
+                continue
+            elif choice in ("q", ""):
+                return
+            elif choice == "f":
+                filter_index = (filter_index + 1) % len(type_filters)
+            elif choice == "s":
+                query = self.renderer.input(self.PROMPT_COLOR + self.text.get('HISTORY_SEARCH_PROMPT') + Fore.WHITE)
+                query = query.strip()
+            elif choice == "c":
+                filter_index = 0
+                query = ""
+            else:
+                continue
+            # 筛选条件变化后通过倒排索引重新查找，回到最近的一页
+            record_type = type_filters[filter_index]
+            if record_type is None and not query:
+                matches = None
+            else:
+                matches = self.game_manager.search_dialogue_history(query, [record_type] if record_type else None)
+            page = None
 
     def confirm_exit(self):
         while True:
-            choice = input(self.PROMPT_COLOR + self.text.get('EXIT_CONFIRM') + Fore.WHITE).lower()
+            choice = self.renderer.input(self.PROMPT_COLOR + self.text.get('EXIT_CONFIRM') + Fore.WHITE).lower()
             if choice == 'y':
                 return True
             elif choice == 'n':
                 return False
             else:
-                print(self.ERROR_COLOR + self.text.get('INVALID_YES_NO'))
+                self.renderer.line(self.text.get('INVALID_YES_NO'), self.ERROR_COLOR)
+
+    def play_option(self, option):
+        if not stream_narrative:
+            self.game_manager.process_option(option=option)
+            return None
+        self.clear_screen()
+        self.print_slowly(self.text.get('DIALOGUE_TITLE'), color=self.TITLE_COLOR)
+        streamed = []
+
+        def on_narrative(text):
+            streamed.append(text)
+            self.print_slowly(text, color=Fore.WHITE, newline=False)
+
+        self.game_manager.process_option(option=option, on_narrative=on_narrative)
+        return "".join(streamed)
 
     def game_loop(self):
+        streamed_narrative = None
         while True:
             current_round = self.game_manager.get_current_round()
             options = current_round.choices
-            self.display_round(current_round)
+            self.display_round(current_round, narrative_shown=streamed_narrative == current_round.narrative)
+            streamed_narrative = None
+            if self.profiler:
+                self.renderer.line(self.profiler.report(), Fore.LIGHTBLACK_EX)
             if current_round.game_over:
-                print(self.TITLE_COLOR + self.text.get('THANK_YOU'))
+                self.renderer.line(self.text.get('THANK_YOU'), self.TITLE_COLOR)
                 self.confirm_exit()
                 return "main_menu"
-            choice = input(self.PROMPT_COLOR + self.text.get('ENTER_CHOICE') + Fore.WHITE)
+            choice = self.renderer.input(self.PROMPT_COLOR + self.text.get('ENTER_CHOICE') + Fore.WHITE)
             try:
                 choice_index = int(choice) - 1
                 if 0 <= choice_index < len(options):
-                    self.game_manager.process_option(option=options[choice_index])
+                    streamed_narrative = self.play_option(options[choice_index])
                 elif choice_index == len(options):
                     self.use_item()
                 elif choice_index == len(options) + 1:
@@ -166,40 +274,70 @@ class CLIUI:
                         self.game_manager.save_game()
                         return "main_menu"
                 else:
-                    print(self.ERROR_COLOR + self.text.get('INVALID_CHOICE'))
-                    time.sleep(1)
+                    self.renderer.line(self.text.get('INVALID_CHOICE'), self.ERROR_COLOR)
+                    self.pause()
             except ValueError:
-                print(self.ERROR_COLOR + self.text.get('INVALID_NUMBER'))
-                time.sleep(1)
+                self.renderer.line(self.text.get('INVALID_NUMBER'), self.ERROR_COLOR)
+                self.pause()
 
     def load_game_menu(self):
+        from src.game.save_index import SORT_COLUMNS
+        page = 0
+        sort_index = 0
         while True:
             self.clear_screen()
             self.print_slowly(self.text.get('LOAD_GAME_TITLE'), color=self.TITLE_COLOR)
-            save_files = self.game_manager.get_save_files()
+            sort_by = SORT_COLUMNS[sort_index]
+            save_infos = self.game_manager.get_save_infos(sort_by=sort_by, descending=sort_by != "title",
+                                                          offset=page * self.SAVE_PAGE_SIZE,
+                                                          limit=self.SAVE_PAGE_SIZE + 1)
+            has_next = len(save_infos) > self.SAVE_PAGE_SIZE
+            save_infos = save_infos[:self.SAVE_PAGE_SIZE]
 
-            if not save_files:
-                print(self.ERROR_COLOR + self.text.get('NO_SAVE_FILES'))
-                input(self.PROMPT_COLOR + self.text.get('PRESS_ENTER') + Fore.WHITE)
+            if not save_infos and page == 0:
+                self.renderer.line(self.text.get('NO_SAVE_FILES'), self.ERROR_COLOR)
+                self.renderer.input(self.PROMPT_COLOR + self.text.get('PRESS_ENTER') + Fore.WHITE)
                 return None
 
-            for i, save_file in enumerate(save_files, 1):
-                print(self.DYNAMIC_OPTION_COLOR + f"{i}. {save_file}")
-            print(self.FIXED_OPTION_COLOR + f"{len(save_files) + 1}. {self.text.get('RETURN_TO_MAIN_MENU')}")
+            self.renderer.line(self.text.get('SAVE_PAGE_INFO', page + 1, self.text.get(f'SORT_{sort_by.upper()}')), self.TITLE_COLOR)
+            for i, info in enumerate(save_infos, 1):
+                self.renderer.line(f"{i}. " + self.text.get(
+                    'SAVE_ENTRY', info.title, info.turns,
+                    time.strftime("%Y-%m-%d %H:%M", time.localtime(info.last_played)),
+                    f"{info.size / 1024:.1f}KB",
+                    self.text.get('SAVE_GAME_OVER') if info.game_over else ""), self.DYNAMIC_OPTION_COLOR)
+            self.renderer.line(f"{len(save_infos) + 1}. {self.text.get('RETURN_TO_MAIN_MENU')}", self.FIXED_OPTION_COLOR)
+            self.renderer.line(self.text.get('SAVE_PAGE_CONTROLS'), self.FIXED_OPTION_COLOR)
 
-            choice = input(self.PROMPT_COLOR + self.text.get('CHOOSE_SAVE_FILE') + Fore.WHITE)
+            choice = self.renderer.input(self.PROMPT_COLOR + self.text.get('CHOOSE_SAVE_FILE') + Fore.WHITE).lower()
             if choice.isdigit():
                 choice = int(choice)
-                if 1 <= choice <= len(save_files):
-                    return save_files[choice - 1]
-                elif choice == len(save_files) + 1:
+                if 1 <= choice <= len(save_infos):
+                    return save_infos[choice - 1].name
+                elif choice == len(save_infos) + 1:
                     return None
+            elif choice == "n" and has_next:
+                page += 1
+                continue
+            elif choice == "p" and page > 0:
+                page -= 1
+                continue
+            elif choice == "s":
+                sort_index = (sort_index + 1) % len(SORT_COLUMNS)
+                page = 0
+                continue
 
-            print(self.ERROR_COLOR + self.text.get('INVALID_CHOICE'))
-            time.sleep(1)
+            self.renderer.line(self.text.get('INVALID_CHOICE'), self.ERROR_COLOR)
+            self.pause()
 
     def run(self):
+        # 玩家在主菜单时预加载模型，第一回合不需要等待Ollama加载
+        # 后台加载GameManager时同样会导入LLM相关模块，预热要等加载完成后再开始
+        self.warmer = ModelWarmer()
+        loader = self._game_manager if isinstance(self._game_manager, BackgroundLoader) else None
+        self.warmer.warm_up(after=loader.get if loader is not None else None)
         while True:
+            self.refill_story_pool()
             action = self.main_menu()
 
             if action == "new_game":
@@ -209,15 +347,39 @@ class CLIUI:
                 save_file = self.load_game_menu()
                 if save_file:
                     if self.game_manager.load_game(save_file):
-                        print(self.TITLE_COLOR + self.text.get('GAME_LOADED_SUCCESSFULLY'))
+                        self.renderer.line(self.text.get('GAME_LOADED_SUCCESSFULLY'), self.TITLE_COLOR)
                     else:
-                        print(self.ERROR_COLOR + self.text.get('FAILED_TO_LOAD_GAME'))
+                        self.renderer.line(self.text.get('FAILED_TO_LOAD_GAME'), self.ERROR_COLOR)
                 else:
                     continue  # Return to main menu
             elif action == "quit":
-                print(self.TITLE_COLOR + self.text.get('THANK_YOU'))
+                self.renderer.line(self.text.get('THANK_YOU'), self.TITLE_COLOR)
+                self.renderer.flush()
+                self.shutdown()
                 sys.exit()
 
+            self.warmer.start_heartbeat()
             result = self.game_loop()
+            self.warmer.stop_heartbeat()
             if result != "main_menu":
+                self.shutdown()
                 break
+
+    def refill_story_pool(self):
+        # 玩家停留在主菜单时补充故事池；GameManager还在后台加载时跳过，开始游戏时由GameManager暂停
+        if isinstance(self._game_manager, BackgroundLoader) and not self._game_manager.ready():
+            return
+        self.game_manager.refill_story_pool()
+
+    def shutdown(self):
+        # GameManager已经加载时删除当前游戏的临时段文件
+        if not isinstance(self._game_manager, BackgroundLoader):
+            self._game_manager.close()
+        self.release_models()
+
+    def release_models(self):
+        # 退出前预热线程必须结束，解释器退出时不能有线程还在导入模块
+        if release_models_on_quit:
+            self.warmer.release()
+        else:
+            self.warmer.wait()
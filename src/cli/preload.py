@@ -0,0 +1,29 @@
+import threading
+from typing import Callable, Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class BackgroundLoader(Generic[T]):
+    # 在后台线程中执行耗时的初始化（导入LLM相关模块、创建GameManager），主菜单不需要等待
+    def __init__(self, factory: Callable[[], T]):
+        self._factory = factory
+        self._result: T | None = None
+        self._error: BaseException | None = None
+        self._thread = threading.Thread(target=self._load, name="preload", daemon=True)
+        self._thread.start()
+
+    def _load(self):
+        try:
+            self._result = self._factory()
+        except BaseException as e:
+            self._error = e
+
+    def ready(self) -> bool:
+        return not self._thread.is_alive()
+
+    def get(self) -> T:
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self._result
@@ -0,0 +1,135 @@
+import os
+import sys
+import time
+from typing import List
+
+from colorama import Style
+
+from src.config import typewriter_speed, render_fps
+
+# 清屏并把光标移到左上角，不需要启动子进程执行clear/cls
+CLEAR_SEQUENCE = "\x1b[2J\x1b[3J\x1b[H"
+
+
+class KeyWatcher:
+    # 打字机效果期间监听按键，按下任意键跳过动画；按键会被读掉，不会留给下一次input()
+    def __init__(self):
+        try:
+            self._enabled = sys.stdin.isatty()
+        except (AttributeError, ValueError):
+            self._enabled = False
+        self._saved = None
+        self._fd = None
+
+    def __enter__(self):
+        if not self._enabled or os.name == 'nt':
+            return self
+        import termios
+        import tty
+        try:
+            self._fd = sys.stdin.fileno()
+            self._saved = termios.tcgetattr(self._fd)
+            tty.setcbreak(self._fd)
+        except (termios.error, ValueError, OSError):
+            self._enabled = False
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._saved is not None:
+            import termios
+            termios.tcsetattr(self._fd, termios.TCSADRAIN, self._saved)
+            self._saved = None
+
+    def wait(self, timeout: float) -> bool:
+        # 等待下一帧，期间有按键时提前返回True
+        if not self._enabled:
+            time.sleep(max(0.0, timeout))
+            return False
+        if os.name == 'nt':
+            import msvcrt
+            deadline = time.monotonic() + timeout
+            while True:
+                if msvcrt.kbhit():
+                    while msvcrt.kbhit():
+                        msvcrt.getwch()
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                time.sleep(min(remaining, 0.01))
+        import select
+        ready, _, _ = select.select([self._fd], [], [], max(0.0, timeout))
+        if ready:
+            os.read(self._fd, 1024)
+            return True
+        return False
+
+
+class Renderer:
+    # 终端输出按帧缓冲：一屏内容先写入缓冲区，flush时一次写出
+    def __init__(self, stream=None, speed: float = None, fps: int = None):
+        self._stream = stream
+        self.speed = typewriter_speed if speed is None else speed
+        self.fps = max(1, render_fps if fps is None else fps)
+        self._frame: List[str] = []
+        # 本屏已按键跳过，后续的流式文本也直接显示
+        self._skipped = False
+
+    @property
+    def stream(self):
+        # colorama.init会替换sys.stdout，每次写出时再取
+        return self._stream or sys.stdout
+
+    @property
+    def interactive(self) -> bool:
+        try:
+            return self.stream.isatty()
+        except (AttributeError, ValueError):
+            return False
+
+    def clear(self):
+        self._frame.clear()
+        self._skipped = False
+        if self.interactive:
+            self._frame.append(CLEAR_SEQUENCE)
+
+    def write(self, text: str, color: str = ""):
+        self._frame.append(color + text + Style.RESET_ALL if color else text)
+
+    def line(self, text: str = "", color: str = ""):
+        self.write(text, color)
+        self._frame.append("\n")
+
+    def flush(self):
+        if self._frame:
+            self.stream.write("".join(self._frame))
+            self._frame.clear()
+        self.stream.flush()
+
+    def input(self, prompt: str = "") -> str:
+        self.flush()
+        return input(prompt)
+
+    def typewriter(self, text: str, color: str = "", newline: bool = True):
+        # 按帧时钟逐块显示：每帧根据经过的时间写出应显示的字符，一帧只写一次
+        end = Style.RESET_ALL + ("\n" if newline else "")
+        if not text or self.speed <= 0 or self._skipped or not self.interactive:
+            self.write(color + text + end)
+            self.flush()
+            return
+        self.flush()
+        stream = self.stream
+        interval = 1 / self.fps
+        shown = 0
+        start = time.monotonic()
+        with KeyWatcher() as keys:
+            while shown < len(text):
+                target = min(len(text), max(shown + 1, int((time.monotonic() - start) * self.speed)))
+                stream.write(color + text[shown:target])
+                stream.flush()
+                shown = target
+                if shown < len(text) and keys.wait(interval):
+                    self._skipped = True
+                    break
+        stream.write(color + text[shown:] + end)
+        stream.flush()
@@ -56,6 +56,24 @@ class Text:
     CHOOSE_SAVE_FILE = "Choose a save file to load (or enter the number to return to main menu): "
     GAME_LOADED_SUCCESSFULLY = "Game loaded successfully."
     FAILED_TO_LOAD_GAME = "Failed to load the game. Starting a new game."
+    SAVE_ENTRY = "{} | Turns: {} | Last played: {} | {} {}"
+    SAVE_GAME_OVER = "[Ended]"
+    SAVE_PAGE_INFO = "Page {} | Sorted by {}"
+    SAVE_PAGE_CONTROLS = "n. Next page  p. Previous page  s. Change sorting"
+    SORT_LAST_PLAYED = "last played"
+    SORT_TURNS = "turns"
+    SORT_TITLE = "title"
+    HISTORY_PAGE_INFO = "Page {} / {} | Records {}-{} of {}"
+    HISTORY_PAGE_CONTROLS = "n. Next page  p. Previous page  f. Filter by type  s. Search  c. Clear  q. Return to game"
+    HISTORY_FILTER_INFO = "Type: {} | Search: {}"
+    HISTORY_FILTER_ALL = "All"
+    HISTORY_SEARCH_PROMPT = "Keywords (empty to clear): "
+    HISTORY_NO_MATCH = "No matching records."
+    RECORD_TYPE_TURN_DESCRIPTION = "Game master"
+    RECORD_TYPE_PLAYER_CHOICE = "Player choices"
+    RECORD_TYPE_ITEM_ACQUIRED = "Items acquired"
+    RECORD_TYPE_ITEM_USED = "Items used"
+    RECORD_TYPE_ITEM_REMOVED = "Items lost"
 
     @classmethod
     def get(cls, key, *args):
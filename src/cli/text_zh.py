@@ -56,6 +56,24 @@ class TextZH:
     CHOOSE_SAVE_FILE = "选择要加载的存档文件（或输入数字返回主菜单）: "
     GAME_LOADED_SUCCESSFULLY = "游戏加载成功。"
     FAILED_TO_LOAD_GAME = "加载游戏失败。正在开始新游戏。"
+    SAVE_ENTRY = "{} | 回合: {} | 上次游玩: {} | {} {}"
+    SAVE_GAME_OVER = "[已结束]"
+    SAVE_PAGE_INFO = "第{}页 | 排序: {}"
+    SAVE_PAGE_CONTROLS = "n. 下一页  p. 上一页  s. 切换排序"
+    SORT_LAST_PLAYED = "上次游玩时间"
+    SORT_TURNS = "回合数"
+    SORT_TITLE = "标题"
+    HISTORY_PAGE_INFO = "第{}/{}页 | 第{}-{}条，共{}条"
+    HISTORY_PAGE_CONTROLS = "n. 下一页  p. 上一页  f. 按类型筛选  s. 搜索  c. 清除筛选  q. 返回游戏"
+    HISTORY_FILTER_INFO = "类型: {} | 搜索: {}"
+    HISTORY_FILTER_ALL = "全部"
+    HISTORY_SEARCH_PROMPT = "输入关键词（留空清除）: "
+    HISTORY_NO_MATCH = "没有匹配的记录。"
+    RECORD_TYPE_TURN_DESCRIPTION = "剧情"
+    RECORD_TYPE_PLAYER_CHOICE = "玩家选择"
+    RECORD_TYPE_ITEM_ACQUIRED = "获得物品"
+    RECORD_TYPE_ITEM_USED = "使用物品"
+    RECORD_TYPE_ITEM_REMOVED = "失去物品"
 
     @classmethod
     def get(cls, key, *args):
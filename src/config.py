@@ -3,3 +3,100 @@ model_name = "qwen2.5"
 lang = "Chinese"
 save_dir = "saves"
 debug = True
+# GM回合与RK总结并行：RK在后台总结本回合，下一回合开始前提交
+pipeline_turns = True
+# GM的narrative边生成边显示
+stream_narrative = True
+# 掷骰随机种子，None表示不固定
+dice_seed = None
+# 玩家阅读时为前N个选项预生成下一回合
+speculative_prefetch = False
+speculative_workers = 2
+speculative_branches = 2
+# 每局游戏最多预生成的回合数
+speculative_budget = 100
+# 需要掷骰的选项是否提前掷骰并预生成
+speculative_preroll = True
+# 存档格式: "journal" 追加写入增量，"json" 每次重写完整JSON
+save_format = "journal"
+# journal每追加多少次写一次压缩快照
+journal_snapshot_interval = 50
+# 上下文窗口与生成长度（token）
+num_ctx = 10240
+num_predict = 4096
+# 各部分最多占用输入预算(num_ctx - num_predict)的比例，剩余预算从最新的记录开始填充interactions
+context_budgets = {"story_outline": 0.25, "key_game_info": 0.2, "player_inventory": 0.1,
+                   "relevant_interactions": 0.15}
+# 提供给GM/RK按token预算挑选的最大历史回合数
+gm_history_rounds = 50
+# 上次总结后的新记录超过该token数时RK才进行增量总结
+rk_summary_token_threshold = 1500
+# 每层章节总结达到该数量时合并到上一层
+rk_summary_tier_size = 5
+# 长期记忆：检索与当前场景相关的早期记录提供给GM
+memory_enabled = True
+# Ollama embedding模型名，None时使用hashed bag-of-words
+embedding_model = None
+embedding_dim = 512
+memory_top_k = 5
+# 各角色的模型配置，未设置的字段使用ollama_url/model_name/num_ctx/num_predict
+# 可选字段: base_url, model, num_ctx, num_predict, temperature, 以及其它Ollama参数
+# fallback: 解析失败时使用的备用模型配置（覆盖本角色的字段），fallback_after: 主模型尝试次数
+# 例如RK使用小模型和更长的输入，失败时回退到大模型:
+#   "record_keeper": {"model": "qwen2.5:3b", "num_ctx": 16384, "temperature": 0.3,
+#                     "fallback": {"model": model_name, "num_ctx": num_ctx}, "fallback_after": 1},
+role_configs = {
+    "story_generator": {"temperature": 0.5},
+    "game_master": {"temperature": 0.7, "repeat_last_n": 1024},
+    "record_keeper": {"temperature": 0.3},
+}
+# 使用Ollama结构化输出，按输出模型的JSON schema约束生成
+structured_output = True
+# 多玩家游戏服务器
+server_host = "127.0.0.1"
+server_port = 8080
+# 同时执行session操作的线程数
+server_workers = 16
+# session空闲超过该秒数后保存到磁盘并从内存中移除
+server_idle_timeout = 600
+# LLM请求调度：每个Ollama后端同时进行的最大请求数，超出的按优先级排队
+scheduler_max_in_flight = 2
+# 按base_url单独设置并发数，例如 {"http://localhost:11434": 4}
+scheduler_backend_limits = {}
+# 预生成分支在队列中等待超过该秒数后放弃
+speculative_deadline = 30
+# CLI停留在主菜单时后台预生成的随机主题故事数量（故事大纲和第一回合），0表示关闭；服务器和模拟器不使用
+story_pool_size = 3
+# 新游戏的关键词与预生成故事关键词的Jaccard相似度达到该值时直接复用
+story_pool_match = 0.5
+# LLM采样随机种子，None表示不固定；与dice_seed一起使整局游戏可以复现
+llm_seed = None
+# LLM响应缓存: "off" 关闭，"on" 读写缓存，"replay" 只读且未命中时报错（用于基准测试和回归测试）
+llm_cache = "off"
+llm_cache_dir = "cache"
+llm_cache_max_bytes = 256 * 1024 * 1024
+# 模型在Ollama中保持加载的时间，每次请求都会刷新
+ollama_keep_alive = "30m"
+# 游戏进行中每隔多少秒重新预热一次模型，0表示关闭
+warmup_heartbeat = 900
+# 退出游戏时卸载模型
+release_models_on_quit = True
+# 模型加载超过该秒数记为冷启动
+cold_load_threshold = 0.5
+# 每次LLM调用的统计写入该JSONL文件，None表示不写
+metrics_file = None
+# 文件超过该大小后轮转，保留metrics_backups个旧文件
+metrics_max_bytes = 10 * 1024 * 1024
+metrics_backups = 3
+# 每局游戏内存中保留的最近记录数，更早的记录写入临时段文件按需读取，0表示全部保留在内存中
+record_hot_limit = 400
+# 超出hot_limit多少条后批量写入一次
+record_spill_batch = 100
+# 段文件所在目录，None表示系统临时目录
+record_archive_dir = None
+# 打字机效果每秒显示的字符数，0表示直接显示全部文本；输出不是终端时自动关闭
+typewriter_speed = 40
+# 终端渲染的帧率，打字机效果每帧写入一次
+render_fps = 30
+# JSON存档的压缩方式: None、"gzip"或"zstd"（需要安装zstandard）；读取时按文件头识别，旧存档自动迁移
+save_compression = None
@@ -0,0 +1,11 @@
+import os
+
+
+def atomic_write(path: str, data: bytes):
+    # 先写入临时文件并fsync，再替换目标文件；中途崩溃时旧文件保持完整
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
@@ -1,37 +1,109 @@
-import json
 import os
 import random
-from typing import List
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List
 
-from src.config import save_dir
+from src.config import save_dir as default_save_dir, save_format, journal_snapshot_interval, pipeline_turns, \
+    dice_seed, gm_history_rounds, memory_top_k, rk_summary_token_threshold, \
+    rk_summary_tier_size, speculative_prefetch, speculative_workers, speculative_branches, speculative_budget, \
+    speculative_preroll, speculative_deadline, story_pool_size, llm_seed, llm_cache
 from src.llm.game_master import GameMaster
 from src.llm.record_keeper import RecordKeeper
-from src.llm.story_generator import StoryGenerator
+from src.llm.story_generator import StoryGenerator, random_keywords
 from .game_state import GameState
+from .journal import GameJournal, JOURNAL_SUFFIX, read_journal_info
+from .record_store import RecordStore
+from .save_index import SaveIndex, SaveInfo
+from .serialization import load_state, read_save_info, save_state
 from .model import Choice, GameRecord, GameRound, Item, RecordType
+from .speculation import Speculator, make_choice_record
+from .story_pool import POOL_FILE, shared_story_pool
+from .summarizer import IncrementalSummarizer, SummaryUpdate, chapter_summaries
 
 
 class GameManager:
-    def __init__(self):
+    def __init__(self, save_dir: str = None, use_story_pool=False):
+        self.save_dir = save_dir or default_save_dir
         self.game_state: GameState | None = None
         self.game_master: GameMaster | None = None
         self.record_keeper: RecordKeeper | None = None
+        self.summarizer: IncrementalSummarizer | None = None
+        # pipeline模式下RK在后台总结，下一回合GM开始前提交
+        self._rk_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="record-keeper")
+        self._pending_summary: Future | None = None
+        self.dice = random.Random(dice_seed)
+        # 固定种子或使用响应缓存时，GM看到的key_information不能取决于后台RK是否已经完成，
+        # 每回合都提交上一回合安排的总结，才能用--cache replay逐回合复现
+        self.deterministic = dice_seed is not None or llm_seed is not None or llm_cache != "off"
+        self._journals: Dict[str, GameJournal] = dict()
+        self.save_index = SaveIndex(self.save_dir)
+        self.speculator = Speculator(
+            max_workers=speculative_workers,
+            max_branches=speculative_branches,
+            budget=speculative_budget,
+            preroll=speculative_preroll,
+            deadline=speculative_deadline
+        ) if speculative_prefetch else None
+        # 故事池放在默认存档目录下，所有GameManager共用；只有交互式客户端开启，由其在空闲时调用refill_story_pool
+        self.story_pool = shared_story_pool(os.path.join(default_save_dir, POOL_FILE)) \
+            if use_story_pool and story_pool_size else None
+
+    def refill_story_pool(self):
+        if self.story_pool is not None:
+            self.story_pool.refill()
+
+    def pause_story_pool(self):
+        if self.story_pool is not None:
+            self.story_pool.pause()
 
     def start_new_game(self, keywords) -> bool:
-        story = StoryGenerator().generate_story(keywords)
-        if not story:
-            print("Failed to generate story")
-            return False
-        self.game_master = GameMaster(game_story=story)
-        next_round = self.game_master.next_round()
-        if not next_round:
-            print("Failed to generate first round")
-            return False
-        self.game_state = GameState(game_story=story, current_round=next_round)
-        self.record_keeper = RecordKeeper(game_story=story)
+        self.pause_story_pool()
+        pooled = self.story_pool.take(keywords) if self.story_pool is not None else None
+        if pooled:
+            story, next_round = pooled.game_story, pooled.first_round
+            self.game_master = GameMaster(game_story=story)
+        else:
+            # 随机主题使用dice抽取，固定种子时整局游戏可以复现
+            story = StoryGenerator().generate_story(keywords or random_keywords(rng=self.dice))
+            if not story:
+                print("Failed to generate story")
+                return False
+            self.game_master = GameMaster(game_story=story)
+            next_round = self.game_master.next_round()
+            if not next_round:
+                print("Failed to generate first round")
+                return False
+        self._discard_pending_summary()
+        self._replace_state(GameState(game_story=story, current_round=next_round))
+        self._create_record_keeper(story)
         self.process_round(next_round)
+        if pipeline_turns:
+            self._schedule_summary()
+        if self.speculator:
+            self.speculator.reset()
+            self._start_speculation()
         return True
 
+    def _replace_state(self, game_state: GameState | None):
+        # 旧游戏的记录和向量段文件不再使用，立即删除
+        if self.game_state is not None and self.game_state is not game_state:
+            self.game_state.close()
+        self.game_state = game_state
+
+    def close(self):
+        # 退出或session被清理时调用，调用前需要先保存；关闭后GameManager不能再使用
+        self._discard_pending_summary()
+        self._rk_executor.shutdown(wait=False, cancel_futures=True)
+        if self.speculator:
+            self.speculator.shutdown()
+        self.save_index.close()
+        self._replace_state(None)
+
+    def _create_record_keeper(self, story):
+        self.record_keeper = RecordKeeper(game_story=story)
+        self.summarizer = IncrementalSummarizer(self.record_keeper, token_threshold=rk_summary_token_threshold,
+                                                tier_size=rk_summary_tier_size)
+
     def get_current_round(self) -> GameRound:
         return self.game_state.current_round
 
@@ -52,77 +124,216 @@ class GameManager:
             ))
 
         # 记录Round Record
-        self.game_state.records.append(GameRecord(
+        self.game_state.add_record(GameRecord(
             record_type=RecordType.TURN_DESCRIPTION,
             text=next_round.narrative))
         self.game_state.current_round = next_round
 
-    def process_option(self, option: Choice = None, item: Item = None):
-        # 记录玩家Record
+    def process_option(self, option: Choice = None, item: Item = None, on_narrative=None):
+        # 记录玩家Record；掷骰总是在提交时进行，预生成分支只有预掷结果相同时才使用
         player_record = None
         if option is not None:
-            player_record = GameRecord(
-                record_type=RecordType.PLAYER_CHOICE,
-                text=option.text if not option.requires_roll else f"{option.text} (roll: {random.randint(1, 20)} / success threshold: {option.success_threshold})"
-            )
+            player_record = make_choice_record(option, self.dice)
         elif item is not None:
             player_record = GameRecord(
                 record_type=RecordType.ITEM_USED,
                 text=f"{item.name}:{item.description}"
             )
             self.game_state.remove_item(item)
-        # 整理 recent_interactions
-        next_key_info = self.record_keeper.summary(
-            key_game_info=self.game_state.key_information,
-            recent_interactions=self.get_recent_interactions(round_num=50)
-        )
-        if not next_key_info:
-            print("RK Failed")
-            return
-        next_round = self.game_master.next_round(
-            current_player_choice=str(player_record),
-            key_game_info=next_key_info,
-            recent_interactions=self.get_recent_interactions(round_num=10)
-        )
+        branch = self.speculator.take(self._choice_index(option), player_record) if self.speculator else None
+        # 新记录超过阈值时才由RK合并进key_information
+        if pipeline_turns:
+            # 不等待仍在运行的RK，GM直接使用已提交的key_information，总结在之后的回合提交
+            self.commit_pending_summary(wait=self.deterministic)
+        elif self.summarizer.should_summarize(self.game_state):
+            update = self.summarizer.summarize_state(self.game_state)
+            if not update:
+                print("RK Failed")
+                self._restart_speculation()
+                return
+            update.apply(self.game_state)
+        next_key_info = self.game_state.key_information
+        # 命中预生成分支时直接使用结果，分支失败则重新生成
+        next_round = branch.result() if branch is not None else None
+        if not next_round:
+            next_round = self.game_master.next_round(
+                current_player_choice=str(player_record),
+                key_game_info=next_key_info,
+                chapter_summaries=chapter_summaries(self.game_state.summary_tiers),
+                recent_interactions=self.get_recent_interactions(round_num=gm_history_rounds),
+                relevant_interactions=self.get_relevant_interactions(str(player_record)),
+                on_narrative=on_narrative
+            )
         if not next_round:
             print("GM Failed")
+            self._restart_speculation()
             return
-        self.game_state.key_information = next_key_info
-        self.game_state.records.append(player_record)
+        self.game_state.add_record(player_record)
         self.process_round(next_round)
-        # AutoSave
-        self.save_game()
+        # AutoSave，不等待后台RK，已保存的记录在读档后会重新总结
+        self.save_game(wait_summary=False)
+        if pipeline_turns:
+            self._schedule_summary()
+        self._restart_speculation()
+
+    def _choice_index(self, option: Choice | None) -> int | None:
+        choices = self.game_state.current_round.choices
+        return choices.index(option) if option is not None and option in choices else None
+
+    def _restart_speculation(self):
+        if self.speculator:
+            self._start_speculation()
+
+    def _start_speculation(self):
+        recent_interactions = self.get_recent_interactions(round_num=gm_history_rounds)
+        game_master = self.game_master
+
+        def generate(current_player_choice: str) -> GameRound:
+            key_info, summary_tiers = self._speculative_summary()
+            # 分支使用独立的ContextWindow，不改动真实回合用于计算前缀复用的上一次prompt
+            return game_master.fork().next_round(
+                current_player_choice=current_player_choice,
+                key_game_info=key_info,
+                chapter_summaries=chapter_summaries(summary_tiers),
+                recent_interactions=recent_interactions,
+                relevant_interactions=self.get_relevant_interactions(current_player_choice)
+            )
+
+        self.speculator.start(self.game_state.current_round, self.dice, generate)
+
+    def _speculative_summary(self):
+        # 与process_option中提交的总结保持一致：只使用已经完成的RK结果，不在后台线程中修改game_state
+        pending = self._pending_summary
+        if pending is not None and (pending.done() or self.deterministic):
+            try:
+                update = pending.result()
+            except Exception:
+                update = None
+            if update:
+                return update.key_information, update.summary_tiers
+        return self.game_state.key_information, self.game_state.summary_tiers
+
+    def get_speculation_stats(self):
+        if not self.speculator:
+            return None
+        return dict(self.speculator.stats, hit_rate=self.speculator.hit_rate())
+
+    def _schedule_summary(self):
+        # 上一次RK还未提交时不重复提交，剩余的新记录在它提交后的回合再总结
+        if self._pending_summary is not None or not self.summarizer.should_summarize(self.game_state):
+            return
+        # 在主线程截取新记录，后台只做RK生成
+        self._pending_summary = self._rk_executor.submit(
+            self.summarizer.summarize,
+            self.game_state.key_information,
+            self.game_state.summary_tiers,
+            self.summarizer.pending_records(self.game_state),
+            self.game_state.summary_cursor
+        )
+
+    def commit_pending_summary(self, wait=True):
+        if self._pending_summary is None or not (wait or self._pending_summary.done()):
+            return
+        try:
+            update: SummaryUpdate | None = self._pending_summary.result()
+        except Exception:
+            update = None
+        self._pending_summary = None
+        if not update:
+            # 保留上一次的总结，新记录在之后的回合重新总结
+            print("RK Failed")
+            return
+        update.apply(self.game_state)
+
+    def _discard_pending_summary(self):
+        if self._pending_summary is not None:
+            self._pending_summary.cancel()
+            self._pending_summary = None
 
-    def get_dialogue_history(self) -> List[GameRecord]:
+    def get_dialogue_history(self) -> RecordStore:
         return self.game_state.records
 
+    def search_dialogue_history(self, query: str = "", record_types: List[RecordType] = None) -> List[int]:
+        # 返回匹配的记录下标，记录内容通过get_dialogue_history()按需读取
+        return self.game_state.history_index.search(query, record_types)
+
     def get_inventory(self) -> List[Item]:
         return list(self.game_state.inventory.values())
 
     def get_recent_interactions(self, round_num=10) -> List[str]:
-        return [str(r) for r in self.game_state.records[-round_num * 2:]]
+        return self.game_state.records.tail(round_num * 2)
+
+    def get_relevant_interactions(self, current_player_choice: str) -> Callable[[int], List[str]]:
+        # 返回检索函数：参数为Recent Interactions实际保留的最新记录数，检索这些记录之外与当前场景和选择相关的早期记录
+        memory = self.game_state.memory
+        if memory is None:
+            return lambda kept: []
+        records = self.game_state.records
+        total = len(records)
+        query = f"{self.game_state.current_round.narrative}\n{current_player_choice}"
+        # 只embedding一次query，GM按保留数多次选择时复用排序结果
+        ranked = memory.rank(query, limit=total)
+
+        def select(kept: int) -> List[str]:
+            limit = total - kept
+            top = [i for i in ranked if i < limit][:memory_top_k]
+            return [records.render(i) for i in sorted(top)]
+
+        return select
 
     def get_save_files(self):
-        if not os.path.exists(save_dir):
+        if not os.path.exists(self.save_dir):
             return []
-        return [f for f in os.listdir(save_dir) if f.endswith('.json')]
+        return [f for f in os.listdir(self.save_dir) if f.endswith('.json') or f.endswith(JOURNAL_SUFFIX)]
+
+    def _journal(self, file_path) -> GameJournal:
+        # 只缓存当前游戏的journal，它持有GameState用于计算增量
+        if file_path not in self._journals:
+            self._journals = {file_path: GameJournal(file_path, snapshot_interval=journal_snapshot_interval)}
+        return self._journals[file_path]
+
+    def get_save_infos(self, sort_by="last_played", descending=True, offset=0, limit=-1) -> List[SaveInfo]:
+        self.save_index.sync(self.get_save_files(), self._read_save_info)
+        return self.save_index.list(sort_by=sort_by, descending=descending, offset=offset, limit=limit)
+
+    def _read_save_info(self, save_file) -> dict:
+        file_path = os.path.join(self.save_dir, save_file)
+        if save_file.endswith(JOURNAL_SUFFIX):
+            return read_journal_info(file_path)
+        return read_save_info(file_path)
+
+    def _read_save(self, save_file) -> GameState:
+        file_path = os.path.join(self.save_dir, save_file)
+        if save_file.endswith(JOURNAL_SUFFIX):
+            return self._journal(file_path).load()
+        return load_state(file_path)
 
     def load_game(self, save_file):
-        file_path = os.path.join(save_dir, save_file)
+        file_path = os.path.join(self.save_dir, save_file)
         if os.path.exists(file_path):
-            with open(file_path, 'r') as f:
-                data = json.load(f)
-                self.game_state = GameState.from_dict(data)
-                self.game_master = GameMaster(self.game_state.game_story)
-                self.record_keeper = RecordKeeper(self.game_state.game_story)
+            self.pause_story_pool()
+            self._discard_pending_summary()
+            self._replace_state(self._read_save(save_file))
+            self.game_master = GameMaster(self.game_state.game_story)
+            self._create_record_keeper(self.game_state.game_story)
+            if pipeline_turns:
+                self._schedule_summary()
+            if self.speculator:
+                self.speculator.reset()
+                self._start_speculation()
             return True
         return False
 
-    def save_game(self, save_name=None):
+    def save_game(self, save_name=None, wait_summary=True):
+        self.commit_pending_summary(wait=wait_summary)
         if not save_name:
             save_name = f"AUTO_SAVE_{self.game_state.game_story.title}"
-        if not os.path.exists(save_dir):
-            os.makedirs(save_dir)
-        file_path = os.path.join(save_dir, f"{save_name}.json")
-        with open(file_path, 'w') as f:
-            json.dump(self.game_state.to_dict(), f)
+        if not os.path.exists(self.save_dir):
+            os.makedirs(self.save_dir)
+        if save_format == "journal":
+            save_file = f"{save_name}{JOURNAL_SUFFIX}"
+            self._journal(os.path.join(self.save_dir, save_file)).save(self.game_state)
+        else:
+            save_file = f"{save_name}.json"
+            save_state(os.path.join(self.save_dir, save_file), self.game_state)
+        self.save_index.update(save_file, self.game_state)
@@ -1,6 +1,12 @@
 from typing import List, Dict
 
-from .model import GameStory, Item, GameRound, GameRecord, KeyGameInformation
+from src.config import memory_enabled
+from .history_index import HistoryIndex
+from .memory import MemoryIndex, build_memory
+from .model import GameStory, Item, GameRound, GameRecord, KeyGameInformation, RecordType
+from .record_store import RecordStore
+
+PLAYER_RECORD_TYPES = (RecordType.PLAYER_CHOICE, RecordType.ITEM_USED)
 
 
 class GameState:
@@ -8,11 +14,26 @@ class GameState:
         self.game_story = game_story
         self.current_round: GameRound = current_round
         self.inventory: Dict[str, Item] = dict()
-        self.records: List[GameRecord] = []
+        self.records = RecordStore()
         self.key_information: KeyGameInformation | None = None
+        self.turns = 0
+        # records[:summary_cursor]已经合并进key_information，summary_tiers[0]为章节总结，更高层为合并后的总结
+        self.summary_cursor = 0
+        self.summary_tiers: List[List[str]] = []
+        self.memory: MemoryIndex | None = MemoryIndex() if memory_enabled else None
+        # 对话历史的关键词检索
+        self.history_index = HistoryIndex(self.records)
 
     def add_record(self, record: GameRecord):
-        self.records.append(record)
+        self.add_raw_record(record.record_type, record.text)
+
+    def add_raw_record(self, record_type: RecordType, text: str):
+        rendered = self.records.append(record_type, text)
+        if self.memory is not None:
+            self.memory.add(rendered)
+        self.history_index.add(record_type, text)
+        if record_type in PLAYER_RECORD_TYPES:
+            self.turns += 1
 
     def add_item(self, item: Item):
         self.inventory[item.name] = item
@@ -21,20 +42,22 @@ class GameState:
         self.inventory.pop(item.name, None)
 
     def to_dict(self):
-        return {
-            "game_story": self.game_story.json(),
-            "current_round": self.current_round.json(),
-            "inventory": [item.json() for item in self.inventory.values()],
-            "records": [record.json() for record in self.records],
-            "key_information": self.key_information.json() if self.key_information else None
-        }
+        from .serialization import state_to_dict
+        return state_to_dict(self)
+
+    def restore_memory(self, chunks: List[dict]):
+        if self.memory is not None:
+            self.memory.close()
+            self.memory = build_memory(self.records, chunks)
+
+    def close(self):
+        # 删除记录和向量的临时段文件，之后不能再读取早期记录
+        self.records.close()
+        if self.memory is not None:
+            self.memory.close()
 
     @classmethod
-    def from_dict(cls, data):
-        cls.game_story = GameStory.parse_raw(data["game_story"])
-        cls.current_round = GameRound.parse_raw(data["current_round"])
-        cls.inventory = {item["name"]: Item.parse_raw(item) for item in data["inventory"]}
-        cls.records = [GameRecord.parse_raw(record_data) for record_data in data["records"]]
-        cls.key_information = KeyGameInformation.parse_raw(data["key_information"]) if data[
-            "key_information"] else None
-        return cls
+    def from_dict(cls, data) -> "GameState":
+        # 同时接受旧格式（各字段为JSON字符串）的存档
+        from .serialization import state_from_dict
+        return state_from_dict(data)
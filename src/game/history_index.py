@@ -0,0 +1,70 @@
+import threading
+from array import array
+from typing import Dict, Iterable, List
+
+from .memory import tokenize
+from .model import RecordType
+
+
+class HistoryIndex:
+    # 对话历史的倒排索引：词 -> 包含该词的记录下标（递增），与GameState.records一一对应
+    # 分词与MemoryIndex相同，中日韩文字按单字和相邻二字建立索引，不依赖分词库
+    # 第一次检索时才为已有记录建立索引，读档不需要为全部记录分词；之后随add_record增量更新
+    def __init__(self, records):
+        self._records = records
+        self._postings: Dict[str, array] = dict()
+        self._by_type: Dict[RecordType, array] = dict()
+        self._size = 0
+        self._active = False
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def add(self, record_type: RecordType, text: str):
+        # 在记录追加到records之后调用
+        with self._lock:
+            if self._active and self._size == len(self._records) - 1:
+                self._add(record_type, text)
+
+    def _add(self, record_type: RecordType, text: str):
+        position = self._size
+        for token in set(tokenize(text)):
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = array('I')
+            postings.append(position)
+        self._by_type.setdefault(RecordType(record_type), array('I')).append(position)
+        self._size += 1
+
+    def _catch_up(self):
+        total = len(self._records)
+        for start in range(self._size, total, 256):
+            for record in self._records.page(start, min(total, start + 256)):
+                self._add(record.record_type, record.text)
+        self._active = True
+
+    def search(self, query: str = "", record_types: Iterable[RecordType] = None) -> List[int]:
+        # 返回同时包含query中所有词、且类型在record_types中的记录下标，按时间排序
+        # query为空时只按类型过滤；两者都为空时返回全部记录
+        with self._lock:
+            self._catch_up()
+            candidates = None
+            if record_types is not None:
+                candidates = set()
+                for record_type in record_types:
+                    candidates.update(self._by_type.get(RecordType(record_type), ()))
+            # 先用最短的倒排列表求交集
+            tokens = sorted(set(tokenize(query)), key=lambda token: len(self._postings.get(token, ())))
+            if query and not tokens:
+                return []
+            for token in tokens:
+                postings = self._postings.get(token)
+                if not postings:
+                    return []
+                candidates = set(postings) if candidates is None else candidates.intersection(postings)
+                if not candidates:
+                    return []
+            if candidates is None:
+                return list(range(self._size))
+            return sorted(candidates)
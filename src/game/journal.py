@@ -0,0 +1,239 @@
+import json
+import os
+import re
+import uuid
+from typing import Dict
+
+from .files import atomic_write
+from .game_state import GameState, PLAYER_RECORD_TYPES
+from .model import GameRound, GameStory, Item, KeyGameInformation, RecordType
+
+JOURNAL_SUFFIX = ".journal"
+JOURNAL_FILE = "journal.jsonl"
+SNAPSHOT_FILE = "snapshot.json"
+# _rewrite写入的第一行以generation开头，读取存档信息时不需要解析整行
+_GENERATION_PATTERN = re.compile(rb'^\{"generation":\s*"([0-9a-f]+)"')
+_PLAYER_RECORD_VALUES = {record_type.value for record_type in PLAYER_RECORD_TYPES}
+
+
+# 追加写入的存档格式，每个存档是一个目录：
+#   journal.jsonl - 第一行是完整的游戏，之后每次保存追加一行增量（新records、回合、物品、key info）
+#   snapshot.json - 某个journal偏移处的回合/物品/key info压缩快照，加载时只需重放之后的部分
+# records只追加不重写，所以第10回合和第1000回合的保存开销相同
+class GameJournal:
+
+    def __init__(self, path: str, snapshot_interval=50):
+        self.path = path
+        self.snapshot_interval = snapshot_interval
+        self._state: GameState | None = None
+        self._generation = None
+        self._record_cursor = 0
+        self._inventory: Dict[str, Item] = dict()
+        self._current_round: GameRound | None = None
+        self._key_information: KeyGameInformation | None = None
+        self._summary_cursor = 0
+        self._summary_tiers = None
+        self._memory_cursor = 0
+        self._entries_since_snapshot = 0
+
+    @property
+    def journal_path(self):
+        return os.path.join(self.path, JOURNAL_FILE)
+
+    @property
+    def snapshot_path(self):
+        return os.path.join(self.path, SNAPSHOT_FILE)
+
+    def save(self, state: GameState):
+        if state is not self._state or not os.path.exists(self.journal_path):
+            self._rewrite(state)
+            return
+        entry = self._delta(state)
+        if not entry:
+            return
+        with open(self.journal_path, 'ab') as f:
+            f.write(_encode_line(entry))
+            f.flush()
+            os.fsync(f.fileno())
+            offset = f.tell()
+        self._attach(state)
+        self._entries_since_snapshot += 1
+        if self._entries_since_snapshot >= self.snapshot_interval:
+            self._write_snapshot(state, offset)
+
+    def load(self) -> GameState:
+        snapshot = None
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'r') as f:
+                snapshot = json.load(f)
+
+        with open(self.journal_path, 'rb') as f:
+            base_line = f.readline()
+            base = json.loads(base_line)
+            state = GameState(game_story=GameStory.model_validate(base["game_story"]),
+                              current_round=GameRound.model_validate(base["current_round"]))
+            _apply(state, base)
+            memory_chunks = [base["memory"]] if base.get("memory") else []
+            use_snapshot = snapshot is not None and snapshot["generation"] == base["generation"]
+            if use_snapshot:
+                _apply(state, snapshot)
+
+            good_offset = f.tell()
+            replayed = 0
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # 最后一行可能因中断只写了一半
+                    break
+                good_offset += len(line)
+                if entry.get("memory"):
+                    memory_chunks.append(entry["memory"])
+                if use_snapshot and good_offset <= snapshot["offset"]:
+                    # snapshot之前的状态已被覆盖，只需要其中的records
+                    _apply_records(state, entry)
+                else:
+                    _apply(state, entry)
+                    replayed += 1
+
+        state.restore_memory(memory_chunks)
+        if os.path.getsize(self.journal_path) != good_offset:
+            with open(self.journal_path, 'r+b') as f:
+                f.truncate(good_offset)
+        self._generation = base["generation"]
+        self._entries_since_snapshot = replayed
+        self._attach(state)
+        return state
+
+    def _rewrite(self, state: GameState):
+        os.makedirs(self.path, exist_ok=True)
+        self._generation = uuid.uuid4().hex
+        base = {
+            "generation": self._generation,
+            "game_story": state.game_story.model_dump(mode="json"),
+            **_state_fields(state),
+            "records": state.records.to_dicts(),
+            "memory": state.memory.to_dict() if state.memory is not None else None,
+        }
+        atomic_write(self.journal_path, _encode_line(base))
+        self._attach(state)
+        self._write_snapshot(state, os.path.getsize(self.journal_path))
+
+    def _write_snapshot(self, state: GameState, offset: int):
+        snapshot = {
+            "generation": self._generation,
+            "offset": offset,
+            "record_count": len(state.records),
+            "title": state.game_story.title,
+            "turns": state.turns,
+            **_state_fields(state),
+        }
+        atomic_write(self.snapshot_path, json.dumps(snapshot, ensure_ascii=False).encode("utf-8"))
+        self._entries_since_snapshot = 0
+
+    def _delta(self, state: GameState) -> dict:
+        entry = dict()
+        if len(state.records) > self._record_cursor:
+            entry["records"] = state.records.to_dicts(self._record_cursor)
+        added = [item.model_dump() for name, item in state.inventory.items() if self._inventory.get(name) is not item]
+        removed = [name for name in self._inventory if name not in state.inventory]
+        if added:
+            entry["inventory_add"] = added
+        if removed:
+            entry["inventory_remove"] = removed
+        if state.current_round is not self._current_round:
+            entry["current_round"] = state.current_round.model_dump(mode="json")
+        if state.key_information is not self._key_information:
+            entry["key_information"] = state.key_information.model_dump() if state.key_information else None
+        if state.summary_cursor != self._summary_cursor or state.summary_tiers is not self._summary_tiers:
+            entry["summary_cursor"] = state.summary_cursor
+            entry["summary_tiers"] = state.summary_tiers
+        if state.memory is not None and len(state.memory) > self._memory_cursor:
+            chunk = state.memory.to_dict(start=self._memory_cursor)
+            if chunk is not None:
+                entry["memory"] = chunk
+        return entry
+
+    def _attach(self, state: GameState):
+        self._state = state
+        self._record_cursor = len(state.records)
+        self._inventory = dict(state.inventory)
+        self._current_round = state.current_round
+        self._key_information = state.key_information
+        self._summary_cursor = state.summary_cursor
+        self._summary_tiers = state.summary_tiers
+        self._memory_cursor = state.memory.embedded_count if state.memory is not None else 0
+
+
+def read_journal_info(path: str) -> dict:
+    # 只读地获取存档列表需要的标题、回合数和是否结束：从snapshot开始只扫描之后的增量
+    # 不构造GameState，不截断写了一半的最后一行（留给真正读档时处理）
+    journal_path = os.path.join(path, JOURNAL_FILE)
+    snapshot_path = os.path.join(path, SNAPSHOT_FILE)
+    snapshot = None
+    if os.path.exists(snapshot_path):
+        with open(snapshot_path, 'r') as f:
+            snapshot = json.load(f)
+    with open(journal_path, 'rb') as f:
+        match = _GENERATION_PATTERN.match(f.read(256))
+        if snapshot is not None and "title" in snapshot and match and \
+                match.group(1).decode("ascii") == snapshot["generation"]:
+            info = {"title": snapshot["title"], "turns": snapshot["turns"],
+                    "game_over": snapshot["current_round"]["game_over"]}
+            f.seek(snapshot["offset"])
+        else:
+            # 没有可用的snapshot（旧存档）：完整扫描一遍
+            f.seek(0)
+            base = json.loads(f.readline())
+            info = {"title": base["game_story"]["title"], "turns": 0, "game_over": base["current_round"]["game_over"]}
+            _count_turns(info, base)
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break
+            _count_turns(info, entry)
+            if "current_round" in entry:
+                info["game_over"] = entry["current_round"]["game_over"]
+    return info
+
+
+def _count_turns(info: dict, entry: dict):
+    info["turns"] += sum(1 for record in entry.get("records", []) if record["record_type"] in _PLAYER_RECORD_VALUES)
+
+
+def _state_fields(state: GameState) -> dict:
+    return {
+        "current_round": state.current_round.model_dump(mode="json"),
+        "inventory": [item.model_dump() for item in state.inventory.values()],
+        "key_information": state.key_information.model_dump() if state.key_information else None,
+        "summary_cursor": state.summary_cursor,
+        "summary_tiers": state.summary_tiers,
+    }
+
+
+def _apply_records(state: GameState, entry: dict):
+    for record in entry.get("records", []):
+        state.add_raw_record(RecordType(record["record_type"]), record["text"])
+
+
+def _apply(state: GameState, entry: dict):
+    _apply_records(state, entry)
+    if "current_round" in entry:
+        state.current_round = GameRound.model_validate(entry["current_round"])
+    if "inventory" in entry:
+        state.inventory = {item["name"]: Item.model_validate(item) for item in entry["inventory"]}
+    for item in entry.get("inventory_add", []):
+        state.add_item(Item.model_validate(item))
+    for name in entry.get("inventory_remove", []):
+        state.inventory.pop(name, None)
+    if "key_information" in entry:
+        key_information = entry["key_information"]
+        state.key_information = KeyGameInformation.model_validate(key_information) if key_information else None
+    if "summary_cursor" in entry:
+        state.summary_cursor = entry["summary_cursor"]
+        state.summary_tiers = entry["summary_tiers"]
+
+
+def _encode_line(entry: dict) -> bytes:
+    return (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
@@ -0,0 +1,255 @@
+import base64
+import re
+import tempfile
+import threading
+import zlib
+from typing import List
+
+import numpy as np
+
+from src.config import ollama_url, embedding_model, embedding_dim, record_hot_limit, record_spill_batch, \
+    record_archive_dir
+
+_TOKEN_PATTERN = re.compile(r'[a-z0-9]+|[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]+')
+_CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]')
+
+
+def tokenize(text: str) -> List[str]:
+    # 拉丁文字按单词切分，中日韩文字按单字和相邻二字切分
+    tokens = []
+    for word in _TOKEN_PATTERN.findall(text.lower()):
+        if _CJK_PATTERN.match(word):
+            tokens.extend(word)
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+
+class HashedEmbedder:
+    def __init__(self, dim=512):
+        self.dim = dim
+        self.name = f"hashed-bow-{dim}"
+        # 向量计算很快且结果确定，读档时重新计算，不写入存档
+        self.persist = False
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                # crc32在不同进程间保持一致，存档中的向量可以直接复用
+                h = zlib.crc32(token.encode("utf-8"))
+                vectors[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        return _normalize(vectors)
+
+
+class OllamaEmbedder:
+    def __init__(self, model: str):
+        from langchain_ollama import OllamaEmbeddings
+        self.client = OllamaEmbeddings(base_url=ollama_url, model=model)
+        self.name = f"ollama-{model}"
+        self.persist = True
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return _normalize(np.asarray(self.client.embed_documents(texts), dtype=np.float32))
+
+
+def create_embedder():
+    return OllamaEmbedder(embedding_model) if embedding_model else HashedEmbedder(embedding_dim)
+
+
+class VectorArchive:
+    # 冷向量的段文件：float32按行追加，检索时通过np.memmap读取，页面由系统按需载入和回收
+    # 文件是临时文件，关闭后自动删除；需要持久化的向量始终完整保存在存档中
+    def __init__(self, dim: int, directory: str = None):
+        self.dim = dim
+        self._file = tempfile.TemporaryFile(prefix="vectors-", suffix=".seg", dir=directory)
+        self._rows = 0
+
+    def __len__(self):
+        return self._rows
+
+    def extend(self, vectors: np.ndarray):
+        self._file.seek(0, 2)
+        self._file.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        self._file.flush()
+        self._rows += len(vectors)
+
+    def rows(self, start: int, stop: int) -> np.ndarray:
+        # 返回的视图只在下一次extend之前有效，调用方持有MemoryIndex的锁
+        if stop <= start:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        view = np.memmap(self._file, dtype=np.float32, mode='r', shape=(self._rows, self.dim))
+        return view[start:stop]
+
+    def close(self):
+        self._file.close()
+
+
+class MemoryIndex:
+    # 与GameState.records一一对应的向量索引，新记录先放入pending，检索或保存时批量embedding
+    # 与RecordStore相同，内存中只保留最近的hot_limit行向量，更早的写入VectorArchive，常驻内存不随回合数增长
+    def __init__(self, embedder=None, hot_limit: int = None, spill_batch: int = None, archive_dir: str = None):
+        self.embedder = embedder or create_embedder()
+        self.hot_limit = record_hot_limit if hot_limit is None else hot_limit
+        self.spill_batch = max(1, record_spill_batch if spill_batch is None else spill_batch)
+        self.archive_dir = archive_dir or record_archive_dir
+        self._matrix: np.ndarray | None = None
+        self._archive: VectorArchive | None = None
+        self._archived = 0
+        self._size = 0
+        self._pending: List[str] = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size + len(self._pending)
+
+    @property
+    def embedded_count(self):
+        return self._size
+
+    @property
+    def archived(self) -> int:
+        return self._archived
+
+    def add(self, text: str):
+        with self._lock:
+            self._pending.append(text)
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        self._append(self.embedder.embed(self._pending))
+        self._pending = []
+
+    def _append(self, vectors: np.ndarray):
+        # 读档时一次追加的向量很多，分批追加，热矩阵不超过hot_limit + spill_batch行
+        step = self.spill_batch if self.hot_limit else len(vectors)
+        for start in range(0, len(vectors), max(1, step)):
+            self._append_hot(vectors[start:start + step])
+            hot = self._size - self._archived
+            if self.hot_limit and hot >= self.hot_limit + self.spill_batch:
+                self._spill(hot - self.hot_limit)
+
+    def _append_hot(self, vectors: np.ndarray):
+        hot = self._size - self._archived
+        if self._matrix is None:
+            self._matrix = np.zeros((max(64, len(vectors)), vectors.shape[1]), dtype=np.float32)
+        elif hot + len(vectors) > len(self._matrix):
+            capacity = max(len(self._matrix) * 2, hot + len(vectors))
+            if self.hot_limit:
+                capacity = min(capacity, max(self.hot_limit + self.spill_batch, hot + len(vectors)))
+            matrix = np.zeros((capacity, self._matrix.shape[1]), dtype=np.float32)
+            matrix[:hot] = self._matrix[:hot]
+            self._matrix = matrix
+        self._matrix[hot:hot + len(vectors)] = vectors
+        self._size += len(vectors)
+
+    def _spill(self, count: int):
+        # 最旧的count行写入段文件，剩余的热向量移到矩阵开头
+        if self._archive is None:
+            self._archive = VectorArchive(self._matrix.shape[1], self.archive_dir)
+        hot = self._size - self._archived
+        self._archive.extend(self._matrix[:count])
+        self._matrix[:hot - count] = self._matrix[count:hot]
+        self._archived += count
+
+    def _rows(self, start: int, stop: int) -> List[np.ndarray]:
+        # 调用方持有锁；冷热两部分分别返回，不拼接成一个大矩阵
+        parts = []
+        if start < min(stop, self._archived):
+            parts.append(self._archive.rows(start, min(stop, self._archived)))
+        hot_start, hot_stop = max(start, self._archived) - self._archived, stop - self._archived
+        if hot_start < hot_stop:
+            parts.append(self._matrix[hot_start:hot_stop])
+        return parts
+
+    def _scores(self, query: str, limit: int) -> np.ndarray:
+        vector = self.embedder.embed([query])[0]
+        parts = self._rows(0, limit)
+        return np.concatenate([part @ vector for part in parts]) if parts else np.zeros(0, dtype=np.float32)
+
+    def search(self, query: str, k=5, limit: int = None) -> List[int]:
+        # 只在前limit条记录中检索，返回按时间排序的记录下标
+        with self._lock:
+            self._flush()
+            limit = self._size if limit is None else min(limit, self._size)
+            if limit <= 0 or k <= 0:
+                return []
+            scores = self._scores(query, limit)
+        k = min(k, limit)
+        top = np.argpartition(-scores, k - 1)[:k]
+        return sorted(int(i) for i in top if scores[i] > 0)
+
+    def rank(self, query: str, limit: int = None) -> List[int]:
+        # 前limit条记录中得分为正的下标，按相似度从高到低排序
+        with self._lock:
+            self._flush()
+            limit = self._size if limit is None else min(limit, self._size)
+            if limit <= 0:
+                return []
+            scores = self._scores(query, limit)
+        order = np.argsort(-scores, kind="stable")
+        return order[scores[order] > 0].tolist()
+
+    def vectors(self, start=0) -> np.ndarray:
+        with self._lock:
+            self._flush()
+            if self._matrix is None:
+                return np.zeros((0, 0))
+            parts = self._rows(start, self._size)
+            return np.concatenate(parts) if parts else np.zeros((0, self._matrix.shape[1]), dtype=np.float32)
+
+    def to_dict(self, start=0) -> dict | None:
+        # 不需要保存向量的embedder返回None，读档后由build_memory重新embedding
+        if not getattr(self.embedder, "persist", True):
+            return None
+        vectors = self.vectors(start)
+        return {
+            "embedder": self.embedder.name,
+            "start": start,
+            "count": len(vectors),
+            "dim": vectors.shape[1] if len(vectors) else 0,
+            "vectors": base64.b64encode(vectors.astype(np.float32).tobytes()).decode("ascii"),
+        }
+
+    def load_chunk(self, data: dict) -> bool:
+        # 只接受同一embedder、且紧接当前末尾的向量块
+        if data["embedder"] != self.embedder.name or data["start"] != self._size or self._pending:
+            return False
+        if data["count"]:
+            vectors = np.frombuffer(base64.b64decode(data["vectors"]), dtype=np.float32)
+            self._append(vectors.reshape(data["count"], data["dim"]))
+        return True
+
+    def close(self):
+        with self._lock:
+            if self._archive is not None:
+                self._archive.close()
+                self._archive = None
+
+
+def build_memory(records, chunks: List[dict]) -> MemoryIndex:
+    # 复用存档中的向量，不匹配时重新embedding
+    memory = MemoryIndex()
+    for chunk in chunks:
+        if not memory.load_chunk(chunk):
+            memory.close()
+            memory = MemoryIndex()
+            break
+    if memory.embedded_count > len(records):
+        memory.close()
+        memory = MemoryIndex()
+    for text in records.rendered(memory.embedded_count):
+        memory.add(text)
+    return memory
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
@@ -0,0 +1,207 @@
+import mmap
+import tempfile
+import threading
+from array import array
+from typing import Dict, Iterator, List
+
+from src.config import record_hot_limit, record_spill_batch, record_archive_dir
+from .model import GameRecord, RecordType
+
+# 类型编码为array中的一个字节，顺序只能追加，不能调整
+RECORD_TYPES: List[RecordType] = list(RecordType)
+_TYPE_CODES: Dict[RecordType, int] = {record_type: code for code, record_type in enumerate(RECORD_TYPES)}
+_PREFIXES: List[str] = [f"{record_type.value}: " for record_type in RECORD_TYPES]
+
+
+class RecordArchive:
+    # 冷记录的段文件：每条记录为1字节类型编码 + UTF-8的渲染文本，通过mmap和偏移索引随机读取
+    # 文件是临时文件，关闭后自动删除；完整的记录始终保存在存档中
+    __slots__ = ("_file", "_offsets", "_map", "_mapped_size")
+
+    def __init__(self, directory: str = None):
+        self._file = tempfile.TemporaryFile(prefix="records-", suffix=".seg", dir=directory)
+        self._offsets = array('Q', [0])
+        self._map: mmap.mmap | None = None
+        self._mapped_size = 0
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def extend(self, codes, texts: List[str]):
+        chunks = []
+        offset = self._offsets[-1]
+        for code, text in zip(codes, texts):
+            chunk = bytes((code,)) + text.encode('utf-8')
+            chunks.append(chunk)
+            offset += len(chunk)
+            self._offsets.append(offset)
+        self._file.seek(0, 2)
+        self._file.write(b"".join(chunks))
+        self._file.flush()
+
+    def _view(self) -> mmap.mmap:
+        # 文件追加后重新映射，读取时只有用到的页会被载入内存
+        size = self._offsets[-1]
+        if self._map is None or self._mapped_size != size:
+            if self._map is not None:
+                self._map.close()
+            self._map = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ)
+            self._mapped_size = size
+        return self._map
+
+    def read(self, index: int) -> tuple:
+        view = self._view()
+        start, end = self._offsets[index], self._offsets[index + 1]
+        return view[start], view[start + 1:end].decode('utf-8')
+
+    def read_range(self, start: int, stop: int) -> List[tuple]:
+        return [self.read(i) for i in range(start, stop)]
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+
+class RecordStore:
+    # 按列存储的游戏记录：类型编码列 + 指向字符串表的下标列
+    # 字符串表中保存的是渲染好的str(GameRecord)，重复的记录只保存一份；需要GameRecord时再按需构造
+    # 内存中只保留最近的hot_limit条记录，更早的记录批量写入RecordArchive，每条冷记录只在内存中保留8字节的偏移
+    # 整局游戏的常驻内存还包括MemoryIndex的向量（同样按hot_limit写入段文件）和HistoryIndex的倒排索引
+    __slots__ = ("_types", "_text_ids", "_texts", "_text_index", "_archive", "_archived", "hot_limit",
+                 "spill_batch", "archive_dir", "_lock")
+
+    def __init__(self, hot_limit: int = None, spill_batch: int = None, archive_dir: str = None):
+        self._types = array('B')
+        self._text_ids = array('I')
+        self._texts: List[str] = []
+        self._text_index: Dict[str, int] = dict()
+        self._archive: RecordArchive | None = None
+        self._archived = 0
+        self.hot_limit = record_hot_limit if hot_limit is None else hot_limit
+        self.spill_batch = record_spill_batch if spill_batch is None else spill_batch
+        self.archive_dir = archive_dir or record_archive_dir
+        # 预生成线程会在主线程追加记录时读取
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_records(cls, records) -> "RecordStore":
+        store = cls()
+        for record in records:
+            store.append(record.record_type, record.text)
+        return store
+
+    def append(self, record_type: RecordType, text: str) -> str:
+        code = _TYPE_CODES[RecordType(record_type)]
+        rendered = _PREFIXES[code] + text
+        with self._lock:
+            self._append_hot(code, rendered)
+            if self.hot_limit and len(self._types) >= self.hot_limit + self.spill_batch:
+                self._spill(len(self._types) - self.hot_limit)
+        return rendered
+
+    def _append_hot(self, code: int, rendered: str):
+        text_id = self._text_index.get(rendered)
+        if text_id is None:
+            text_id = len(self._texts)
+            self._texts.append(rendered)
+            self._text_index[rendered] = text_id
+        self._types.append(code)
+        self._text_ids.append(text_id)
+
+    def _spill(self, count: int):
+        # 最旧的count条写入段文件，剩余的热记录重建字符串表，不再引用的文本随之释放
+        if self._archive is None:
+            self._archive = RecordArchive(self.archive_dir)
+        self._archive.extend(self._types[:count], [self._texts[i] for i in self._text_ids[:count]])
+        hot = [(self._types[i], self._texts[self._text_ids[i]]) for i in range(count, len(self._types))]
+        self._types, self._text_ids, self._texts, self._text_index = array('B'), array('I'), [], dict()
+        for code, rendered in hot:
+            self._append_hot(code, rendered)
+        self._archived += count
+
+    def __len__(self):
+        return self._archived + len(self._types)
+
+    @property
+    def archived(self) -> int:
+        return self._archived
+
+    def _entry(self, index: int) -> tuple:
+        # 调用方持有锁
+        if index < self._archived:
+            return self._archive.read(index)
+        index -= self._archived
+        return self._types[index], self._texts[self._text_ids[index]]
+
+    def _entries(self, start: int, stop: int) -> List[tuple]:
+        cold_stop = min(stop, self._archived)
+        entries = self._archive.read_range(start, cold_stop) if start < cold_stop else []
+        texts = self._texts
+        hot_start = max(start, self._archived) - self._archived
+        hot_stop = stop - self._archived
+        if hot_start < hot_stop:
+            entries.extend((code, texts[text_id]) for code, text_id in
+                           zip(self._types[hot_start:hot_stop], self._text_ids[hot_start:hot_stop]))
+        return entries
+
+    def _range(self, start: int = None, stop: int = None) -> range:
+        return range(*slice(start, stop).indices(len(self)))
+
+    def record_type(self, index: int) -> RecordType:
+        with self._lock:
+            return RECORD_TYPES[self._entry(index)[0]]
+
+    def text(self, index: int) -> str:
+        with self._lock:
+            code, rendered = self._entry(index)
+        return rendered[len(_PREFIXES[code]):]
+
+    def render(self, index: int) -> str:
+        with self._lock:
+            return self._entry(index)[1]
+
+    def rendered(self, start: int = None, stop: int = None) -> List[str]:
+        # 与[str(record) for record in records[start:stop]]相同，但不构造GameRecord也不重新格式化
+        with self._lock:
+            indices = self._range(start, stop)
+            return [rendered for _, rendered in self._entries(indices.start, max(indices.start, indices.stop))]
+
+    def tail(self, n: int) -> List[str]:
+        return self.rendered(max(0, len(self) - n)) if n > 0 else []
+
+    def page(self, start: int, stop: int) -> List[GameRecord]:
+        with self._lock:
+            indices = self._range(start, stop)
+            entries = self._entries(indices.start, max(indices.start, indices.stop))
+        return [GameRecord(record_type=RECORD_TYPES[code], text=rendered[len(_PREFIXES[code]):])
+                for code, rendered in entries]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index.step not in (None, 1):
+                return [self[i] for i in self._range(index.start, index.stop)[::index.step]]
+            return self.page(index.start, index.stop)
+        if index < 0:
+            index += len(self)
+        return self.page(index, index + 1)[0]
+
+    def __iter__(self) -> Iterator[GameRecord]:
+        # 分批读取，冷记录不会一次全部载入内存
+        for start in range(0, len(self), 256):
+            yield from self.page(start, start + 256)
+
+    def to_dicts(self, start: int = 0, stop: int = None) -> List[dict]:
+        # 与GameRecord.model_dump(mode="json")的格式相同
+        with self._lock:
+            indices = self._range(start, stop)
+            entries = self._entries(indices.start, max(indices.start, indices.stop))
+        return [{"record_type": RECORD_TYPES[code].value, "text": rendered[len(_PREFIXES[code]):]}
+                for code, rendered in entries]
+
+    def close(self):
+        with self._lock:
+            if self._archive is not None:
+                self._archive.close()
+                self._archive = None
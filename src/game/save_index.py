@@ -0,0 +1,100 @@
+import os
+import sqlite3
+import time
+from typing import Callable, List
+
+from pydantic import BaseModel, Field
+
+from .game_state import GameState
+
+INDEX_FILE = "index.sqlite"
+SORT_COLUMNS = ("last_played", "turns", "title")
+
+
+class SaveInfo(BaseModel):
+    name: str = Field(..., description="Save file name in save_dir")
+    title: str = Field(..., description="Story title of the saved game")
+    turns: int = Field(..., description="Number of player turns played")
+    last_played: float = Field(..., description="Unix time of the last save")
+    size: int = Field(..., description="Size of the save on disk in bytes")
+    game_over: bool = Field(..., description="Whether the saved game has ended")
+
+
+class SaveIndex:
+    # 存档的元数据索引，加载菜单不需要解析存档本体
+    def __init__(self, save_dir: str):
+        self.save_dir = save_dir
+        self._conn: sqlite3.Connection | None = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(self.save_dir, exist_ok=True)
+            self._conn = sqlite3.connect(os.path.join(self.save_dir, INDEX_FILE), check_same_thread=False)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS saves (
+                    name TEXT PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    turns INTEGER NOT NULL,
+                    last_played REAL NOT NULL,
+                    size INTEGER NOT NULL,
+                    game_over INTEGER NOT NULL
+                )
+            """)
+        return self._conn
+
+    def close(self):
+        # 关闭后再次使用时重新打开连接
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def update(self, name: str, state: GameState, last_played: float = None):
+        self.update_info(name, state.game_story.title, state.turns, state.current_round.game_over, last_played)
+
+    def update_info(self, name: str, title: str, turns: int, game_over: bool, last_played: float = None):
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO saves (name, title, turns, last_played, size, game_over) VALUES (?, ?, ?, ?, ?, ?)",
+                (name, title, turns, last_played or time.time(), save_size(os.path.join(self.save_dir, name)),
+                 int(game_over))
+            )
+
+    def remove(self, names: List[str]):
+        with self._connection() as conn:
+            conn.executemany("DELETE FROM saves WHERE name = ?", [(name,) for name in names])
+
+    def sync(self, save_files: List[str], read_info: Callable[[str], dict]):
+        # 删除已不存在的存档，补齐索引中缺失的存档（只在第一次遇到时读取一次）
+        # read_info只读地返回title、turns、game_over，不加载完整的游戏
+        indexed = {row[0] for row in self._connection().execute("SELECT name FROM saves")}
+        on_disk = set(save_files)
+        if indexed - on_disk:
+            self.remove(list(indexed - on_disk))
+        for name in on_disk - indexed:
+            try:
+                info = read_info(name)
+            except Exception:
+                continue
+            self.update_info(name, info["title"], info["turns"], info["game_over"],
+                             last_played=os.path.getmtime(os.path.join(self.save_dir, name)))
+
+    def count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM saves").fetchone()[0]
+
+    def list(self, sort_by="last_played", descending=True, offset=0, limit=-1) -> List[SaveInfo]:
+        if sort_by not in SORT_COLUMNS:
+            raise ValueError(f"Unknown sort column: {sort_by}")
+        rows = self._connection().execute(
+            f"SELECT name, title, turns, last_played, size, game_over FROM saves "
+            f"ORDER BY {sort_by} {'DESC' if descending else 'ASC'}, name LIMIT ? OFFSET ?",
+            (limit, offset)
+        )
+        return [SaveInfo(name=name, title=title, turns=turns, last_played=last_played, size=size,
+                         game_over=bool(game_over))
+                for name, title, turns, last_played, size, game_over in rows]
+
+
+def save_size(path: str) -> int:
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+    return os.path.getsize(path) if os.path.exists(path) else 0
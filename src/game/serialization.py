@@ -0,0 +1,144 @@
+import gzip
+import json
+from typing import List, Optional
+
+from pydantic import BaseModel, ValidationError
+from pydantic_core import to_json, to_jsonable_python
+
+from src.config import save_compression
+from .game_state import GameState, PLAYER_RECORD_TYPES
+from .model import GameRecord, GameRound, GameStory, Item, KeyGameInformation
+
+# JSON存档格式：
+#   version 1 - 每个模型先用.json()编码成字符串，再整体json.dump一次（旧存档，读取时自动迁移，下次保存写成新格式）
+#   version 2 - 一次编码的嵌套JSON，可以用gzip/zstd压缩，读取时按文件头识别，与文件名无关
+SAVE_VERSION = 2
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+class SaveData(BaseModel):
+    version: int = SAVE_VERSION
+    game_story: GameStory
+    current_round: GameRound
+    inventory: List[Item] = []
+    records: List[GameRecord] = []
+    key_information: Optional[KeyGameInformation] = None
+    # 旧存档没有summary_cursor，视为已经总结到最后
+    summary_cursor: Optional[int] = None
+    summary_tiers: List[List[str]] = []
+    memory: Optional[dict] = None
+
+
+def _payload(state: GameState) -> dict:
+    # 模型对象原样放入，由pydantic_core在编码时一并序列化，不再先转成字符串
+    return {
+        "version": SAVE_VERSION,
+        "game_story": state.game_story,
+        "current_round": state.current_round,
+        "inventory": list(state.inventory.values()),
+        "records": state.records.to_dicts(),
+        "key_information": state.key_information,
+        "summary_cursor": state.summary_cursor,
+        "summary_tiers": state.summary_tiers,
+        "memory": state.memory.to_dict() if state.memory is not None else None,
+    }
+
+
+def state_to_dict(state: GameState) -> dict:
+    return to_jsonable_python(_payload(state))
+
+
+def encode_state(state: GameState, compression: str = None) -> bytes:
+    return compress(to_json(_payload(state)), save_compression if compression is None else compression)
+
+
+def decode_state(data: bytes) -> GameState:
+    data = decompress(data)
+    try:
+        save = SaveData.model_validate_json(data)
+    except ValidationError:
+        save = SaveData.model_validate(migrate(json.loads(data)))
+    return state_from_save(save)
+
+
+def migrate(data: dict) -> dict:
+    if data.get("version", 1) >= SAVE_VERSION:
+        return data
+    # version 1的模型字段是JSON字符串
+    data = dict(data)
+    for key in ("game_story", "current_round", "key_information"):
+        if isinstance(data.get(key), str):
+            data[key] = json.loads(data[key])
+    for key in ("inventory", "records"):
+        data[key] = [json.loads(value) if isinstance(value, str) else value for value in data.get(key, [])]
+    data["version"] = SAVE_VERSION
+    return data
+
+
+def read_save_info(path: str) -> dict:
+    # 存档列表只需要标题、回合数和是否结束，不构造GameState
+    with open(path, 'rb') as f:
+        data = migrate(json.loads(decompress(f.read())))
+    player_types = {record_type.value for record_type in PLAYER_RECORD_TYPES}
+    return {"title": data["game_story"]["title"],
+            "turns": sum(1 for record in data["records"] if record["record_type"] in player_types),
+            "game_over": data["current_round"]["game_over"]}
+
+
+def state_from_dict(data: dict) -> GameState:
+    return state_from_save(SaveData.model_validate(migrate(data)))
+
+
+def state_from_save(save: SaveData) -> GameState:
+    state = GameState(game_story=save.game_story, current_round=save.current_round)
+    for item in save.inventory:
+        state.add_item(item)
+    for record in save.records:
+        state.add_raw_record(record.record_type, record.text)
+    state.key_information = save.key_information
+    if save.summary_cursor is not None:
+        state.summary_cursor = save.summary_cursor
+    elif state.key_information:
+        state.summary_cursor = len(state.records)
+    state.summary_tiers = save.summary_tiers
+    state.restore_memory([save.memory] if save.memory else [])
+    return state
+
+
+def save_state(path: str, state: GameState, compression: str = None):
+    data = encode_state(state, compression)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def load_state(path: str) -> GameState:
+    with open(path, 'rb') as f:
+        return decode_state(f.read())
+
+
+def compress(data: bytes, compression: str | None) -> bytes:
+    if not compression:
+        return data
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=6)
+    if compression == "zstd":
+        return _zstd().ZstdCompressor(level=3).compress(data)
+    raise ValueError(f"Unknown save compression: {compression}")
+
+
+def decompress(data: bytes) -> bytes:
+    if data.startswith(GZIP_MAGIC):
+        return gzip.decompress(data)
+    if data.startswith(ZSTD_MAGIC):
+        return _zstd().ZstdDecompressor().decompress(data)
+    return data
+
+
+def _zstd():
+    # zstandard是可选依赖，只有使用zstd压缩时才需要
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError("zstd compressed saves require the zstandard package (pip install zstandard)") from e
+    return zstandard
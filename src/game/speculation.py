@@ -0,0 +1,110 @@
+import random
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict
+
+from src.llm.scheduler import Priority, RequestContext, make_request_context, request_context, scheduler
+from .model import Choice, GameRecord, GameRound, RecordType
+
+
+class SpeculativeBranch:
+    def __init__(self, choice: Choice, player_record: GameRecord, future: Future, context: RequestContext):
+        self.choice = choice
+        self.player_record = player_record
+        self.future = future
+        self.context = context
+
+    def result(self) -> GameRound | None:
+        # 分支生成失败（包括在调度队列中被丢弃）时返回None，由调用方重新生成
+        try:
+            return self.future.result()
+        except Exception:
+            return None
+
+
+class Speculator:
+    # 玩家阅读选项时，为前N个选项提前生成下一回合
+    def __init__(self, max_workers=2, max_branches=2, budget=100, preroll=True, deadline=None):
+        self.max_branches = max_branches
+        self.deadline = deadline
+        self.budget = budget
+        self.preroll = preroll
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculation")
+        # 按选项在当前回合中的下标保存分支
+        self._branches: Dict[int, SpeculativeBranch] = dict()
+        self.stats = {"launched": 0, "hits": 0, "ready_hits": 0, "misses": 0, "wasted": 0}
+
+    def reset(self):
+        self.discard()
+        self.stats = {k: 0 for k in self.stats}
+
+    def start(self, current_round: GameRound, dice: random.Random,
+              generate: Callable[[str], GameRound]):
+        self.discard()
+        if current_round.game_over:
+            return
+        for index, choice in enumerate(current_round.choices):
+            if len(self._branches) >= self.max_branches or self.stats["launched"] >= self.budget:
+                break
+            if choice.requires_roll and not self.preroll:
+                continue
+            # 用dice的副本预先掷骰，不推进dice：选中该选项时用dice掷出的是同一个结果，
+            # 相同的dice_seed无论是否开启预生成都得到相同的掷骰序列
+            player_record = make_choice_record(choice, _preview(dice))
+            # 分支请求以低优先级排队，超过截止时间或被丢弃时不再发给模型
+            context = make_request_context(Priority.SPECULATIVE, self.deadline, threading.Event())
+            future = self._executor.submit(_run_in_context, context, generate, str(player_record))
+            self._branches[index] = SpeculativeBranch(choice, player_record, future, context)
+            self.stats["launched"] += 1
+
+    def take(self, index: int | None, player_record: GameRecord = None) -> SpeculativeBranch | None:
+        # player_record是提交时实际掷骰得到的记录，与分支预掷的结果不同时分支作废
+        branch = self._branches.pop(index, None) if index is not None else None
+        if branch is not None and branch.player_record != player_record:
+            self._branches[index] = branch
+            branch = None
+        self.discard()
+        if branch is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        if branch.future.done():
+            self.stats["ready_hits"] += 1
+        else:
+            scheduler.promote(branch.context, Priority.INTERACTIVE)
+        return branch
+
+    def discard(self):
+        for branch in self._branches.values():
+            # 已经在生成的分支无法中断，结果直接丢弃；仍在调度队列中的请求会被取消
+            branch.future.cancel()
+            branch.context.cancel_event.set()
+            self.stats["wasted"] += 1
+        self._branches.clear()
+
+    def shutdown(self):
+        # 取消未开始的分支，已经在生成的线程结束后自行退出，不等待
+        self.discard()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def hit_rate(self) -> float:
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+
+def _preview(dice: random.Random) -> random.Random:
+    preview = random.Random()
+    preview.setstate(dice.getstate())
+    return preview
+
+
+def _run_in_context(context: RequestContext, generate: Callable[[str], GameRound], player_choice: str):
+    with request_context(context):
+        return generate(player_choice)
+
+
+def make_choice_record(choice: Choice, dice: random.Random) -> GameRecord:
+    return GameRecord(
+        record_type=RecordType.PLAYER_CHOICE,
+        text=choice.text if not choice.requires_roll else f"{choice.text} (roll: {dice.randint(1, 20)} / success threshold: {choice.success_threshold})"
+    )
@@ -0,0 +1,159 @@
+import os
+import threading
+import time
+from typing import Dict, List
+
+from pydantic import BaseModel, Field
+
+from src import config
+from src.llm.scheduler import Priority, make_request_context, request_context, scheduler
+from .files import atomic_write
+from .model import GameRound, GameStory
+
+POOL_FILE = "story_pool.jsonl"
+
+
+class PooledStory(BaseModel):
+    keywords: List[str] = Field(..., description="Keywords the story was generated from")
+    lang: str = Field(..., description="Language the story was generated in")
+    model: str = Field(..., description="Model that generated the story")
+    game_story: GameStory = Field(..., description="Story outline")
+    first_round: GameRound = Field(..., description="First round of the game")
+    created_at: float = Field(..., description="Unix time the story was generated")
+
+
+def normalize_keywords(keywords: List[str]) -> set:
+    return {keyword.strip().lower() for keyword in keywords if keyword.strip()}
+
+
+def keyword_similarity(a: List[str], b: List[str]) -> float:
+    a, b = normalize_keywords(a), normalize_keywords(b)
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class StoryPool:
+    # 后台预生成随机主题的故事和第一回合，新游戏直接取用；池子保存在磁盘上，重启后继续使用
+    # 只在空闲时（例如玩家停留在主菜单）由调用方触发refill，游戏开始时pause，不与游戏争抢调度名额
+    def __init__(self, path: str, size=3, match_threshold=0.5):
+        self.path = path
+        self.size = size
+        self.match_threshold = match_threshold
+        self._lock = threading.Lock()
+        self._refilling = False
+        self._cancel = threading.Event()
+        self._entries: List[PooledStory] = self._load()
+        self.stats = {"generated": 0, "failed": 0, "taken": 0, "keyword_hits": 0, "misses": 0}
+
+    def _load(self) -> List[PooledStory]:
+        if not os.path.exists(self.path):
+            return []
+        entries = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = PooledStory.model_validate_json(line)
+                except ValueError:
+                    continue
+                # 切换语言或模型后，旧的故事不再使用
+                if entry.lang == config.lang and entry.model == _story_model():
+                    entries.append(entry)
+        return entries
+
+    def _save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        lines = "".join(entry.model_dump_json() + "\n" for entry in self._entries)
+        atomic_write(self.path, lines.encode('utf-8'))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def take(self, keywords: List[str] = None) -> PooledStory | None:
+        with self._lock:
+            index = None
+            if not keywords:
+                index = 0 if self._entries else None
+            else:
+                # 关键词足够接近时复用随机主题的故事
+                scores = [keyword_similarity(keywords, entry.keywords) for entry in self._entries]
+                best = max(range(len(scores)), key=scores.__getitem__, default=None)
+                if best is not None and scores[best] >= self.match_threshold:
+                    index = best
+                    self.stats["keyword_hits"] += 1
+            if index is None:
+                self.stats["misses"] += 1
+                entry = None
+            else:
+                entry = self._entries.pop(index)
+                self.stats["taken"] += 1
+                self._save()
+        return entry
+
+    def refill(self):
+        with self._lock:
+            if self._refilling or len(self._entries) >= self.size:
+                return
+            self._refilling = True
+            self._cancel = threading.Event()
+        # daemon线程，退出游戏时不等待正在进行的生成
+        threading.Thread(target=self._fill, args=(self._cancel,), name="story-pool", daemon=True).start()
+
+    def pause(self):
+        # 排队中的预生成请求立即放弃；已经发出的请求完成后不再继续生成
+        with self._lock:
+            self._cancel.set()
+
+    @property
+    def refilling(self) -> bool:
+        return self._refilling
+
+    def _fill(self, cancel: threading.Event):
+        from src.llm.game_master import GameMaster
+        from src.llm.story_generator import StoryGenerator, random_keywords
+
+        try:
+            while len(self._entries) < self.size:
+                # 有游戏请求在排队或执行时等待空闲，pause后退出
+                while scheduler.busy() and not cancel.wait(1):
+                    pass
+                if cancel.is_set():
+                    return
+                keywords = random_keywords()
+                # 以最低优先级排队，pause时取消
+                with request_context(make_request_context(Priority.PREGENERATION, cancel_event=cancel)):
+                    story = StoryGenerator().generate_story(keywords)
+                    first_round = GameMaster(game_story=story).next_round() if story and not cancel.is_set() \
+                        else None
+                if cancel.is_set():
+                    return
+                if not first_round:
+                    self.stats["failed"] += 1
+                    return
+                with self._lock:
+                    self._entries.append(PooledStory(keywords=keywords, lang=config.lang, model=_story_model(),
+                                                     game_story=story, first_round=first_round,
+                                                     created_at=time.time()))
+                    self._save()
+                self.stats["generated"] += 1
+        finally:
+            with self._lock:
+                self._refilling = False
+
+
+def _story_model() -> str:
+    from src.llm.router import get_role_config
+    return get_role_config("story_generator")["model"]
+
+
+_pools: Dict[str, StoryPool] = dict()
+_pools_lock = threading.Lock()
+
+
+def shared_story_pool(path: str) -> StoryPool:
+    # 同一进程中的GameManager（例如服务器的各个session）共用一个池子
+    path = os.path.abspath(path)
+    with _pools_lock:
+        if path not in _pools:
+            _pools[path] = StoryPool(path, size=config.story_pool_size, match_threshold=config.story_pool_match)
+        return _pools[path]
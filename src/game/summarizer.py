@@ -0,0 +1,66 @@
+from typing import List
+
+from src.llm.context import count_tokens
+from src.llm.record_keeper import RecordKeeper
+from .game_state import GameState
+from .model import KeyGameInformation
+
+
+class SummaryUpdate:
+    def __init__(self, key_information: KeyGameInformation, summary_tiers: List[List[str]], summary_cursor: int):
+        self.key_information = key_information
+        self.summary_tiers = summary_tiers
+        self.summary_cursor = summary_cursor
+
+    def apply(self, state: GameState):
+        state.key_information = self.key_information
+        state.summary_tiers = self.summary_tiers
+        state.summary_cursor = self.summary_cursor
+
+
+class IncrementalSummarizer:
+    # 只把上次总结之后的新记录合并进KeyGameInformation，章节总结逐层向上合并
+    def __init__(self, record_keeper: RecordKeeper, token_threshold=1500, tier_size=5):
+        self.record_keeper = record_keeper
+        self.token_threshold = token_threshold
+        self.tier_size = tier_size
+
+    def pending_records(self, state: GameState) -> List[str]:
+        return state.records.rendered(state.summary_cursor)
+
+    def should_summarize(self, state: GameState) -> bool:
+        return sum(count_tokens(record) for record in self.pending_records(state)) >= self.token_threshold
+
+    def summarize(self, key_information: KeyGameInformation | None, summary_tiers: List[List[str]],
+                  new_records: List[str], summary_cursor: int) -> SummaryUpdate | None:
+        # 只读取参数，不修改game_state，可以在后台线程中运行
+        # new_records是records[summary_cursor:]，超出预算时只总结最早的一部分，其余的留到下一次
+        next_key_info, summarized = self.record_keeper.summary(
+            recent_interactions=new_records,
+            key_game_info=key_information,
+            chapter_summaries=chapter_summaries(summary_tiers)
+        )
+        if not next_key_info:
+            return None
+        tiers = [list(tier) for tier in summary_tiers] or [[]]
+        tiers[0].append(next_key_info.summary_of_recent_events)
+        level = 0
+        while len(tiers[level]) >= self.tier_size:
+            rolled = self.record_keeper.roll_up(tiers[level])
+            if not rolled:
+                break
+            tiers[level] = []
+            if level + 1 == len(tiers):
+                tiers.append([])
+            tiers[level + 1].append(rolled)
+            level += 1
+        return SummaryUpdate(next_key_info, tiers, summary_cursor + summarized)
+
+    def summarize_state(self, state: GameState) -> SummaryUpdate | None:
+        return self.summarize(state.key_information, state.summary_tiers, self.pending_records(state),
+                              state.summary_cursor)
+
+
+def chapter_summaries(summary_tiers: List[List[str]]) -> List[str]:
+    # 高层的总结覆盖更早的内容，按时间顺序从最高层排到第0层
+    return [summary for tier in reversed(summary_tiers) for summary in tier]
@@ -0,0 +1,115 @@
+import re
+from collections import deque
+from typing import Callable, Dict, List
+
+from .prompt import common_prefix_length
+
+# 中日韩字符大约一个字一个token，其它文字大约4个字符一个token
+_CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]')
+
+
+def estimate_tokens(text: str) -> int:
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+_tokenizer: Callable[[str], int] = estimate_tokens
+
+
+def set_tokenizer(tokenizer: Callable[[str], int] | None):
+    # 可以替换为模型真实的tokenizer，None恢复为估算
+    global _tokenizer
+    _tokenizer = tokenizer or estimate_tokens
+
+
+def count_tokens(text: str) -> int:
+    return _tokenizer(text) if text else 0
+
+
+def truncate_to_tokens(text: str, max_tokens: int, marker="\n...") -> str:
+    tokens = count_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    cut = int(len(text) * max_tokens / tokens)
+    while cut > 0 and count_tokens(text[:cut] + marker) > max_tokens:
+        cut = int(cut * 0.9)
+    return text[:cut] + marker
+
+
+class ContextWindow:
+    # 按token为prompt各部分分配预算，并记录每次调用的prompt大小
+    def __init__(self, role: str, num_ctx: int, num_predict: int, budgets: Dict[str, float] = None):
+        self.role = role
+        self.num_ctx = num_ctx
+        self.num_predict = num_predict
+        self.budgets = budgets or dict()
+        self.usage_log = deque(maxlen=100)
+        self.last_usage = None
+        self._last_prompt = ""
+
+    def fork(self) -> "ContextWindow":
+        # 预生成分支使用的副本：与当前的上一次prompt比较前缀，但不改动本窗口的记录
+        window = ContextWindow(self.role, self.num_ctx, self.num_predict, self.budgets)
+        window._last_prompt = self._last_prompt
+        return window
+
+    @property
+    def input_budget(self) -> int:
+        return self.num_ctx - self.num_predict
+
+    def fit_section(self, name: str, text: str) -> str:
+        if name not in self.budgets or not text:
+            return text
+        return truncate_to_tokens(text, int(self.input_budget * self.budgets[name]))
+
+    def pack(self, interactions: List[str], used_tokens: int, separator="\n\n", oldest_first=False) -> List[str]:
+        # 默认从最新的记录开始，尽量多地放入剩余预算；oldest_first从最早的记录开始，保留的是一段连续的前缀
+        remaining = self.input_budget - used_tokens
+        separator_tokens = count_tokens(separator)
+        packed = []
+        for interaction in (interactions or []) if oldest_first else reversed(interactions or []):
+            cost = count_tokens(interaction) + separator_tokens
+            if cost > remaining:
+                break
+            packed.append(interaction)
+            remaining -= cost
+        if not oldest_first:
+            packed.reverse()
+        return packed
+
+    def fit_items(self, name: str, items: List[str], separator="\n\n") -> List[str]:
+        # 按顺序放入不超过该部分预算的条目
+        remaining = int(self.input_budget * self.budgets.get(name, 1.0))
+        separator_tokens = count_tokens(separator)
+        fitted = []
+        for item in items or []:
+            cost = count_tokens(item) + separator_tokens
+            if cost > remaining:
+                break
+            fitted.append(item)
+            remaining -= cost
+        return fitted
+
+    def record(self, prompt: str, offered: int = 0, packed: int = 0) -> dict:
+        # 与上一次prompt相同的前缀可以复用Ollama的KV cache，不需要重新预填充
+        prefix = prompt[:common_prefix_length(prompt, self._last_prompt)]
+        prompt_tokens = count_tokens(prompt)
+        prefix_tokens = count_tokens(prefix)
+        usage = {
+            "role": self.role,
+            "prompt_chars": len(prompt),
+            "prompt_tokens": prompt_tokens,
+            "num_ctx": self.num_ctx,
+            "interactions_offered": offered,
+            "interactions_packed": packed,
+            "prefix_tokens": prefix_tokens,
+            "prefix_reuse": prefix_tokens / prompt_tokens if prompt_tokens else 0.0,
+        }
+        self._last_prompt = prompt
+        self.last_usage = usage
+        self.usage_log.append(usage)
+        return usage
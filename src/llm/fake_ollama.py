@@ -0,0 +1,323 @@
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+# 离线的Ollama替身，按请求类型返回预设或随机生成的GameStory/GameRound/KeyGameInformation JSON
+# 可配置生成速度、首token延迟、格式错误率和失败率，用于基准测试和无模型环境下的调试
+
+WORDS = ["ancient", "shadow", "lantern", "river", "tower", "whisper", "blade", "storm", "forest", "ruin", "oath",
+         "crystal", "merchant", "gate", "ember", "mist", "throne", "relic", "hollow", "wolf"]
+
+
+class SyntheticContent:
+    def __init__(self, rng: random.Random, narrative_words=120):
+        self.rng = rng
+        self.narrative_words = narrative_words
+
+    def sentence(self, words=12) -> str:
+        return " ".join(self.rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+    def paragraph(self, words: int) -> str:
+        return " ".join(self.sentence(12) for _ in range(max(1, words // 12)))
+
+    def item(self) -> dict:
+        return {"name": f"{self.rng.choice(WORDS)} {self.rng.choice(WORDS)}".title(), "description": self.sentence(8)}
+
+    def game_story(self) -> dict:
+        return {
+            "title": f"The {self.rng.choice(WORDS).title()} of {self.rng.choice(WORDS).title()}",
+            "setting": self.paragraph(40),
+            "main_conflict": self.paragraph(24),
+            "key_characters": [{"name": self.rng.choice(WORDS).title(), "role": role, "description": self.sentence()}
+                               for role in ("protagonist", "antagonist", "ally")],
+            "key_items": [self.item() for _ in range(3)],
+        }
+
+    def game_round(self) -> dict:
+        return {
+            "narrative": self.paragraph(self.narrative_words),
+            "choices": [{"text": self.sentence(6), "requires_roll": i == 2, "success_threshold": self.rng.randint(5, 19)}
+                        for i in range(3)],
+            "get_items": [self.item()] if self.rng.random() < 0.2 else [],
+            "lose_items": [],
+            "game_over": False,
+        }
+
+    def key_information(self) -> dict:
+        return {"plot_developments": [self.sentence() for _ in range(3)], "summary_of_recent_events": self.paragraph(48)}
+
+    def summary_text(self) -> str:
+        return self.paragraph(48)
+
+
+def detect_kind(prompt: str, schema) -> str:
+    title = schema.get("title") if isinstance(schema, dict) else None
+    if title in ("GameStory", "GameRound", "KeyGameInformation"):
+        return title
+    if "Merge the following chapter summaries" in prompt:
+        return "text"
+    if "Game Master (GM)" in prompt and "You are the Game Master" in prompt:
+        return "GameRound"
+    if "game recorder" in prompt:
+        return "KeyGameInformation"
+    if "story outlines" in prompt:
+        return "GameStory"
+    return "text"
+
+
+class FakeOllamaServer:
+    def __init__(self, host="127.0.0.1", port=0, token_rate=200.0, ttft=0.05, malformed_rate=0.0, failure_rate=0.0,
+                 load_time=0.0, narrative_words=120, seed=0, canned: Dict[str, List[str]] = None):
+        self.token_rate = token_rate
+        self.ttft = ttft
+        self.malformed_rate = malformed_rate
+        self.failure_rate = failure_rate
+        self.load_time = load_time
+        self.narrative_words = narrative_words
+        self.canned = canned or dict()
+        self.rng = random.Random(seed)
+        self.stats = {"requests": 0, "failures": 0, "malformed": 0, "in_flight": 0, "max_in_flight": 0}
+        self._loaded_models = set()
+        self._lock = threading.Lock()
+        self._canned_index: Dict[str, int] = dict()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def _draw(self):
+        with self._lock:
+            return self.rng.random(), self.rng.random(), self.rng.getrandbits(32)
+
+    def _next_canned(self, kind: str) -> str | None:
+        responses = self.canned.get(kind)
+        if not responses:
+            return None
+        with self._lock:
+            index = self._canned_index.get(kind, 0)
+            self._canned_index[kind] = index + 1
+        return responses[index % len(responses)]
+
+    def completion(self, prompt: str, schema) -> tuple[str | None, bool]:
+        # 返回(输出, 是否格式错误)，输出为None表示请求失败
+        failure_draw, malformed_draw, seed = self._draw()
+        if failure_draw < self.failure_rate:
+            return None, False
+        kind = detect_kind(prompt, schema)
+        text = self._next_canned(kind)
+        if text is None:
+            content = SyntheticContent(random.Random(seed), self.narrative_words)
+            if kind == "GameStory":
+                text = json.dumps(content.game_story(), ensure_ascii=False)
+            elif kind == "GameRound":
+                text = json.dumps(content.game_round(), ensure_ascii=False)
+            elif kind == "KeyGameInformation":
+                text = json.dumps(content.key_information(), ensure_ascii=False)
+            else:
+                text = content.summary_text()
+        malformed = kind != "text" and malformed_draw < self.malformed_rate
+        if malformed:
+            # 模拟常见的错误：被截断或者包了代码块
+            text = text[:int(len(text) * 0.8)] if malformed_draw < self.malformed_rate / 2 else f"```json\n{text}\n```"
+        return text, malformed
+
+    def tokens(self, text: str) -> List[str]:
+        return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, data: dict, status=200):
+                body = json.dumps(data).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _write_chunk(self, data: dict):
+                line = (json.dumps(data) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n")
+                self.wfile.flush()
+
+            def do_GET(self):
+                if self.path == "/api/tags":
+                    self._send_json({"models": [{"name": model, "model": model} for model in server._loaded_models]})
+                elif self.path == "/api/ps":
+                    self._send_json({"models": [{"name": model, "model": model} for model in server._loaded_models]})
+                else:
+                    body = b"Ollama is running"
+                    self.send_response(200)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if self.path == "/api/embed":
+                    inputs = request.get("input", [])
+                    inputs = [inputs] if isinstance(inputs, str) else inputs
+                    self._send_json({"model": request.get("model"),
+                                     "embeddings": [_fake_embedding(text) for text in inputs]})
+                elif self.path in ("/api/generate", "/api/chat"):
+                    self._generate(request, chat=self.path == "/api/chat")
+                else:
+                    self._send_json({"error": "not found"}, status=404)
+
+            def _generate(self, request: dict, chat: bool):
+                model = request.get("model", "")
+                with server._lock:
+                    server.stats["requests"] += 1
+                    server.stats["in_flight"] += 1
+                    server.stats["max_in_flight"] = max(server.stats["max_in_flight"], server.stats["in_flight"])
+                try:
+                    self._respond(request, model, chat)
+                finally:
+                    with server._lock:
+                        server.stats["in_flight"] -= 1
+
+            def _respond(self, request: dict, model: str, chat: bool):
+                started = time.perf_counter()
+                load_duration = 0.0
+                keep_alive = request.get("keep_alive")
+                if model not in server._loaded_models and server.load_time:
+                    time.sleep(server.load_time)
+                    load_duration = server.load_time
+                server._loaded_models.add(model)
+                if keep_alive in (0, "0", "0s"):
+                    server._loaded_models.discard(model)
+
+                if chat:
+                    prompt = "\n".join(message.get("content", "") for message in request.get("messages", []))
+                else:
+                    prompt = request.get("prompt", "")
+                if not prompt:
+                    # 空prompt只加载模型
+                    self._send_json(_final({"model": model, "created_at": _now(), "response": "", "done": True},
+                                           started, load_duration, 0, 0))
+                    return
+
+                text, malformed = server.completion(prompt, request.get("format"))
+                if text is None:
+                    with server._lock:
+                        server.stats["failures"] += 1
+                    self._send_json({"error": "simulated failure"}, status=500)
+                    return
+                if malformed:
+                    with server._lock:
+                        server.stats["malformed"] += 1
+
+                tokens = server.tokens(text)
+                prompt_tokens = len(prompt) // 4
+                if not request.get("stream", True):
+                    time.sleep(server.ttft + len(tokens) / server.token_rate)
+                    self._send_json(_final(_message(model, text, chat, True), started, load_duration,
+                                           prompt_tokens, len(tokens)))
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                time.sleep(server.ttft)
+                for token in tokens:
+                    self._write_chunk(_message(model, token, chat, False))
+                    time.sleep(1.0 / server.token_rate)
+                self._write_chunk(_final(_message(model, "", chat, True), started, load_duration,
+                                         prompt_tokens, len(tokens)))
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _message(model: str, text: str, chat: bool, done: bool) -> dict:
+    message = {"model": model, "created_at": _now(), "done": done}
+    if chat:
+        message["message"] = {"role": "assistant", "content": text}
+    else:
+        message["response"] = text
+    return message
+
+
+def _final(message: dict, started: float, load_duration: float, prompt_tokens: int, eval_tokens: int) -> dict:
+    total = time.perf_counter() - started
+    message.update({
+        "done_reason": "stop",
+        "total_duration": int(total * 1e9),
+        "load_duration": int(load_duration * 1e9),
+        "prompt_eval_count": prompt_tokens,
+        "prompt_eval_duration": 0,
+        "eval_count": eval_tokens,
+        "eval_duration": int(max(0.0, total - load_duration) * 1e9),
+    })
+    return message
+
+
+def _fake_embedding(text: str, dim=64) -> List[float]:
+    rng = random.Random(text)
+    return [rng.uniform(-1, 1) for _ in range(dim)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline stand-in for the Ollama HTTP API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--token-rate", type=float, default=200.0, help="tokens per second")
+    parser.add_argument("--ttft", type=float, default=0.05, help="time to first token in seconds")
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--load-time", type=float, default=0.0, help="simulated model load time in seconds")
+    parser.add_argument("--narrative-words", type=int, default=120)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--canned", help="JSON file mapping GameStory/GameRound/KeyGameInformation/text to lists of responses")
+    args = parser.parse_args()
+    canned = None
+    if args.canned:
+        with open(args.canned, 'r') as f:
+            canned = json.load(f)
+    server = FakeOllamaServer(args.host, args.port, token_rate=args.token_rate, ttft=args.ttft,
+                              malformed_rate=args.malformed_rate, failure_rate=args.failure_rate,
+                              load_time=args.load_time, narrative_words=args.narrative_words, seed=args.seed,
+                              canned=canned)
+    print(f"Fake Ollama listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
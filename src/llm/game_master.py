@@ -1,14 +1,19 @@
+import copy
 import traceback
-from typing import List
+from typing import Callable, List
 
+import yaml
 from langchain_core.output_parsers import PydanticOutputParser
-from langchain_core.prompts import PromptTemplate
-from langchain_ollama import ChatOllama
 
-from src.config import ollama_url, model_name, debug, lang
+from src.config import debug, lang, context_budgets
 from src.game.model import GameRound, KeyGameInformation, GameStory, Item
+from .context import ContextWindow, count_tokens
+from .response_cache import CacheMiss
+from .router import RoleLLM
+from .json_stream import JsonFieldStreamer
+from .prompt import PromptBuilder
 
-PROMPT_TEMPLATE = """
+RULES_TEMPLATE = """
 You are the Game Master (GM) for a Text-Based Role-Playing Game (TRPG). Create and narrate an engaging, coherent, and complete story through text, while managing game mechanics and player interactions. 
 
 IMPORTANT: You must ONLY respond with valid JSON. Do not include any text outside of the JSON structure.
@@ -88,21 +93,14 @@ IMPORTANT: You must ONLY respond with valid JSON. Do not include any text outsid
     - Use the 'current_chapter' field to ensure progression through the story outline.
     - If players seem stuck, provide subtle hints or introduce unexpected events to guide them towards the main plot.
     - Regularly review and reference the game state to ensure the narrative is advancing and not looping.
+"""
 
-{story_outline}
-
-{key_game_info}
-
-{player_inventory}
-
+OUTPUT_FORMAT_TEMPLATE = """
 ## Output Format
 
 {format_instructions}
 
 Remember: Prioritize player enjoyment and immersion. Adapt these guidelines as needed for the best experience. Only output valid JSON. Do not include any explanations, confirmations, or additional text outside the JSON structure. Reply to the best of your ability in {language}.
-
-{interactions}
-
 """
 
 STORY_OUTLINE_TEMPLATE = """
@@ -123,6 +121,14 @@ GAME_STATE_TEMPLATE = """
 
 """
 
+RELEVANT_INTERACTIONS_TEMPLATE = """
+
+## Relevant Past Interactions
+
+{relevant_interactions}
+
+"""
+
 RECENT_INTERACTIONS_TEMPLATE = """
 
 ## Recent Interactions
@@ -145,51 +151,89 @@ PLAYER_INVENTORY_TEMPLATE = """
 class GameMaster:
     def __init__(self, game_story: GameStory):
         self.parser = PydanticOutputParser(pydantic_object=GameRound)
-        self.template = PromptTemplate(
-            template=PROMPT_TEMPLATE,
-            input_variables=["key_game_info", "player_inventory", "interactions"],
-            partial_variables={
-                "format_instructions": self.parser.get_format_instructions(),
-                "story_outline": STORY_OUTLINE_TEMPLATE.format(story_outline=game_story.yaml()),
-                "language": lang
-            }
-        )
-
-        self.llm = ChatOllama(
-            base_url=ollama_url,
-            model=model_name,
-            temperature=0.7,
-            num_predict=4096,
-            num_ctx=10240,
-            repeat_last_n=1024,
-        )
+        self.llm = RoleLLM("game_master", chat=True, schema=GameRound)
+        num_ctx, num_predict = self.llm.context_limits()
+        self.context = ContextWindow("game_master", num_ctx=num_ctx, num_predict=num_predict, budgets=context_budgets)
+        # 从稳定到易变：规则、输出格式、故事大纲组成每回合逐字节相同的前缀
+        self.prompt = PromptBuilder([
+            RULES_TEMPLATE,
+            OUTPUT_FORMAT_TEMPLATE.format(format_instructions=self.parser.get_format_instructions(), language=lang),
+            STORY_OUTLINE_TEMPLATE.format(
+                story_outline=self.context.fit_section("story_outline", game_story.yaml())),
+        ])
+
+    def fork(self) -> "GameMaster":
+        # 共用模型和prompt前缀，ContextWindow独立，供预生成分支在后台线程中使用
+        game_master = copy.copy(self)
+        game_master.context = self.context.fork()
+        return game_master
 
     def next_round(self,
                    current_player_choice: str = None,
                    key_game_info: KeyGameInformation = None,
+                   chapter_summaries: List[str] = None,
                    recent_interactions: List[str] = None,
+                   relevant_interactions: List[str] | Callable[[int], List[str]] = None,
                    player_inventory: List[Item] = None,
+                   on_narrative: Callable[[str], None] = None,
                    retry_times=3
                    ) -> GameRound:
-        ri = "\n\n".join(recent_interactions) if recent_interactions else ""
-        interactions = RECENT_INTERACTIONS_TEMPLATE.format(recent_interactions=ri,
-                                                           current_player_choice=current_player_choice)
-        full_prompt = self.template.format(
-            key_game_info=GAME_STATE_TEMPLATE.format(game_state=key_game_info.yaml()) if key_game_info else "",
-            player_inventory=PLAYER_INVENTORY_TEMPLATE.format(
-                player_inventory="\n".join([str(item) for item in player_inventory]) if player_inventory else ""),
-            interactions=interactions
-        )
+        game_state = key_game_info.yaml() if key_game_info else ""
+        if chapter_summaries:
+            game_state += yaml.dump({"earlier_chapters": chapter_summaries}, sort_keys=False, allow_unicode=True)
+        # key_information只在RK总结后变化，放在每回合都变化的interactions之前
+        state_section = GAME_STATE_TEMPLATE.format(
+            game_state=self.context.fit_section("key_game_info", game_state)) if game_state else ""
+        inventory_section = PLAYER_INVENTORY_TEMPLATE.format(
+            player_inventory=self.context.fit_section(
+                "player_inventory", "\n".join([str(item) for item in player_inventory]))) if player_inventory else ""
+        # 除interactions外的部分占用的token，剩余预算从最新的记录开始填充
+        empty_interactions = RECENT_INTERACTIONS_TEMPLATE.format(recent_interactions="",
+                                                                 current_player_choice=current_player_choice or "")
+        # 检索只排除recent实际保留的记录，而relevant占用的预算又决定recent能保留多少：
+        # 交替计算直到保留数不再减少（保留数单调递减，一定会结束），窗口之外的记录都可以被检索到
+        select_relevant = relevant_interactions if callable(relevant_interactions) else \
+            (lambda kept: relevant_interactions)
+        packed = self.context.pack(recent_interactions, count_tokens(
+            self.prompt.build(state_section, inventory_section, empty_interactions)))
+        while True:
+            relevant = self.context.fit_items("relevant_interactions", select_relevant(len(packed)))
+            relevant_section = RELEVANT_INTERACTIONS_TEMPLATE.format(
+                relevant_interactions="\n\n".join(relevant)) if relevant else ""
+            used_tokens = count_tokens(self.prompt.build(state_section, inventory_section, relevant_section,
+                                                         empty_interactions))
+            repacked = self.context.pack(recent_interactions, used_tokens)
+            if len(repacked) >= len(packed):
+                break
+            packed = repacked
+        full_prompt = self.prompt.build(state_section, inventory_section, relevant_section,
+                                        RECENT_INTERACTIONS_TEMPLATE.format(
+                                            recent_interactions="\n\n".join(packed),
+                                            current_player_choice=current_player_choice or ""))
+        self.context.record(full_prompt, offered=len(recent_interactions or []), packed=len(packed))
         original_output = None
 
         for i in range(retry_times):
             try:
-                # original_output = self.llm.invoke(full_prompt)
-                original_output = self.llm.invoke(input=full_prompt).content
-                game_round = self.parser.parse(original_output)
+                # 只有第一次尝试流式输出narrative，重试时由UI重新显示完整回合
+                if on_narrative is not None and i == 0:
+                    original_output = self.stream(full_prompt, on_narrative)
+                else:
+                    original_output = self.llm.invoke(full_prompt, attempt=i)
+                game_round = self.llm.parse(self.parser, original_output)
                 return game_round
+            except CacheMiss:
+                raise
             except Exception as e:
                 if debug:
                     print(e)
                     print(traceback.format_exc())
                     print(original_output)
+
+    def stream(self, full_prompt: str, on_narrative: Callable[[str], None]) -> str:
+        streamer = JsonFieldStreamer("narrative")
+        for chunk in self.llm.stream(full_prompt):
+            text = streamer.feed(chunk)
+            if text:
+                on_narrative(text)
+        return streamer.buffer
@@ -0,0 +1,76 @@
+import re
+
+_FENCE_PATTERN = re.compile(r'```(?:json)?\s*(.*?)\s*(?:```|$)', re.DOTALL)
+
+
+def repair_json(text: str) -> str | None:
+    # 修复几乎合法的JSON：代码块包裹、前后多余文字、结尾多余逗号、输出被截断导致未闭合
+    if not text:
+        return None
+    fenced = _FENCE_PATTERN.search(text)
+    if fenced and "{" in fenced.group(1):
+        text = fenced.group(1)
+    start = text.find("{")
+    if start < 0:
+        return None
+
+    out = []
+    stack = []
+    in_string = False
+    escaped = False
+    for c in text[start:]:
+        out.append(c)
+        if in_string:
+            if escaped:
+                escaped = False
+            elif c == "\\":
+                escaped = True
+            elif c == '"':
+                in_string = False
+            elif c == "\n":
+                out[-1] = "\\n"
+            continue
+        if c == '"':
+            in_string = True
+        elif c in "{[":
+            stack.append("}" if c == "{" else "]")
+        elif c in "}]":
+            if not stack or stack[-1] != c:
+                return None
+            stack.pop()
+            _drop_trailing_comma(out)
+            if not stack:
+                break
+
+    if escaped:
+        out.pop()
+    if in_string:
+        out.append('"')
+    repaired = "".join(out).rstrip()
+    # 截断在键或逗号之后时去掉不完整的部分
+    if stack and stack[-1] == "}":
+        repaired = re.sub(r'([,{])\s*"[^"]*"\s*:?\s*$', r"\1", repaired)
+    repaired = re.sub(r'[,:]\s*$', "", repaired)
+    return repaired + "".join(reversed(stack))
+
+
+def _drop_trailing_comma(out: list):
+    # out的最后一个字符是字符串之外的}或]，去掉它前面（跳过空白）多余的逗号
+    i = len(out) - 2
+    while i >= 0 and out[i].isspace():
+        i -= 1
+    if i >= 0 and out[i] == ",":
+        del out[i]
+
+
+def parse_with_repair(parser, output: str, stats: dict = None):
+    try:
+        return parser.parse(output)
+    except Exception:
+        repaired = repair_json(output)
+        if repaired is None or repaired == output:
+            raise
+        result = parser.parse(repaired)
+        if stats is not None:
+            stats["repairs"] = stats.get("repairs", 0) + 1
+        return result
@@ -0,0 +1,64 @@
+import re
+
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+# 从仍在生成中的JSON里增量解析一个字符串字段，feed()返回该字段新解码出的部分，完整输出保存在buffer中
+class JsonFieldStreamer:
+    def __init__(self, field: str):
+        self.field = field
+        self.buffer = ""
+        self.done = False
+        self._key_pattern = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+        self._search_from = 0
+        self._pos = None
+
+    def feed(self, chunk: str) -> str:
+        self.buffer += chunk
+        if self.done:
+            return ""
+        if self._pos is None:
+            match = self._key_pattern.search(self.buffer, self._search_from)
+            if not match:
+                # key可能被切断在chunk边界，保留尾部重新搜索
+                self._search_from = max(0, len(self.buffer) - len(self.field) - 16)
+                return ""
+            self._pos = match.end()
+        return self._decode()
+
+    def _decode(self) -> str:
+        out = []
+        buf, pos = self.buffer, self._pos
+        while pos < len(buf):
+            c = buf[pos]
+            if c == '"':
+                self.done = True
+                pos += 1
+                break
+            if c != '\\':
+                out.append(c)
+                pos += 1
+                continue
+            # 转义序列不完整时等待下一个chunk
+            if pos + 1 >= len(buf):
+                break
+            e = buf[pos + 1]
+            if e != 'u':
+                out.append(_ESCAPES.get(e, e))
+                pos += 2
+                continue
+            if pos + 6 > len(buf):
+                break
+            code = int(buf[pos + 2:pos + 6], 16)
+            if 0xD800 <= code < 0xDC00:
+                if pos + 12 > len(buf):
+                    break
+                if buf[pos + 6:pos + 8] == '\\u':
+                    low = int(buf[pos + 8:pos + 12], 16)
+                    out.append(chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)))
+                    pos += 12
+                    continue
+            out.append(chr(code))
+            pos += 6
+        self._pos = pos
+        return "".join(out)
@@ -0,0 +1,210 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List
+
+from src import config
+
+# 每次LLM调用结束后产生一条记录，交给注册的hook处理（Prometheus汇总、JSONL文件、--profile）
+# 记录字段：role, model, route, attempt, priority, cached, prompt_chars, prompt_tokens, prompt_eval_tokens,
+# output_tokens, ttft_seconds, latency_seconds, load_seconds, eval_seconds, outcome, parse, thread, time
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_hooks: List[Callable[[dict], None]] = []
+_hooks_lock = threading.Lock()
+
+
+def add_hook(hook: Callable[[dict], None]):
+    with _hooks_lock:
+        _hooks.append(hook)
+
+
+def remove_hook(hook: Callable[[dict], None]):
+    with _hooks_lock:
+        if hook in _hooks:
+            _hooks.remove(hook)
+
+
+def emit(record: dict):
+    _file_writer()
+    with _hooks_lock:
+        hooks = list(_hooks)
+    for hook in hooks:
+        try:
+            hook(record)
+        except Exception:
+            # 统计出错不能影响游戏
+            if config.debug:
+                import traceback
+                traceback.print_exc()
+
+
+class MetricsRegistry:
+    # 按(role, model)汇总调用记录，输出Prometheus文本格式
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series: Dict[tuple, dict] = dict()
+
+    def __call__(self, record: dict):
+        key = (record["role"], record["model"])
+        with self._lock:
+            series = self._series.setdefault(key, {
+                "calls": dict(), "retries": 0, "cache_hits": 0, "prompt_tokens": 0, "prompt_eval_tokens": 0,
+                "output_tokens": 0, "load_seconds": 0.0, "eval_seconds": 0.0,
+                "latency": _histogram(), "ttft": _histogram(),
+            })
+            outcome = record["parse"] if record["outcome"] == "ok" else record["outcome"]
+            series["calls"][outcome] = series["calls"].get(outcome, 0) + 1
+            series["retries"] += 1 if record["attempt"] else 0
+            series["cache_hits"] += 1 if record["cached"] else 0
+            for field in ("prompt_tokens", "prompt_eval_tokens", "output_tokens", "load_seconds", "eval_seconds"):
+                series[field] += record[field] or 0
+            _observe(series["latency"], record["latency_seconds"])
+            if record["ttft_seconds"] is not None:
+                _observe(series["ttft"], record["ttft_seconds"])
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            items = sorted(self._series.items())
+
+            def metric(name: str, kind: str, help_text: str, rows):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(rows)
+
+            metric("il_llm_calls_total", "counter", "LLM calls by parse outcome",
+                   [f'il_llm_calls_total{{{_labels(key)},outcome="{outcome}"}} {count}'
+                    for key, series in items for outcome, count in sorted(series["calls"].items())])
+            for field, kind, help_text in (("retries", "counter", "LLM calls that were retries"),
+                                           ("cache_hits", "counter", "LLM calls answered from the response cache"),
+                                           ("prompt_tokens", "counter", "Prompt tokens sent"),
+                                           ("prompt_eval_tokens", "counter",
+                                            "Prompt tokens Ollama had to prefill (not reused from the KV cache)"),
+                                           ("output_tokens", "counter", "Generated tokens"),
+                                           ("load_seconds", "counter", "Seconds spent loading models"),
+                                           ("eval_seconds", "counter", "Seconds spent generating tokens")):
+                name = f"il_llm_{field}_total"
+                metric(name, kind, help_text, [f"{name}{{{_labels(key)}}} {series[field]}" for key, series in items])
+            for field, help_text in (("latency", "Total LLM call latency in seconds"),
+                                     ("ttft", "Time to first token in seconds")):
+                name = f"il_llm_{field}_seconds"
+                rows = []
+                for key, series in items:
+                    histogram = series[field]
+                    for bucket, count in zip(LATENCY_BUCKETS, histogram["buckets"]):
+                        rows.append(f'{name}_bucket{{{_labels(key)},le="{bucket}"}} {count}')
+                    rows.append(f'{name}_bucket{{{_labels(key)},le="+Inf"}} {histogram["count"]}')
+                    rows.append(f"{name}_sum{{{_labels(key)}}} {histogram['sum']}")
+                    rows.append(f"{name}_count{{{_labels(key)}}} {histogram['count']}")
+                metric(name, "histogram", help_text, rows)
+        return "\n".join(lines) + "\n"
+
+
+def _histogram() -> dict:
+    return {"buckets": [0] * len(LATENCY_BUCKETS), "sum": 0.0, "count": 0}
+
+
+def _observe(histogram: dict, value: float):
+    for i, bucket in enumerate(LATENCY_BUCKETS):
+        if value <= bucket:
+            histogram["buckets"][i] += 1
+    histogram["sum"] += value
+    histogram["count"] += 1
+
+
+def _labels(key: tuple) -> str:
+    role, model = key
+    return f'role="{role}",model="{model}"'
+
+
+class JsonlMetricsWriter:
+    # 每条调用记录写一行JSON，文件超过max_bytes时轮转为.1 .2 ...
+    def __init__(self, path: str, max_bytes: int, backups: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def __call__(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            if os.path.exists(self.path) and os.path.getsize(self.path) + len(line) > self.max_bytes:
+                self._rotate()
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+    def _rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+
+class TurnProfiler:
+    # --profile：收集一回合内的调用，回合结束后输出明细
+    def __init__(self, max_records=1000):
+        self._records = deque(maxlen=max_records)
+
+    def __call__(self, record: dict):
+        self._records.append(record)
+
+    def drain(self) -> List[dict]:
+        records = []
+        while self._records:
+            records.append(self._records.popleft())
+        return records
+
+    def report(self) -> str:
+        records = self.drain()
+        if not records:
+            return ""
+        lines = [f"{'role':<16}{'priority':<14}{'try':>4}{'prompt':>8}{'prefill':>8}{'output':>8}"
+                 f"{'ttft':>8}{'total':>8}{'load':>7}  result"]
+        for record in records:
+            ttft = f"{record['ttft_seconds']:.2f}" if record["ttft_seconds"] is not None else "-"
+            result = "cache" if record["cached"] else (record["parse"] if record["outcome"] == "ok"
+                                                         else record["outcome"])
+            lines.append(f"{record['role']:<16}{record['priority']:<14}{record['attempt']:>4}"
+                         f"{record['prompt_tokens']:>8}{record['prompt_eval_tokens'] or 0:>8}"
+                         f"{record['output_tokens'] or 0:>8}{ttft:>8}{record['latency_seconds']:>8.2f}"
+                         f"{record['load_seconds'] or 0:>7.2f}  {result}")
+        total = sum(record["latency_seconds"] for record in records)
+        lines.append(f"{len(records)} calls, {total:.2f}s of LLM time")
+        return "\n".join(lines)
+
+
+registry = MetricsRegistry()
+add_hook(registry)
+
+_writer: JsonlMetricsWriter | None = None
+_writer_lock = threading.Lock()
+
+
+def _file_writer():
+    # config.metrics_file在运行时读取，设置后第一次调用时注册JSONL输出
+    global _writer
+    if _writer is not None or not config.metrics_file:
+        return
+    with _writer_lock:
+        if _writer is None:
+            _writer = JsonlMetricsWriter(config.metrics_file, config.metrics_max_bytes, config.metrics_backups)
+            add_hook(_writer)
+
+
+def new_record(role: str, model: str, route: str, attempt: int, priority: str, prompt: str,
+               prompt_tokens: int) -> dict:
+    return {
+        "time": time.time(), "role": role, "model": model, "route": route, "attempt": attempt,
+        "priority": priority, "cached": False, "prompt_chars": len(prompt), "prompt_tokens": prompt_tokens,
+        "prompt_eval_tokens": None, "output_tokens": None, "ttft_seconds": None, "latency_seconds": 0.0,
+        "load_seconds": None, "eval_seconds": None, "outcome": "ok", "parse": "none",
+        "thread": threading.current_thread().name,
+    }
@@ -0,0 +1,32 @@
+from typing import List
+
+# prompt各部分按从稳定到易变的顺序拼接：规则、输出格式、故事大纲不随回合变化，
+# 放在最前面并保持逐字节一致，Ollama可以复用上一次请求中这部分的KV cache，只需要预填充后面变化的部分
+
+
+def _join(sections: List[str]) -> str:
+    return "\n\n".join(section.strip("\n") for section in sections if section and section.strip()) + "\n"
+
+
+class PromptBuilder:
+    def __init__(self, stable_sections: List[str]):
+        # 稳定前缀只拼接一次，之后每次调用都使用同一个字符串
+        self.prefix = _join(stable_sections)
+
+    def build(self, *volatile_sections: str) -> str:
+        volatile = _join(list(volatile_sections))
+        return self.prefix + "\n" + volatile if volatile.strip() else self.prefix
+
+
+def common_prefix_length(a: str, b: str) -> int:
+    # 与上一次prompt逐字符相同的前缀长度
+    limit = min(len(a), len(b))
+    low, high = 0, limit
+    # 二分比较切片，比逐字符循环快得多
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[:mid] == b[:mid]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
@@ -1,14 +1,16 @@
 import traceback
-from typing import List
+from typing import List, Tuple
 
 from langchain_core.output_parsers import PydanticOutputParser
-from langchain_core.prompts import PromptTemplate
-from langchain_ollama import OllamaLLM
 
-from src.config import ollama_url, model_name, debug, lang
+from src.config import debug, lang, context_budgets
 from src.game.model import KeyGameInformation, GameStory
+from .context import ContextWindow, count_tokens, truncate_to_tokens
+from .prompt import PromptBuilder
+from .response_cache import CacheMiss
+from .router import RoleLLM
 
-PROMPT_TEMPLATE = """
+RULES_TEMPLATE = """
 You are an AI designed to act as a game recorder for a Text-Based Role-Playing Game (TRPG). Your primary function is to analyze the provided information, summarize recent events, and update the key story elements. This summary will serve as a reference for both the Game Master (GM) and future iterations of yourself.
 
 ## Guidelines
@@ -17,6 +19,7 @@ You are an AI designed to act as a game recorder for a Text-Based Role-Playing G
    - Carefully review the game outline, current key information, and recent interactions.
    - Identify new developments, changes, and significant events.
    - Look for connections between recent events and the overall plot.
+   - Fold the new interactions into the current key information. Keep earlier plot developments that still matter.
 
 2. Updating Key Information:
    - Plot Developments: Highlight major story progressions or revelations.
@@ -45,77 +48,110 @@ You are an AI designed to act as a game recorder for a Text-Based Role-Playing G
 
 7. Adaptability:
    - Be prepared to adjust the format or focus of your summary based on the specific needs of the game or GM.
+"""
+
+OUTPUT_FORMAT_TEMPLATE = """
+## Output Format
+
+{format_instructions}
+
+Remember, your role is to assist in maintaining a coherent and engaging narrative. Your summaries and updates should help the GM and future iterations of yourself to quickly understand the current state of the game and its key elements. Reply to the best of your ability in {language}.
+"""
 
+STORY_OUTLINE_TEMPLATE = """
 ## Input Information
 
+Story Outline:
+```yaml
 {story_outline}
+```
+"""
 
+KEY_GAME_INFO_TEMPLATE = """
+Key Game Information:
+```yaml
 {key_game_info}
+```
+"""
 
-Recent Game Master and Player Interactions:
+ROLL_UP_TEMPLATE = """
+You are an AI designed to act as a game recorder for a Text-Based Role-Playing Game (TRPG). Merge the following chapter summaries, listed from oldest to newest, into one concise summary. Keep every plot development, character change and unresolved plot thread that still matters. Only output the summary text. Reply to the best of your ability in {language}.
 
-{recent_interactions}
+{summaries}
+"""
 
-## Output Format
+CHAPTER_SUMMARIES_TEMPLATE = """
+Earlier Chapters:
+{chapter_summaries}
+"""
 
-{format_instructions}
+NEW_INTERACTIONS_TEMPLATE = """
+New Game Master and Player Interactions since the last summary:
 
-Remember, your role is to assist in maintaining a coherent and engaging narrative. Your summaries and updates should help the GM and future iterations of yourself to quickly understand the current state of the game and its key elements. Reply to the best of your ability in {language}.
+{recent_interactions}
 """
 
 
 class RecordKeeper:
     def __init__(self, game_story: GameStory):
         self.parser = PydanticOutputParser(pydantic_object=KeyGameInformation)
-        self.template = PromptTemplate(
-            template=PROMPT_TEMPLATE,
-            input_variables=["key_game_info", "recent_interactions"],
-            partial_variables={
-                "format_instructions": self.parser.get_format_instructions(),
-                "story_outline": f"""
-                Story Outline:
-                ```yaml
-                {game_story.yaml()}
-                ```
-                """,
-                "language": lang
-            }
-        )
-
-        self.llm = OllamaLLM(
-            base_url=ollama_url,
-            model=model_name,
-            temperature=0.3,
-            num_predict=4096,
-            num_ctx=10240,
-        )
+        self.llm = RoleLLM("record_keeper", schema=KeyGameInformation)
+        # 章节合并输出纯文本，不使用结构化输出
+        self.text_llm = RoleLLM("record_keeper")
+        num_ctx, num_predict = self.llm.context_limits()
+        self.context = ContextWindow("record_keeper", num_ctx=num_ctx, num_predict=num_predict, budgets=context_budgets)
+        # 规则、输出格式和故事大纲在整局游戏中不变，作为每次总结相同的前缀
+        self.prompt = PromptBuilder([
+            RULES_TEMPLATE,
+            OUTPUT_FORMAT_TEMPLATE.format(format_instructions=self.parser.get_format_instructions(), language=lang),
+            STORY_OUTLINE_TEMPLATE.format(
+                story_outline=self.context.fit_section("story_outline", game_story.yaml())),
+        ])
 
     def summary(self, recent_interactions: List[str],
                 key_game_info: KeyGameInformation = None,
-                retry_times=3) -> KeyGameInformation:
-
-        ri = "\n\n".join(recent_interactions) if recent_interactions else ""
-
-        full_prompt = self.template.format(
-            key_game_info=f"""
-            Key Game Information:
-            ```yaml
-                {key_game_info.yaml()}
-            ```
-            """ if key_game_info else "",
-            recent_interactions=f"""
-            Recent Game Master and Player Interactions:
-            {ri}
-            """ if recent_interactions else "",
-        )
+                chapter_summaries: List[str] = None,
+                retry_times=3) -> Tuple[KeyGameInformation | None, int]:
+        # 返回新的key_information和实际放入prompt的记录数（从最早的记录开始），调用方只把这些记录标记为已总结
+        key_info = KEY_GAME_INFO_TEMPLATE.format(
+            key_game_info=self.context.fit_section("key_game_info", key_game_info.yaml())) if key_game_info else ""
+        chapters = CHAPTER_SUMMARIES_TEMPLATE.format(
+            chapter_summaries="\n".join(f"- {summary}" for summary in chapter_summaries)) if chapter_summaries else ""
+        used_tokens = count_tokens(self.prompt.build(key_info, chapters,
+                                                     NEW_INTERACTIONS_TEMPLATE.format(recent_interactions="")))
+        packed = self.context.pack(recent_interactions, used_tokens, oldest_first=True)
+        if recent_interactions and not packed:
+            # 单条记录就超出预算时截断放入，保证每次总结都有进展
+            packed = [truncate_to_tokens(recent_interactions[0], self.context.input_budget - used_tokens)]
+        full_prompt = self.prompt.build(key_info, chapters, NEW_INTERACTIONS_TEMPLATE.format(
+            recent_interactions="\n\n".join(packed)) if packed else "")
+        self.context.record(full_prompt, offered=len(recent_interactions or []), packed=len(packed))
         original_output = None
         for i in range(retry_times):
             try:
-                original_output = self.llm.invoke(full_prompt)
-                adventure = self.parser.parse(original_output)
-                return adventure
+                original_output = self.llm.invoke(full_prompt, attempt=i)
+                adventure = self.llm.parse(self.parser, original_output)
+                return adventure, len(packed)
+            except CacheMiss:
+                raise
             except Exception as e:
                 if debug:
                     print(e)
                     print(traceback.format_exc())
                     print(original_output)
+        return None, len(packed)
+
+    def roll_up(self, summaries: List[str], retry_times=3) -> str:
+        full_prompt = ROLL_UP_TEMPLATE.format(summaries="\n".join(f"- {summary}" for summary in summaries),
+                                              language=lang)
+        for i in range(retry_times):
+            try:
+                rolled = self.text_llm.invoke(full_prompt, attempt=i).strip()
+                if rolled:
+                    return rolled
+            except CacheMiss:
+                raise
+            except Exception as e:
+                if debug:
+                    print(e)
+                    print(traceback.format_exc())
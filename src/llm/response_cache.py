@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict
+
+from src import config
+
+CACHE_FILE = "responses.sqlite"
+CACHE_MODES = ("off", "on", "replay")
+# 不影响生成结果的参数不参与缓存key
+UNCACHED_PARAMS = ("base_url", "fallback", "fallback_after", "keep_alive")
+
+
+class CacheMiss(Exception):
+    # replay模式下请求不在缓存中，说明本次运行与录制时不一致
+    pass
+
+
+def cache_key(role: str, chat: bool, llm_config: dict, prompt: str, attempt: int) -> str:
+    # 重试时使用不同的key，否则会一直取回同一个无法解析的输出
+    params = {k: v for k, v in llm_config.items() if k not in UNCACHED_PARAMS}
+    payload = json.dumps({"role": role, "chat": chat, "params": params, "prompt": prompt, "attempt": attempt},
+                         sort_keys=True, ensure_ascii=False, default=repr)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    # 按内容寻址的LLM响应缓存，超过max_bytes时淘汰最久未使用的响应
+    def __init__(self, cache_dir: str, max_bytes: int, mode="on"):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode: {mode}")
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(cache_dir, CACHE_FILE), check_same_thread=False)
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    role TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                if self.mode == "replay":
+                    raise CacheMiss(f"LLM response {key} is not in the cache")
+                return None
+            self.stats["hits"] += 1
+            with self._conn:
+                self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key: str, role: str, response: str):
+        if self.mode != "on":
+            return
+        size = len(response.encode('utf-8'))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, role, response, size, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, role, response, size, time.time())
+            )
+            self.stats["stores"] += 1
+            self._evict()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            self.stats["evictions"] += 1
+
+    def size(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def snapshot(self) -> dict:
+        total = self.stats["hits"] + self.stats["misses"]
+        return dict(self.stats, mode=self.mode, bytes=self.size(),
+                    hit_rate=self.stats["hits"] / total if total else 0.0)
+
+
+_caches: Dict[tuple, ResponseCache] = dict()
+_caches_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache | None:
+    # 运行时读取config，基准测试可以在创建角色之前切换模式和目录
+    if config.llm_cache == "off":
+        return None
+    key = (os.path.abspath(config.llm_cache_dir), config.llm_cache)
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = ResponseCache(config.llm_cache_dir, config.llm_cache_max_bytes, config.llm_cache)
+        return _caches[key]
@@ -0,0 +1,241 @@
+import threading
+import time
+from typing import Dict, Iterator, Tuple, Type
+
+from langchain_ollama import ChatOllama, OllamaLLM
+from pydantic import BaseModel
+
+from src import config
+from .context import count_tokens
+from .json_repair import parse_with_repair
+from .metrics import emit, new_record
+from .response_cache import cache_key, get_response_cache
+from .scheduler import Priority, current_request_context, scheduler
+from .warmup import response_timings
+
+ROLES = ("story_generator", "game_master", "record_keeper")
+ROUTING_KEYS = ("fallback", "fallback_after")
+# 未通过request_context指定时各角色请求的默认优先级
+ROLE_PRIORITIES = {
+    "story_generator": Priority.INTERACTIVE,
+    "game_master": Priority.INTERACTIVE,
+    "record_keeper": Priority.SUMMARY,
+}
+
+_clients: Dict[tuple, object] = dict()
+_clients_lock = threading.Lock()
+# 本进程中正在进行的LLM请求数
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+
+
+def llm_in_flight() -> int:
+    return _in_flight
+
+
+def _track_in_flight(delta: int):
+    global _in_flight
+    with _in_flight_lock:
+        _in_flight += delta
+
+
+def get_role_config(role: str) -> dict:
+    # 角色配置覆盖全局默认值
+    role_config = {
+        "base_url": config.ollama_url,
+        "model": config.model_name,
+        "num_ctx": config.num_ctx,
+        "num_predict": config.num_predict,
+        "keep_alive": config.ollama_keep_alive,
+    }
+    if config.llm_seed is not None:
+        role_config["seed"] = config.llm_seed
+    role_config.update(config.role_configs.get(role, dict()))
+    return role_config
+
+
+def get_fallback_config(role: str) -> dict | None:
+    role_config = get_role_config(role)
+    if not role_config.get("fallback"):
+        return None
+    fallback = {k: v for k, v in role_config.items() if k not in ROUTING_KEYS}
+    fallback.update(role_config["fallback"])
+    return fallback
+
+
+def create_llm(llm_config: dict, chat=False):
+    # 相同配置的客户端在所有游戏之间共享，复用HTTP连接
+    params = {k: v for k, v in llm_config.items() if k not in ROUTING_KEYS}
+    key = (chat, tuple(sorted((k, repr(v)) for k, v in params.items())))
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = ChatOllama(**params) if chat else OllamaLLM(**params)
+        return _clients[key]
+
+
+class RoleLLM:
+    # 按角色路由到主模型，解析失败fallback_after次后改用备用模型
+    # 指定schema时使用Ollama的结构化输出，按JSON schema约束生成
+    def __init__(self, role: str, chat=False, schema: Type[BaseModel] = None):
+        self.role = role
+        self.chat = chat
+        self.schema = schema
+        self.config = get_role_config(role)
+        self.fallback_config = get_fallback_config(role)
+        if schema is not None and config.structured_output:
+            self.config["format"] = schema.model_json_schema()
+            if self.fallback_config:
+                self.fallback_config["format"] = self.config["format"]
+            # OllamaLLM的format只支持"json"，JSON schema需要通过chat接口传递
+            self.chat = True
+        self.fallback_after = self.config.get("fallback_after", 1)
+        self.primary = create_llm(self.config, self.chat)
+        self.fallback = create_llm(self.fallback_config, self.chat) if self.fallback_config else None
+        self.priority = ROLE_PRIORITIES.get(role, Priority.INTERACTIVE)
+        self.cache = get_response_cache()
+        self.stats = {"primary": 0, "fallback": 0, "retries": 0, "repairs": 0}
+        # 模型加载和生成分开统计，冷启动单独计数
+        self.timings = {"load_seconds": 0.0, "prompt_eval_seconds": 0.0, "eval_seconds": 0.0, "cold_starts": 0}
+        # 有schema时调用记录等parse之后带上解析结果再发出；同一个RoleLLM可能被多个线程使用
+        self._pending = threading.local()
+
+    def context_limits(self) -> Tuple[int, int]:
+        # 主模型和备用模型发送同一个prompt，按输入预算(num_ctx - num_predict)较小的一方打包，备用模型不会被Ollama截断
+        configs = [llm_config for llm_config in (self.config, self.fallback_config) if llm_config]
+        limits = min(configs, key=lambda llm_config: llm_config["num_ctx"] - llm_config["num_predict"])
+        return limits["num_ctx"], limits["num_predict"]
+
+    def route(self, attempt=0) -> str:
+        return "fallback" if self.fallback is not None and attempt >= self.fallback_after else "primary"
+
+    def invoke(self, prompt: str, attempt=0) -> str:
+        route = self.route(attempt)
+        self.stats[route] += 1
+        if attempt > 0:
+            self.stats["retries"] += 1
+        llm, llm_config = (self.fallback, self.fallback_config) if route == "fallback" else (self.primary, self.config)
+        record = self._start_record(llm_config, route, attempt, prompt)
+        started = time.perf_counter()
+        key = cache_key(self.role, self.chat, llm_config, prompt, attempt) if self.cache else None
+        cached = self.cache.get(key) if self.cache else None
+        if cached is not None:
+            record["cached"] = True
+            self._finish_record(record, started, output=cached)
+            return cached
+        try:
+            with scheduler.slot(llm_config["base_url"], self.priority):
+                _track_in_flight(1)
+                try:
+                    output = llm.invoke(input=prompt)
+                finally:
+                    _track_in_flight(-1)
+        except Exception as e:
+            self._fail_record(record, started, e)
+            raise
+        metadata = output.response_metadata if self.chat else None
+        if metadata:
+            self._record_timings(metadata)
+        output = output.content if self.chat else output
+        if self.cache:
+            self.cache.put(key, self.role, output)
+        self._finish_record(record, started, metadata, output)
+        return output
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        self.stats["primary"] += 1
+        record = self._start_record(self.config, "primary", 0, prompt)
+        started = time.perf_counter()
+        # 与invoke的第一次尝试共用缓存，命中时一次性输出
+        key = cache_key(self.role, self.chat, self.config, prompt, 0) if self.cache else None
+        cached = self.cache.get(key) if self.cache else None
+        if cached is not None:
+            record["cached"] = True
+            self._finish_record(record, started, output=cached)
+            yield cached
+            return
+        chunks = []
+        metadata = None
+        try:
+            # 流式请求在整个输出期间占用并发名额
+            with scheduler.slot(self.config["base_url"], self.priority):
+                _track_in_flight(1)
+                try:
+                    for chunk in self.primary.stream(input=prompt):
+                        if self.chat and chunk.response_metadata.get("done"):
+                            metadata = chunk.response_metadata
+                            self._record_timings(metadata)
+                        chunk = chunk.content if self.chat else chunk
+                        if chunk and record["ttft_seconds"] is None:
+                            record["ttft_seconds"] = time.perf_counter() - started
+                        chunks.append(chunk)
+                        yield chunk
+                finally:
+                    _track_in_flight(-1)
+        except Exception as e:
+            self._fail_record(record, started, e)
+            raise
+        output = "".join(chunks)
+        if self.cache:
+            self.cache.put(key, self.role, output)
+        self._finish_record(record, started, metadata, output)
+
+    def _start_record(self, llm_config: dict, route: str, attempt: int, prompt: str) -> dict:
+        self._emit_pending()
+        context = current_request_context()
+        priority = context.priority if context is not None and context.priority is not None else self.priority
+        return new_record(self.role, llm_config["model"], route, attempt, Priority(priority).name, prompt,
+                          count_tokens(prompt))
+
+    def _finish_record(self, record: dict, started: float, metadata: dict = None, output: str = ""):
+        record["latency_seconds"] = time.perf_counter() - started
+        if metadata:
+            timings = response_timings(metadata)
+            record["prompt_eval_tokens"] = metadata.get("prompt_eval_count")
+            record["output_tokens"] = metadata.get("eval_count")
+            record["load_seconds"] = timings["load_seconds"]
+            record["eval_seconds"] = timings["eval_seconds"]
+            if record["ttft_seconds"] is None:
+                # 非流式调用没有首个token的时间，用模型加载加上prompt预填充的时间估计
+                record["ttft_seconds"] = timings["load_seconds"] + timings["prompt_eval_seconds"]
+        if record["output_tokens"] is None:
+            record["output_tokens"] = count_tokens(output)
+        if self.schema is None:
+            emit(record)
+        else:
+            self._pending.record = record
+
+    def _fail_record(self, record: dict, started: float, error: Exception):
+        record["latency_seconds"] = time.perf_counter() - started
+        record["outcome"] = type(error).__name__
+        emit(record)
+
+    def _emit_pending(self):
+        record = getattr(self._pending, "record", None)
+        self._pending.record = None
+        if record is not None:
+            emit(record)
+
+    def _record_timings(self, metadata: dict):
+        timings = response_timings(metadata)
+        for key, seconds in timings.items():
+            self.timings[key] += seconds
+        if timings["load_seconds"] > config.cold_load_threshold:
+            self.timings["cold_starts"] += 1
+
+    def parse(self, parser, output: str):
+        # 解析失败时先尝试本地修复，仍然失败才由调用方重新生成
+        record = getattr(self._pending, "record", None)
+        self._pending.record = None
+        stats = dict()
+        try:
+            result = parse_with_repair(parser, output, stats)
+        except Exception:
+            if record is not None:
+                record["parse"] = "failed"
+                emit(record)
+            raise
+        self.stats["repairs"] += stats.get("repairs", 0)
+        if record is not None:
+            record["parse"] = "repaired" if stats.get("repairs") else "ok"
+            emit(record)
+        return result
@@ -0,0 +1,193 @@
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Dict, List
+
+from src import config
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    SUMMARY = 1
+    SPECULATIVE = 2
+    PREGENERATION = 3
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class RequestCancelled(Exception):
+    pass
+
+
+class RequestContext:
+    def __init__(self, priority: Priority = None, deadline: float = None, cancel_event: threading.Event = None):
+        self.priority = priority
+        self.deadline = deadline
+        self.cancel_event = cancel_event
+
+
+_request_context: ContextVar[RequestContext | None] = ContextVar("llm_request_context", default=None)
+
+
+def make_request_context(priority: Priority = None, timeout: float = None,
+                         cancel_event: threading.Event = None) -> RequestContext:
+    return RequestContext(
+        priority=priority,
+        deadline=time.monotonic() + timeout if timeout is not None else None,
+        cancel_event=cancel_event
+    )
+
+
+@contextmanager
+def request_context(context: RequestContext):
+    # 当前线程中发出的LLM请求使用context中的优先级、截止时间和取消信号
+    token = _request_context.set(context)
+    try:
+        yield context
+    finally:
+        _request_context.reset(token)
+
+
+def current_request_context() -> RequestContext | None:
+    return _request_context.get()
+
+
+class _Ticket:
+    def __init__(self, priority: Priority, seq: int, context: RequestContext | None):
+        self.priority = priority
+        self.seq = seq
+        self.context = context
+        self.queued_at = time.monotonic()
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class _Backend:
+    def __init__(self):
+        self.in_flight = 0
+        self.waiting: List[_Ticket] = []
+        # 正在执行的请求按优先级计数
+        self.active: Dict[Priority, int] = dict()
+
+
+class LLMScheduler:
+    # 所有LLM请求的统一入口：每个后端限制并发数，按优先级排队，超过截止时间或被取消的请求不再发出
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._backends: Dict[str, _Backend] = dict()
+        self._seq = itertools.count()
+        self.stats = {"requests": 0, "queued": 0, "wait_seconds": 0.0, "deadline_exceeded": 0, "cancelled": 0,
+                      "max_queue_depth": 0}
+        self.wait_by_priority: Dict[str, float] = {p.name: 0.0 for p in Priority}
+
+    @staticmethod
+    def limit(backend: str) -> int:
+        return config.scheduler_backend_limits.get(backend, config.scheduler_max_in_flight)
+
+    @contextmanager
+    def slot(self, backend: str, priority: Priority):
+        context = current_request_context()
+        if context is not None and context.priority is not None:
+            priority = context.priority
+        priority = self._acquire(backend, priority, context)
+        try:
+            yield
+        finally:
+            with self._condition:
+                state = self._backends[backend]
+                state.in_flight -= 1
+                state.active[priority] -= 1
+                self._condition.notify_all()
+
+    def _acquire(self, backend: str, priority: Priority, context: RequestContext | None) -> Priority:
+        with self._condition:
+            state = self._backends.setdefault(backend, _Backend())
+            ticket = _Ticket(priority, next(self._seq), context)
+            heapq.heappush(state.waiting, ticket)
+            self.stats["requests"] += 1
+            self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], self.queue_depth())
+            queued = False
+            while state.waiting[0] is not ticket or state.in_flight >= self.limit(backend):
+                queued = True
+                error = None
+                # 截止时间和取消信号可能在排队期间被promote修改，每次都重新读取
+                deadline = context.deadline if context else None
+                cancel_event = context.cancel_event if context else None
+                if cancel_event is not None and cancel_event.is_set():
+                    error = RequestCancelled("LLM request cancelled while queued")
+                    self.stats["cancelled"] += 1
+                elif deadline is not None and time.monotonic() >= deadline:
+                    error = DeadlineExceeded("LLM request deadline passed while queued")
+                    self.stats["deadline_exceeded"] += 1
+                if error is not None:
+                    state.waiting.remove(ticket)
+                    heapq.heapify(state.waiting)
+                    self._condition.notify_all()
+                    raise error
+                timeout = 0.5 if deadline is None else max(0.0, min(0.5, deadline - time.monotonic()))
+                self._condition.wait(timeout)
+            heapq.heappop(state.waiting)
+            state.in_flight += 1
+            state.active[ticket.priority] = state.active.get(ticket.priority, 0) + 1
+            waited = time.monotonic() - ticket.queued_at
+            if queued:
+                self.stats["queued"] += 1
+            self.stats["wait_seconds"] += waited
+            self.wait_by_priority[ticket.priority.name] += waited
+            self._condition.notify_all()
+            return ticket.priority
+
+    def promote(self, context: RequestContext, priority: Priority):
+        # 预生成的请求被玩家选中后提升为交互优先级，并取消截止时间
+        with self._condition:
+            context.priority = priority
+            context.deadline = None
+            for state in self._backends.values():
+                for ticket in state.waiting:
+                    if ticket.context is context:
+                        ticket.priority = priority
+                heapq.heapify(state.waiting)
+            self._condition.notify_all()
+
+    def busy(self, below: Priority = Priority.PREGENERATION) -> bool:
+        # 是否有优先级高于below的请求正在排队或执行，后台预生成据此判断是否空闲
+        with self._condition:
+            for state in self._backends.values():
+                if any(ticket.priority < below for ticket in state.waiting):
+                    return True
+                if any(count for priority, count in state.active.items() if priority < below):
+                    return True
+            return False
+
+    def queue_depth(self, backend: str = None) -> int:
+        backends = [self._backends[backend]] if backend in self._backends else \
+            ([] if backend else list(self._backends.values()))
+        return sum(len(state.waiting) for state in backends)
+
+    def snapshot(self) -> dict:
+        with self._condition:
+            return {
+                **self.stats,
+                "wait_seconds_by_priority": dict(self.wait_by_priority),
+                "backends": {backend: {"in_flight": state.in_flight, "queue_depth": len(state.waiting),
+                                       "queued_by_priority": _count_priorities(state.waiting),
+                                       "limit": self.limit(backend)}
+                             for backend, state in self._backends.items()},
+            }
+
+
+def _count_priorities(tickets: List[_Ticket]) -> Dict[str, int]:
+    counts = dict()
+    for ticket in tickets:
+        counts[ticket.priority.name] = counts.get(ticket.priority.name, 0) + 1
+    return counts
+
+
+scheduler = LLMScheduler()
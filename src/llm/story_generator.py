@@ -3,10 +3,11 @@ import traceback
 
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import PromptTemplate
-from langchain_ollama import OllamaLLM
 
-from src.config import ollama_url, model_name, debug, lang
+from src.config import debug, lang
 from src.game.model import GameStory
+from .response_cache import CacheMiss
+from .router import RoleLLM
 
 PROMPT_TEMPLATE = """
 You are a creative writer specializing in crafting engaging and coherent story outlines for Text-Based Role-Playing Games (TRPGs). Your task is to create a compelling story outline based on the keywords for game theme provided by the user. This outline will serve as the foundation for a TRPG adventure.
@@ -69,6 +70,10 @@ DEFAULT_KEYWORDS = ["magic", "adventure", "dungeon", "dragon", "sword and sorcer
                     "unspeakable horrors"]
 
 
+def random_keywords(k=7, rng: random.Random = None) -> list[str]:
+    return (rng or random).choices(DEFAULT_KEYWORDS, k=k)
+
+
 class StoryGenerator:
     def __init__(self):
         self.parser = PydanticOutputParser(pydantic_object=GameStory)
@@ -81,17 +86,11 @@ class StoryGenerator:
             }
         )
 
-        self.llm = OllamaLLM(
-            base_url=ollama_url,
-            model=model_name,
-            temperature=0.5,
-            num_predict=4096,
-            num_ctx=10240,
-        )
+        self.llm = RoleLLM("story_generator", schema=GameStory)
 
     def generate_story(self, keywords: list[str] = None, retry_times=3) -> GameStory:
         if not keywords:
-            keywords = random.choices(DEFAULT_KEYWORDS, k=7)
+            keywords = random_keywords()
 
         full_prompt = self.template.format(
             keywords=",".join(keywords)
@@ -99,9 +98,11 @@ class StoryGenerator:
         original_output = None
         for i in range(retry_times):
             try:
-                original_output = self.llm.invoke(full_prompt)
-                adventure = self.parser.parse(original_output)
+                original_output = self.llm.invoke(full_prompt, attempt=i)
+                adventure = self.llm.parse(self.parser, original_output)
                 return adventure
+            except CacheMiss:
+                raise
             except Exception as e:
                 if debug:
                     print(e)
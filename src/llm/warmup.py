@@ -0,0 +1,123 @@
+import threading
+from typing import Callable, Dict, List
+
+from src import config
+
+NANOSECONDS = 1e9
+
+
+def model_targets() -> List[dict]:
+    # 各角色（包括备用模型）实际使用的模型；num_ctx不同时Ollama会重新加载，所以预热时保持一致
+    from .router import ROLES, get_fallback_config, get_role_config
+
+    targets = dict()
+    for role in ROLES:
+        for llm_config in (get_role_config(role), get_fallback_config(role)):
+            if not llm_config:
+                continue
+            key = (llm_config["base_url"], llm_config["model"], llm_config.get("num_ctx"))
+            targets.setdefault(key, {"base_url": key[0], "model": key[1], "num_ctx": key[2], "roles": []})
+            targets[key]["roles"].append(role)
+    return list(targets.values())
+
+
+class ModelWarmer:
+    # 游戏开始前预加载各角色的模型，游戏进行中定期保活，退出时释放显存
+    def __init__(self, keep_alive=None, heartbeat=None):
+        self.keep_alive = keep_alive if keep_alive is not None else config.ollama_keep_alive
+        self.heartbeat = heartbeat if heartbeat is not None else config.warmup_heartbeat
+        self._stop_heartbeat = threading.Event()
+        self._heartbeat_thread: threading.Thread | None = None
+        self._warm_up_thread: threading.Thread | None = None
+        self._closing = threading.Event()
+        self.stats: Dict[str, dict] = dict()
+
+    def warm_up(self, wait=False, after: Callable[[], object] = None):
+        # 空prompt只加载模型，不生成token
+        # after在预热线程中先执行（例如等待后台加载完成），避免两个线程同时导入LLM相关模块
+        self._warm_up_thread = threading.Thread(target=self._warm_up, args=(after,), name="warm-up", daemon=True)
+        self._warm_up_thread.start()
+        if wait:
+            self._warm_up_thread.join()
+
+    def _warm_up(self, after):
+        if after is not None:
+            try:
+                after()
+            except Exception:
+                # 加载失败时由调用方在用到结果时报告
+                return
+        self._load_all(self.keep_alive, stop=self._closing)
+
+    def wait(self):
+        if self._warm_up_thread is not None:
+            self._warm_up_thread.join()
+
+    def _load_all(self, keep_alive, timeout=None, stop: threading.Event = None):
+        for target in model_targets():
+            if stop is not None and stop.is_set():
+                return
+            self._load(target, keep_alive, timeout)
+
+    def _load(self, target: dict, keep_alive, timeout=None):
+        from ollama import Client
+
+        stats = self.stats.setdefault(target["model"], {"loads": 0, "load_seconds": 0.0, "cold_loads": 0,
+                                                        "releases": 0, "failures": 0,
+                                                        "roles": target["roles"]})
+        try:
+            options = {"num_ctx": target["num_ctx"]} if target["num_ctx"] else None
+            response = Client(host=target["base_url"], timeout=timeout).generate(model=target["model"], prompt="", options=options,
+                                                                keep_alive=keep_alive)
+        except Exception as e:
+            stats["failures"] += 1
+            if config.debug:
+                print(f"Failed to load {target['model']}: {e}")
+            return
+        if keep_alive == 0:
+            stats["releases"] += 1
+            return
+        load_seconds = (response.load_duration or 0) / NANOSECONDS
+        stats["loads"] += 1
+        stats["load_seconds"] += load_seconds
+        # 模型已经常驻时load_duration只有几毫秒
+        if load_seconds > config.cold_load_threshold:
+            stats["cold_loads"] += 1
+
+    def start_heartbeat(self):
+        if not self.heartbeat or self._heartbeat_thread is not None:
+            return
+        self._stop_heartbeat.clear()
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, name="keep-alive", daemon=True)
+        self._heartbeat_thread.start()
+
+    def _heartbeat_loop(self):
+        # 玩家长时间思考时，在keep_alive到期前重新预热，避免下一回合重新加载模型
+        while not self._stop_heartbeat.wait(self.heartbeat):
+            self._load_all(self.keep_alive)
+
+    def stop_heartbeat(self):
+        self._stop_heartbeat.set()
+        if self._heartbeat_thread is not None:
+            self._heartbeat_thread.join()
+            self._heartbeat_thread = None
+
+    def release(self):
+        # keep_alive=0让Ollama立即卸载模型；Ollama不可用时不拖慢退出
+        # 先等预热结束（剩下的模型不再加载），否则卸载之后模型又被预热加载回来
+        self.stop_heartbeat()
+        self._closing.set()
+        self.wait()
+        self._load_all(0, timeout=5)
+
+    def snapshot(self) -> dict:
+        return {model: dict(stats) for model, stats in self.stats.items()}
+
+
+def response_timings(metadata: dict) -> Dict[str, float]:
+    # Ollama返回的各阶段耗时（纳秒），区分模型加载、prompt处理和生成
+    return {
+        "load_seconds": (metadata.get("load_duration") or 0) / NANOSECONDS,
+        "prompt_eval_seconds": (metadata.get("prompt_eval_duration") or 0) / NANOSECONDS,
+        "eval_seconds": (metadata.get("eval_duration") or 0) / NANOSECONDS,
+    }
@@ -1,19 +1,31 @@
-from cli.cli_ui import CLIUI
-from game.game_manager import GameManager
+import argparse
+
+from src.cli.cli_ui import CLIUI
+from src.cli.preload import BackgroundLoader
 from src.config import lang
 
 """
 TODO:
-1. RK可以使用小模型，然后输入更长的Interactions
-2. 解决GM无法推进游戏的问题，会产生重复输出
-3. 控制RK的总结范围和频率，在超出对话长度后进行总结，防止GM看到KI与RI有Overlap
+1. 解决GM无法推进游戏的问题，会产生重复输出
 """
 
 
+def create_game_manager():
+    from src.game.game_manager import GameManager
+    # 只有CLI在主菜单空闲时预生成故事，服务器和模拟器默认不开启
+    return GameManager(use_story_pool=True)
+
+
+def create_ui(profile=False) -> CLIUI:
+    # GameManager及LLM相关模块在玩家浏览主菜单时于后台加载
+    return CLIUI(BackgroundLoader(create_game_manager), lang, profile=profile)
+
+
 def main():
-    game_manager = GameManager()
-    ui = CLIUI(game_manager, lang)
-    ui.run()
+    parser = argparse.ArgumentParser(description="Infinite Legends")
+    parser.add_argument("--profile", action="store_true", help="print a breakdown of the LLM calls after every turn")
+    args = parser.parse_args()
+    create_ui(profile=args.profile).run()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,335 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import shutil
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+from urllib.parse import parse_qs, urlsplit
+
+from src import config
+
+# 多玩家的HTTP/JSON游戏服务器，每个session对应一个GameManager
+# GameManager是同步的，session的操作在有界线程池中执行；所有session共享router中按配置复用的LLM客户端（HTTP keep-alive连接池）
+# 用法: python -m src.server.game_server --port 8080
+
+
+# create_session生成的uuid4 hex，其它形式的session id都不接受，避免拼接到root之外的路径
+_SESSION_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _int_param(value, name: str, minimum: int = None) -> int:
+    # 查询参数和请求体中的整数，不合法时返回400而不是500
+    if isinstance(value, bool) or isinstance(value, float) and not value.is_integer():
+        raise HttpError(400, f"Invalid {name}")
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise HttpError(400, f"Invalid {name}")
+    if minimum is not None and number < minimum:
+        raise HttpError(400, f"Invalid {name}")
+    return number
+
+
+class Session:
+    def __init__(self, session_id: str, manager):
+        self.session_id = session_id
+        self.manager = manager
+        self.lock = asyncio.Lock()
+        self.last_active = time.monotonic()
+
+
+class GameServer:
+    def __init__(self, root: str, workers=16, idle_timeout=600.0):
+        self.root = root
+        self.idle_timeout = idle_timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="session")
+        self.sessions: Dict[str, Session] = dict()
+        self.stats = {"requests": 0, "evicted": 0, "restored": 0}
+        self._server: asyncio.AbstractServer | None = None
+
+    def _session_dir(self, session_id: str) -> str:
+        if not _SESSION_ID_PATTERN.match(session_id):
+            raise HttpError(404, "Unknown session")
+        return os.path.join(self.root, session_id)
+
+    async def _run(self, fn, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, lambda: fn(*args, **kwargs))
+
+    async def get_session(self, session_id: str) -> Session:
+        self._session_dir(session_id)
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = await self._restore(session_id)
+        session.last_active = time.monotonic()
+        return session
+
+    async def _restore(self, session_id: str) -> Session:
+        # 被清理的session从磁盘重新加载
+        from src.game.game_manager import GameManager
+        if not os.path.isdir(self._session_dir(session_id)):
+            raise HttpError(404, f"Unknown session: {session_id}")
+        manager = GameManager(save_dir=self._session_dir(session_id))
+        session = Session(session_id, manager)
+        self.sessions[session_id] = session
+        async with session.lock:
+            # 恢复最近一次保存的游戏
+            saves = await self._run(manager.get_save_infos, sort_by="last_played", limit=1)
+            if saves:
+                await self._run(manager.load_game, saves[0].name)
+                self.stats["restored"] += 1
+        return session
+
+    async def evict_idle_sessions(self):
+        now = time.monotonic()
+        for session_id, session in list(self.sessions.items()):
+            if now - session.last_active < self.idle_timeout or session.lock.locked():
+                continue
+            await self._evict(session_id, session)
+
+    async def _evict(self, session_id: str, session: Session):
+        async with session.lock:
+            # 等锁期间可能有新的请求或session已被删除，拿到锁后重新检查
+            if self.sessions.get(session_id) is not session or \
+                    time.monotonic() - session.last_active < self.idle_timeout:
+                return
+            if session.manager.game_state is not None:
+                await self._run(session.manager.save_game)
+            await self._run(session.manager.close)
+            self.sessions.pop(session_id, None)
+            self.stats["evicted"] += 1
+
+    async def _evict_loop(self):
+        while True:
+            await asyncio.sleep(max(1.0, self.idle_timeout / 4))
+            try:
+                await self.evict_idle_sessions()
+            except Exception:
+                traceback.print_exc()
+
+    # 路由
+
+    async def handle(self, method: str, path: str, query: dict, body: dict):
+        parts = [part for part in path.split("/") if part]
+        if method == "GET" and parts == ["metrics"]:
+            from src.llm.metrics import registry
+            return registry.render()
+        if method == "GET" and parts == ["health"]:
+            from src.llm.scheduler import scheduler
+            return {"status": "ok", "sessions": len(self.sessions), **self.stats, "scheduler": scheduler.snapshot()}
+        if parts == ["sessions"] and method == "POST":
+            return await self.create_session(body)
+        if len(parts) < 2 or parts[0] != "sessions":
+            raise HttpError(404, "Not found")
+        action = parts[2] if len(parts) > 2 else ""
+        while True:
+            session = await self.get_session(parts[1])
+            async with session.lock:
+                # 等锁期间session被清理或删除时重新获取，清理的session从磁盘恢复
+                if self.sessions.get(session.session_id) is not session:
+                    continue
+                session.last_active = time.monotonic()
+                return await self.session_action(session, method, action, query, body)
+
+    async def create_session(self, body: dict):
+        from src.game.game_manager import GameManager
+        session_id = uuid.uuid4().hex
+        os.makedirs(self._session_dir(session_id), exist_ok=True)
+        session = Session(session_id, GameManager(save_dir=self._session_dir(session_id)))
+        self.sessions[session_id] = session
+        result = {"session_id": session_id}
+        if body.get("new_game", True):
+            async with session.lock:
+                result.update(await self._new_game(session, body))
+        return result
+
+    async def _new_game(self, session: Session, body: dict):
+        if not await self._run(session.manager.start_new_game, body.get("keywords") or []):
+            raise HttpError(502, "Failed to start a new game")
+        await self._run(session.manager.save_game)
+        return {"round": session.manager.get_current_round().model_dump()}
+
+    async def session_action(self, session: Session, method: str, action: str, query: dict, body: dict):
+        manager = session.manager
+        if method == "DELETE" and action == "":
+            self.sessions.pop(session.session_id, None)
+            await self._run(manager.close)
+            await self._run(shutil.rmtree, self._session_dir(session.session_id), ignore_errors=True)
+            return {"deleted": session.session_id}
+        if method == "POST" and action == "new_game":
+            return await self._new_game(session, body)
+        if method == "POST" and action == "load":
+            save_file = body.get("save_file", "")
+            # 只接受session目录下的文件名
+            if not isinstance(save_file, str) or save_file in ("", ".", "..") or \
+                    os.path.basename(save_file) != save_file or "\\" in save_file:
+                raise HttpError(400, "Invalid save file name")
+            if not await self._run(manager.load_game, save_file):
+                raise HttpError(404, "Save file not found")
+            return {"round": manager.get_current_round().model_dump()}
+        if method == "GET" and action == "saves":
+            infos = await self._run(manager.get_save_infos)
+            return {"saves": [info.model_dump() for info in infos]}
+        if manager.game_state is None:
+            raise HttpError(409, "No game in progress")
+
+        if method == "GET" and action == "round":
+            return {"round": manager.get_current_round().model_dump()}
+        if method == "GET" and action == "inventory":
+            return {"inventory": [item.model_dump() for item in manager.get_inventory()]}
+        if method == "GET" and action == "history":
+            offset = _int_param(query.get("offset", 0), "offset", minimum=0)
+            limit = _int_param(query.get("limit", 50), "limit", minimum=0)
+            records = manager.get_dialogue_history()
+            if not query.get("q") and not query.get("type"):
+                return {"total": len(records),
+                        "records": records.to_dicts(offset, offset + limit)}
+            # q: 关键词搜索，type: 按RecordType的值筛选，可以用逗号分隔多个类型
+            from src.game.model import RecordType
+            try:
+                record_types = [RecordType(value) for value in query["type"].split(",")] if query.get("type") \
+                    else None
+            except ValueError:
+                raise HttpError(400, "Invalid record type")
+            matches = manager.search_dialogue_history(query.get("q", ""), record_types)
+            return {"total": len(matches),
+                    "records": [records.to_dicts(i, i + 1)[0] for i in matches[offset:offset + limit]]}
+        if method == "POST" and action == "choose":
+            choices = manager.get_current_round().choices
+            index = _int_param(body.get("choice", 0), "choice") - 1
+            if not 0 <= index < len(choices):
+                raise HttpError(400, "Invalid choice")
+            return await self._advance(manager, option=choices[index])
+        if method == "POST" and action == "use_item":
+            items = [item for item in manager.get_inventory() if item.name == body.get("item")]
+            if not items:
+                raise HttpError(400, "Item not in inventory")
+            return await self._advance(manager, item=items[0])
+        if method == "POST" and action == "save":
+            await self._run(manager.save_game, body.get("name"))
+            return {"saved": True}
+        raise HttpError(404, "Not found")
+
+    async def _advance(self, manager, option=None, item=None):
+        current_round = manager.get_current_round()
+        await self._run(manager.process_option, option=option, item=item)
+        next_round = manager.get_current_round()
+        return {"ok": next_round is not current_round, "round": next_round.model_dump()}
+
+    # HTTP
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = dict()
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                raw_body = await reader.readexactly(length) if length else b""
+                status, response = await self._dispatch(method.upper(), target, raw_body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                self._write_response(writer, status, response, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method: str, target: str, raw_body: bytes):
+        self.stats["requests"] += 1
+        url = urlsplit(target)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            body = json.loads(raw_body) if raw_body else dict()
+            return 200, await self.handle(method, url.path, query, body)
+        except HttpError as e:
+            return e.status, {"error": e.message}
+        except json.JSONDecodeError:
+            return 400, {"error": "Invalid JSON body"}
+        except Exception as e:
+            if config.debug:
+                traceback.print_exc()
+            return 500, {"error": f"{type(e).__name__}: {e}"}
+
+    @staticmethod
+    def _write_response(writer: asyncio.StreamWriter, status: int, response: dict | str, keep_alive: bool):
+        # /metrics返回Prometheus文本格式，其它接口返回JSON
+        if isinstance(response, str):
+            body, content_type = response.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body = json.dumps(response, ensure_ascii=False).encode("utf-8")
+            content_type = "application/json; charset=utf-8"
+        reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 409: "Conflict", 500: "Internal Server Error",
+                  502: "Bad Gateway"}.get(status, "OK")
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + body
+        )
+
+    async def serve(self, host: str, port: int):
+        os.makedirs(self.root, exist_ok=True)
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        evict_task = asyncio.create_task(self._evict_loop())
+        try:
+            async with self._server:
+                await self._server.serve_forever()
+        finally:
+            evict_task.cancel()
+
+    async def shutdown(self):
+        # 关闭前保存所有session
+        self.idle_timeout = 0
+        await self.evict_idle_sessions()
+        if self._server:
+            self._server.close()
+        self.executor.shutdown(wait=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-session HTTP/JSON game server")
+    parser.add_argument("--host", default=config.server_host)
+    parser.add_argument("--port", type=int, default=config.server_port)
+    parser.add_argument("--workers", type=int, default=config.server_workers)
+    parser.add_argument("--idle-timeout", type=float, default=config.server_idle_timeout)
+    parser.add_argument("--root", default=os.path.join(config.save_dir, "sessions"))
+    args = parser.parse_args()
+    server = GameServer(args.root, workers=args.workers, idle_timeout=args.idle_timeout)
+    print(f"Game server listening on http://{args.host}:{args.port}")
+
+    async def run():
+        try:
+            await server.serve(args.host, args.port)
+        finally:
+            await server.shutdown()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
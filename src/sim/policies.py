@@ -0,0 +1,84 @@
+import json
+import random
+from typing import List
+
+from src.game.game_manager import GameManager
+from src.game.model import Choice, Item
+
+
+class PlayerAction:
+    def __init__(self, option: Choice = None, item: Item = None):
+        self.option = option
+        self.item = item
+
+    def to_script(self, manager: GameManager):
+        # 与ScriptPolicy的格式一致: 选项序号（从1开始）或{"item": 物品名}
+        if self.item is not None:
+            return {"item": self.item.name}
+        return manager.get_current_round().choices.index(self.option) + 1
+
+
+class PlayerPolicy:
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+
+    def choose(self, manager: GameManager) -> PlayerAction:
+        return PlayerAction(option=self.rng.choice(manager.get_current_round().choices))
+
+
+class RandomChoicePolicy(PlayerPolicy):
+    pass
+
+
+class AlwaysRollPolicy(PlayerPolicy):
+    def choose(self, manager: GameManager) -> PlayerAction:
+        choices = manager.get_current_round().choices
+        rolls = [choice for choice in choices if choice.requires_roll]
+        return PlayerAction(option=self.rng.choice(rolls or choices))
+
+
+class UseItemsPolicy(PlayerPolicy):
+    def __init__(self, rng: random.Random, item_rate=0.3):
+        super().__init__(rng)
+        self.item_rate = item_rate
+
+    def choose(self, manager: GameManager) -> PlayerAction:
+        inventory = manager.get_inventory()
+        if inventory and self.rng.random() < self.item_rate:
+            return PlayerAction(item=self.rng.choice(inventory))
+        return super().choose(manager)
+
+
+class ScriptPolicy(PlayerPolicy):
+    # 按录制的脚本操作，脚本用完或不适用时随机选择
+    def __init__(self, rng: random.Random, script: List):
+        super().__init__(rng)
+        self.script = list(script)
+
+    def choose(self, manager: GameManager) -> PlayerAction:
+        if self.script:
+            step = self.script.pop(0)
+            if isinstance(step, dict):
+                for item in manager.get_inventory():
+                    if item.name == step.get("item"):
+                        return PlayerAction(item=item)
+            else:
+                choices = manager.get_current_round().choices
+                if 1 <= int(step) <= len(choices):
+                    return PlayerAction(option=choices[int(step) - 1])
+        return super().choose(manager)
+
+
+POLICIES = {
+    "random": RandomChoicePolicy,
+    "roll": AlwaysRollPolicy,
+    "items": UseItemsPolicy,
+    "script": ScriptPolicy,
+}
+
+
+def create_policy(name: str, rng: random.Random, script_file: str = None) -> PlayerPolicy:
+    if name == "script":
+        with open(script_file, 'r') as f:
+            return ScriptPolicy(rng, json.load(f))
+    return POLICIES[name](rng)
@@ -0,0 +1,196 @@
+import argparse
+import json
+import os
+import random
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import List
+
+from src import config
+
+# 无界面地同时运行多局游戏，用于容量规划
+# 用法: python -m src.sim.simulator --games 200 --workers 8 --threads-per-worker 4 --policy random [--fake]
+
+
+def _init_worker(overrides: dict):
+    # 子进程中在导入游戏模块之前修改config
+    for key, value in overrides.items():
+        setattr(config, key, value)
+
+
+def play_game(game_id: int, policy_name: str, turns: int, seed: int, save_root: str, script_file: str = None) -> dict:
+    from src.game.game_manager import GameManager
+    from src.sim.policies import create_policy
+
+    rng = random.Random(seed)
+    policy = create_policy(policy_name, rng, script_file)
+    result = {"game_id": game_id, "policy": policy_name, "turns": 0, "failed_turns": 0, "turn_seconds": [],
+              "actions": [], "completed": False, "game_over": False, "error": None}
+    started = time.perf_counter()
+    manager = None
+    try:
+        manager = GameManager(save_dir=os.path.join(save_root, f"game-{game_id}"))
+        manager.dice.seed(seed)
+        if not manager.start_new_game([]):
+            result["error"] = "start_failed"
+            return result
+        for _ in range(turns):
+            current_round = manager.get_current_round()
+            if current_round.game_over:
+                result["game_over"] = True
+                break
+            action = policy.choose(manager)
+            result["actions"].append(action.to_script(manager))
+            turn_started = time.perf_counter()
+            manager.process_option(option=action.option, item=action.item)
+            result["turn_seconds"].append(time.perf_counter() - turn_started)
+            if manager.get_current_round() is current_round:
+                result["failed_turns"] += 1
+            else:
+                result["turns"] += 1
+        manager.commit_pending_summary()
+        result["completed"] = True
+        result["gm_llm"] = manager.game_master.llm.stats
+        result["rk_llm"] = manager.record_keeper.llm.stats
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        if config.debug:
+            print(traceback.format_exc())
+    finally:
+        if manager is not None:
+            manager.close()
+        result["seconds"] = time.perf_counter() - started
+    return result
+
+
+def play_batch(games: List[tuple], sample_interval=0.2) -> dict:
+    # 在一个进程中用线程同时运行一批游戏，并采样本进程的LLM并发请求数
+    from src.llm.router import llm_in_flight
+    from src.llm.scheduler import scheduler
+
+    samples = []
+    queue_samples = []
+    stop = threading.Event()
+
+    def sample():
+        while not stop.wait(sample_interval):
+            samples.append(llm_in_flight())
+            queue_samples.append(scheduler.queue_depth())
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    with ThreadPoolExecutor(max_workers=len(games)) as executor:
+        results = list(executor.map(lambda args: play_game(*args), games))
+    stop.set()
+    sampler.join()
+    return {"pid": os.getpid(), "results": results, "in_flight_samples": samples, "queue_samples": queue_samples,
+            "scheduler": scheduler.snapshot()}
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def build_report(batches: List[dict], wall_seconds: float, args, server_stats=None) -> dict:
+    results = [result for batch in batches for result in batch["results"]]
+    turn_seconds = [t for result in results for t in result["turn_seconds"]]
+    turns = sum(result["turns"] for result in results)
+    errors = dict()
+    for result in results:
+        if result["error"]:
+            kind = result["error"].split(":")[0]
+            errors[kind] = errors.get(kind, 0) + 1
+    samples = [s for batch in batches for s in batch["in_flight_samples"]]
+    per_process_max = [max(batch["in_flight_samples"], default=0) for batch in batches]
+    queue_samples = [s for batch in batches for s in batch["queue_samples"]]
+    scheduler_totals = dict()
+    for batch in batches:
+        for key in ("requests", "queued", "wait_seconds", "deadline_exceeded", "cancelled"):
+            scheduler_totals[key] = scheduler_totals.get(key, 0) + batch["scheduler"][key]
+    return {
+        "games": len(results),
+        "completed_games": sum(1 for result in results if result["completed"]),
+        "game_over_games": sum(1 for result in results if result["game_over"]),
+        "policy": args.policy,
+        "workers": args.workers,
+        "threads_per_worker": args.threads_per_worker,
+        "wall_seconds": wall_seconds,
+        "turns": turns,
+        "turns_per_minute": turns / wall_seconds * 60 if wall_seconds else 0,
+        "failed_turns": sum(result["failed_turns"] for result in results),
+        "errors": errors,
+        "turn_seconds": {"p50": percentile(turn_seconds, 50), "p95": percentile(turn_seconds, 95),
+                         "max": max(turn_seconds, default=None)},
+        "llm_in_flight": {"mean_per_process": sum(samples) / len(samples) if samples else 0,
+                          "max_per_process": max(per_process_max, default=0)},
+        "llm_queue_depth": {"mean_per_process": sum(queue_samples) / len(queue_samples) if queue_samples else 0,
+                            "max_per_process": max((batch["scheduler"]["max_queue_depth"] for batch in batches),
+                                                   default=0)},
+        "scheduler": scheduler_totals,
+        "server": server_stats,
+        "game_results": [{k: v for k, v in result.items() if k != "turn_seconds"} for result in results],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless multi-game simulation runner")
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=20, help="maximum turns per game")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="worker processes")
+    parser.add_argument("--threads-per-worker", type=int, default=1, help="games run concurrently in each process")
+    parser.add_argument("--policy", default="random", choices=["random", "roll", "items", "script"])
+    parser.add_argument("--script", help="JSON list of 1-based choice numbers or {\"item\": name} for --policy script")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", help="Ollama url, defaults to config.ollama_url")
+    parser.add_argument("--fake", action="store_true", help="run against the built-in fake Ollama server")
+    parser.add_argument("--fake-token-rate", type=float, default=400.0)
+    parser.add_argument("--fake-failure-rate", type=float, default=0.0)
+    parser.add_argument("--save-root", default=os.path.join(config.save_dir, "simulations"))
+    parser.add_argument("--report", default="simulation_report.json")
+    args = parser.parse_args()
+    if args.policy == "script" and not args.script:
+        parser.error("--policy script requires --script")
+
+    server = None
+    # 每局都从头生成故事，结果不受故事池影响
+    overrides = {"debug": False, "story_pool_size": 0}
+    if args.fake:
+        from src.llm.fake_ollama import FakeOllamaServer
+        server = FakeOllamaServer(token_rate=args.fake_token_rate, failure_rate=args.fake_failure_rate,
+                                  seed=args.seed).start()
+        overrides["ollama_url"] = server.url
+    elif args.url:
+        overrides["ollama_url"] = args.url
+
+    games = [(game_id, args.policy, args.turns, args.seed + game_id, args.save_root, args.script)
+             for game_id in range(args.games)]
+    batch_size = max(1, args.threads_per_worker)
+    batches = [games[i:i + batch_size] for i in range(0, len(games), batch_size)]
+
+    started = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(overrides,)) as executor:
+        futures = [executor.submit(play_batch, batch) for batch in batches]
+        for future in as_completed(futures):
+            results.append(future.result())
+            done = sum(len(batch["results"]) for batch in results)
+            print(f"{done}/{len(games)} games finished")
+    wall_seconds = time.perf_counter() - started
+
+    report = build_report(results, wall_seconds, args, server.stats if server else None)
+    if server:
+        server.stop()
+    os.makedirs(os.path.dirname(os.path.abspath(args.report)), exist_ok=True)
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"{report['turns']} turns in {wall_seconds:.1f}s ({report['turns_per_minute']:.1f} turns/min), "
+          f"report written to {args.report}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+import tempfile
+
+from src import config
+
+# 游戏模块按名字导入config中的值，必须在导入它们之前修改
+config.save_dir = tempfile.mkdtemp(prefix="il-test-")
+config.debug = False
+config.story_pool_size = 0
+config.speculative_prefetch = False
+config.llm_cache = "off"
+# 较小的热记录上限，测试中的记录和向量也会写入段文件
+config.record_hot_limit = 8
+config.record_spill_batch = 4
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def game_state():
+    from src.game.game_state import GameState
+    from src.game.model import (Character, Choice, GameRecord, GameRound, GameStory, Item, KeyGameInformation,
+                                RecordType)
+
+    story = GameStory(title="测试 Saga", setting="A misty valley", main_conflict="The oath is broken",
+                      key_characters=[Character(name="Ayla", role="ally", description="A wandering blade")],
+                      key_items=[Item(name="Lantern", description="Never goes out")])
+    state = GameState(game_story=story, current_round=GameRound(
+        narrative="The gate opens.", choices=[Choice(text="Enter"), Choice(text="Wait", requires_roll=True)],
+        game_over=False))
+    for turn in range(12):
+        state.add_record(GameRecord(record_type=RecordType.TURN_DESCRIPTION, text=f"Turn {turn}: 狼群 in the mist"))
+        state.add_record(GameRecord(record_type=RecordType.PLAYER_CHOICE, text=f"Choice {turn}"))
+    state.add_item(Item(name="Relic", description="Hums \"softly\"\nat night"))
+    state.add_record(GameRecord(record_type=RecordType.ITEM_ACQUIRED, text="Relic:Hums softly"))
+    state.key_information = KeyGameInformation(plot_developments=["The gate opened"],
+                                               summary_of_recent_events="The party reached the valley.")
+    state.summary_cursor = 20
+    state.summary_tiers = [["Chapter one"]]
+    yield state
+    state.close()
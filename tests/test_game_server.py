@@ -0,0 +1,151 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+
+import pytest
+
+from src.server.game_server import GameServer
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = GameServer(str(tmp_path / "sessions"))
+    os.makedirs(server.root)
+    yield server
+    server.executor.shutdown(wait=False)
+
+
+def dispatch(server, method, target, body=b""):
+    return asyncio.run(server._dispatch(method, target, body))
+
+
+def create_session(server) -> str:
+    status, response = dispatch(server, "POST", "/sessions", b'{"new_game": false}')
+    assert status == 200
+    return response["session_id"]
+
+
+@pytest.mark.parametrize("session_id", ["..", "%2e%2e", ".", "..%2f..", "not-a-session"])
+def test_delete_rejects_traversal_ids(server, session_id):
+    first = create_session(server)
+    marker = os.path.join(server.root, first, "keep.json")
+    with open(marker, "w") as f:
+        f.write("{}")
+
+    status, response = dispatch(server, "DELETE", f"/sessions/{session_id}")
+
+    assert status == 404
+    assert os.path.isdir(server.root)
+    assert os.path.exists(marker)
+
+
+def test_delete_own_session(server):
+    session_id = create_session(server)
+    status, response = dispatch(server, "DELETE", f"/sessions/{session_id}")
+    assert status == 200
+    assert not os.path.exists(os.path.join(server.root, session_id))
+
+
+@pytest.mark.parametrize("save_file", ["../other/AUTO_SAVE.json", "..", "/etc/passwd", "a/b.json", "", None])
+def test_load_rejects_paths_outside_session(server, save_file):
+    victim = create_session(server)
+    with open(os.path.join(server.root, victim, "AUTO_SAVE.json"), "w") as f:
+        f.write("{}")
+    attacker = create_session(server)
+    body = ('{"save_file": %s}' % ("null" if save_file is None else f'"{save_file}"')).encode()
+
+    status, response = dispatch(server, "POST", f"/sessions/{attacker}/load", body)
+
+    assert status == 400
+
+
+def saved_session(server, game_state) -> str:
+    # 磁盘上有存档、不在内存中的session，第一次请求时恢复
+    from src.game.serialization import save_state
+
+    session_id = uuid.uuid4().hex
+    os.makedirs(os.path.join(server.root, session_id))
+    save_state(os.path.join(server.root, session_id, "AUTO_SAVE_test.json"), game_state)
+    return session_id
+
+
+def test_request_waiting_on_eviction_restores_session(server, game_state):
+    session_id = saved_session(server, game_state)
+
+    async def scenario():
+        status, response = await server._dispatch("GET", f"/sessions/{session_id}/round", b"")
+        assert status == 200
+        session = server.sessions[session_id]
+        closing, release = threading.Event(), threading.Event()
+        close = session.manager.close
+
+        def slow_close():
+            closing.set()
+            release.wait(5)
+            close()
+
+        session.manager.close = slow_close
+        server.idle_timeout = 0
+        evict = asyncio.create_task(server.evict_idle_sessions())
+        await asyncio.get_running_loop().run_in_executor(None, closing.wait, 5)
+        # 清理持有锁时到达的请求
+        request = asyncio.create_task(server._dispatch("GET", f"/sessions/{session_id}/round", b""))
+        await asyncio.sleep(0.05)
+        release.set()
+        await evict
+        server.idle_timeout = 600
+        status, response = await request
+        assert status == 200
+        assert response["round"]["narrative"] == game_state.current_round.narrative
+        assert server.sessions[session_id] is not session
+        assert server.stats == {"requests": 2, "evicted": 1, "restored": 2}
+
+    asyncio.run(scenario())
+
+
+def test_eviction_skips_session_used_while_waiting(server, game_state):
+    session_id = saved_session(server, game_state)
+
+    async def scenario():
+        await server._dispatch("GET", f"/sessions/{session_id}/round", b"")
+        session = server.sessions[session_id]
+        server.idle_timeout = 0.05
+        await asyncio.sleep(0.1)
+        async with session.lock:
+            evict = asyncio.create_task(server._evict(session_id, session))
+            await asyncio.sleep(0.01)
+            # 清理等锁期间session又被使用
+            session.last_active = time.monotonic()
+        await evict
+        assert server.sessions[session_id] is session
+        assert server.stats["evicted"] == 0
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("action, target, body", [
+    ("GET", "history?offset=abc", b""),
+    ("GET", "history?limit=1.5", b""),
+    ("GET", "history?offset=-1", b""),
+    ("GET", "history?limit=-5", b""),
+    ("GET", "history?q=mist&limit=x", b""),
+    ("POST", "choose", b'{"choice": "first"}'),
+    ("POST", "choose", b'{"choice": null}'),
+    ("POST", "choose", b'{"choice": 0}'),
+    ("POST", "choose", b'{"choice": 1.5}'),
+    ("POST", "choose", b'{"choice": true}'),
+])
+def test_invalid_numbers_are_bad_requests(server, game_state, action, target, body):
+    session_id = saved_session(server, game_state)
+    status, response = dispatch(server, action, f"/sessions/{session_id}/{target}", body)
+    assert status == 400
+
+
+def test_history_paging(server, game_state):
+    session_id = saved_session(server, game_state)
+    status, response = dispatch(server, "GET", f"/sessions/{session_id}/history?offset=2&limit=3")
+    assert status == 200
+    assert response["total"] == len(game_state.records)
+    assert response["records"] == game_state.records.to_dicts(2, 5)
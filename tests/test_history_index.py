@@ -0,0 +1,44 @@
+from src.game.model import GameRecord, RecordType
+
+
+def brute_force(state, query, record_types=None):
+    from src.game.memory import tokenize
+
+    tokens = set(tokenize(query))
+    return [i for i, record in enumerate(state.records)
+            if (record_types is None or record.record_type in record_types)
+            and tokens <= set(tokenize(record.text))]
+
+
+def test_search_matches_scan(game_state):
+    index = game_state.history_index
+    for query, record_types in [("mist", None), ("狼群", None), ("狼", [RecordType.TURN_DESCRIPTION]),
+                                ("choice 3", None), ("", [RecordType.ITEM_ACQUIRED]), ("relic", None)]:
+        assert index.search(query, record_types) == brute_force(game_state, query, record_types)
+
+
+def test_empty_query_returns_all(game_state):
+    assert game_state.history_index.search() == list(range(len(game_state.records)))
+
+
+def test_no_match(game_state):
+    assert game_state.history_index.search("dragon") == []
+    # 只有标点，分不出任何词
+    assert game_state.history_index.search("!!") == []
+
+
+def test_updates_after_first_search(game_state):
+    index = game_state.history_index
+    assert index.search("dragon") == []
+    game_state.add_record(GameRecord(record_type=RecordType.TURN_DESCRIPTION, text="A dragon lands"))
+    game_state.add_record(GameRecord(record_type=RecordType.PLAYER_CHOICE, text="Fight the dragon"))
+
+    assert index.search("dragon") == [len(game_state.records) - 2, len(game_state.records) - 1]
+    assert index.search("dragon", [RecordType.PLAYER_CHOICE]) == [len(game_state.records) - 1]
+    assert len(index) == len(game_state.records)
+
+
+def test_covers_archived_records(game_state):
+    # conftest中hot_limit很小，最早的记录已经写入段文件
+    assert game_state.records.archived > 0
+    assert game_state.history_index.search("turn 0") == [0]
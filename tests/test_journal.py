@@ -0,0 +1,87 @@
+import os
+
+import pytest
+
+from src.game.journal import JOURNAL_FILE, GameJournal, read_journal_info
+from src.game.model import GameRecord, GameRound, Choice, Item, RecordType
+
+
+def play(state, turns, start=0):
+    for turn in range(start, start + turns):
+        state.add_record(GameRecord(record_type=RecordType.PLAYER_CHOICE, text=f"Choice {turn}"))
+        state.add_record(GameRecord(record_type=RecordType.TURN_DESCRIPTION, text=f"Turn {turn} narrative"))
+        state.current_round = GameRound(narrative=f"Turn {turn} narrative", choices=[Choice(text="Go on")],
+                                        game_over=False)
+
+
+def assert_same_state(loaded, state):
+    assert loaded.records.to_dicts() == state.records.to_dicts()
+    assert loaded.current_round == state.current_round
+    assert loaded.inventory == state.inventory
+    assert loaded.key_information == state.key_information
+    assert loaded.summary_cursor == state.summary_cursor
+    assert loaded.turns == state.turns
+
+
+@pytest.mark.parametrize("snapshot_interval", [1, 2, 50])
+def test_round_trip(game_state, tmp_path, snapshot_interval):
+    journal = GameJournal(str(tmp_path / "save.journal"), snapshot_interval=snapshot_interval)
+    journal.save(game_state)
+    for step in range(5):
+        play(game_state, 3, start=100 + step * 3)
+        if step == 2:
+            game_state.add_item(Item(name="Key", description="Opens the gate"))
+            game_state.remove_item(Item(name="Relic", description=""))
+        journal.save(game_state)
+
+    loaded = GameJournal(journal.path).load()
+
+    assert_same_state(loaded, game_state)
+    loaded.close()
+
+
+@pytest.mark.parametrize("torn", [b'{"records": [{"record_type"', b"\n", b'{"current_round": nul'])
+def test_torn_last_line(game_state, tmp_path, torn):
+    journal = GameJournal(str(tmp_path / "save.journal"), snapshot_interval=2)
+    journal.save(game_state)
+    play(game_state, 3)
+    journal.save(game_state)
+    play(game_state, 2, start=3)
+    journal.save(game_state)
+    path = os.path.join(journal.path, JOURNAL_FILE)
+    size = os.path.getsize(path)
+    # 保存时被中断，最后一行只写了一半
+    with open(path, 'ab') as f:
+        f.write(torn)
+
+    info = read_journal_info(journal.path)
+
+    # 只读扫描不截断文件
+    assert os.path.getsize(path) == size + len(torn)
+    assert info == {"title": game_state.game_story.title, "turns": game_state.turns, "game_over": False}
+
+    loaded = GameJournal(journal.path).load()
+
+    assert_same_state(loaded, game_state)
+    assert os.path.getsize(path) == size
+    loaded.close()
+
+
+def test_save_after_torn_recovery(game_state, tmp_path):
+    journal = GameJournal(str(tmp_path / "save.journal"))
+    journal.save(game_state)
+    play(game_state, 2)
+    journal.save(game_state)
+    with open(os.path.join(journal.path, JOURNAL_FILE), 'ab') as f:
+        f.write(b'{"records": [')
+
+    reopened = GameJournal(journal.path)
+    loaded = reopened.load()
+    play(loaded, 2, start=2)
+    reopened.save(loaded)
+
+    final = GameJournal(journal.path).load()
+
+    assert_same_state(final, loaded)
+    loaded.close()
+    final.close()
@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from src.llm.json_repair import parse_with_repair, repair_json
+
+
+@pytest.mark.parametrize("text, expected", [
+    # 代码块包裹、前后多余文字
+    ('```json\n{"a": 1}\n```', {"a": 1}),
+    ('Here you go:\n{"a": [1, 2]}\nHope this helps!', {"a": [1, 2]}),
+    # 结尾多余逗号
+    ('{"a": [1, 2,], "b": {"c": 3,},}', {"a": [1, 2], "b": {"c": 3}}),
+    ('{"a": [1, 2 ,\n ]\n,\n}', {"a": [1, 2]}),
+    # 截断导致未闭合
+    ('{"a": {"b": [1, 2', {"a": {"b": [1, 2]}}),
+    ('{"a": "unterminated', {"a": "unterminated"}),
+    ('{"a": 1, "b"', {"a": 1}),
+    ('{"a": 1, "b":', {"a": 1}),
+    ('{"a": [1,', {"a": [1]}),
+    ('{"a": "ends with escape \\', {"a": "ends with escape "}),
+    # 字符串中的换行
+    ('{"a": "line one\nline two"}', {"a": "line one\nline two"}),
+])
+def test_repairs(text, expected):
+    assert json.loads(repair_json(text)) == expected
+
+
+@pytest.mark.parametrize("value", ["a,}", "a,]", "[1,]", "{,}", "x , ] y"])
+def test_commas_inside_strings_are_kept(value):
+    text = json.dumps({"narrative": value, "choices": [value]}) + "\n"
+    assert json.loads(repair_json(text)) == {"narrative": value, "choices": [value]}
+
+
+def test_trailing_comma_next_to_string_with_brackets():
+    assert json.loads(repair_json('{"a": "}],", "b": ["[,]",],}')) == {"a": "}],", "b": ["[,]"]}
+
+
+@pytest.mark.parametrize("text", ["", "no json here", '{"a": ]'])
+def test_unrepairable(text):
+    assert repair_json(text) is None
+
+
+def test_stops_after_first_object():
+    assert json.loads(repair_json('{"a": 1} {"b": 2}')) == {"a": 1}
+
+
+class JsonParser:
+    def parse(self, text):
+        return json.loads(text)
+
+
+def test_parse_with_repair_counts_repairs():
+    stats = dict()
+    assert parse_with_repair(JsonParser(), '{"a": 1}', stats) == {"a": 1}
+    assert stats == {}
+    assert parse_with_repair(JsonParser(), '```json\n{"a": [1,],\n```', stats) == {"a": [1]}
+    assert stats == {"repairs": 1}
+
+
+def test_parse_with_repair_raises_original_error():
+    with pytest.raises(ValueError):
+        parse_with_repair(JsonParser(), "no json here")
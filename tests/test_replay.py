@@ -0,0 +1,72 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from src import config
+from src.llm.fake_ollama import FakeOllamaServer
+
+TURNS = 8
+
+
+@pytest.fixture
+def fake_ollama(monkeypatch, tmp_path):
+    server = FakeOllamaServer(token_rate=2000, ttft=0.01, narrative_words=80).start()
+    monkeypatch.setattr(config, "ollama_url", server.url)
+    monkeypatch.setattr(config, "llm_seed", 7)
+    monkeypatch.setattr(config, "llm_cache_dir", str(tmp_path / "cache"))
+    yield server
+    server.httpd.shutdown()
+
+
+def play(monkeypatch, tmp_path, mode: str, think: float) -> list:
+    from src.game import game_manager
+
+    monkeypatch.setattr(config, "llm_cache", mode)
+    # GameManager按名字导入这些值
+    monkeypatch.setattr(game_manager, "llm_cache", mode)
+    monkeypatch.setattr(game_manager, "llm_seed", 7)
+    monkeypatch.setattr(game_manager, "dice_seed", 7)
+    monkeypatch.setattr(game_manager, "pipeline_turns", True)
+    # 每回合都安排RK总结，GM是否看到新总结取决于提交时机
+    monkeypatch.setattr(game_manager, "rk_summary_token_threshold", 1)
+    manager = game_manager.GameManager(save_dir=str(tmp_path / mode))
+    try:
+        assert manager.start_new_game(["replay"])
+        narratives = [manager.get_current_round().narrative]
+        for _ in range(TURNS):
+            # 录制时玩家思考，后台RK在下一回合开始前已经完成；回放时立即选择
+            time.sleep(think)
+            manager.process_option(manager.get_current_round().choices[0])
+            narratives.append(manager.get_current_round().narrative)
+        manager.commit_pending_summary()
+        return narratives
+    finally:
+        manager.close()
+
+
+def test_replay_without_think_time(fake_ollama, monkeypatch, tmp_path):
+    recorded = play(monkeypatch, tmp_path, "on", think=0.3)
+    # replay模式下请求不在缓存中时抛出CacheMiss
+    replayed = play(monkeypatch, tmp_path, "replay", think=0)
+    assert replayed == recorded
+
+
+def test_close_releases_threads_and_index(monkeypatch, tmp_path):
+    from src.game import game_manager
+
+    monkeypatch.setattr(game_manager, "speculative_prefetch", True)
+    manager = game_manager.GameManager(save_dir=str(tmp_path))
+    before = set(threading.enumerate())
+    manager._rk_executor.submit(time.sleep, 0).result()
+    manager.speculator._executor.submit(time.sleep, 0).result()
+    conn = manager.save_index._connection()
+    workers = set(threading.enumerate()) - before
+    assert workers
+    manager.close()
+    for worker in workers:
+        worker.join(timeout=5)
+        assert not worker.is_alive()
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute("SELECT 1")
@@ -0,0 +1,40 @@
+import pytest
+
+from src import config
+from src.llm.router import RoleLLM, get_fallback_config
+
+
+@pytest.fixture
+def small_fallback(monkeypatch):
+    # 与config.py中的示例相同：RK主模型窗口较大，备用模型较小
+    monkeypatch.setattr(config, "role_configs", {
+        "record_keeper": {"model": "small", "num_ctx": 16384, "num_predict": 1024,
+                          "fallback": {"model": "large", "num_ctx": 10240}, "fallback_after": 1},
+    })
+
+
+def test_fallback_inherits_role_fields(small_fallback):
+    fallback = get_fallback_config("record_keeper")
+    assert fallback["model"] == "large"
+    assert fallback["num_ctx"] == 10240
+    assert fallback["num_predict"] == 1024
+    assert "fallback" not in fallback and "fallback_after" not in fallback
+
+
+def test_context_limits_use_smaller_window(small_fallback):
+    llm = RoleLLM("record_keeper")
+    assert llm.route(0) == "primary" and llm.route(1) == "fallback"
+    assert llm.context_limits() == (10240, 1024)
+
+
+def test_context_limits_without_fallback(monkeypatch):
+    monkeypatch.setattr(config, "role_configs", {"game_master": {"num_ctx": 4096, "num_predict": 512}})
+    assert RoleLLM("game_master").context_limits() == (4096, 512)
+
+
+def test_record_keeper_packs_for_fallback(small_fallback, game_state):
+    from src.llm.record_keeper import RecordKeeper
+
+    record_keeper = RecordKeeper(game_story=game_state.game_story)
+    assert record_keeper.context.num_ctx == 10240
+    assert record_keeper.context.input_budget == 10240 - 1024
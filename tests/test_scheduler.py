@@ -0,0 +1,217 @@
+import threading
+import time
+
+import pytest
+
+from src import config
+from src.llm.scheduler import DeadlineExceeded, LLMScheduler, Priority, RequestCancelled, make_request_context, \
+    request_context
+
+BACKEND = "http://ollama"
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    monkeypatch.setattr(config, "scheduler_max_in_flight", 1)
+    monkeypatch.setattr(config, "scheduler_backend_limits", {})
+    return LLMScheduler()
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+class Holder:
+    # 在后台线程中占用一个名额，直到release
+    def __init__(self, scheduler, priority=Priority.INTERACTIVE, backend=BACKEND):
+        self.acquired = threading.Event()
+        self._release = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(scheduler, backend, priority), daemon=True)
+        self.thread.start()
+        assert self.acquired.wait(5)
+
+    def _run(self, scheduler, backend, priority):
+        with scheduler.slot(backend, priority):
+            self.acquired.set()
+            self._release.wait(5)
+
+    def release(self):
+        self._release.set()
+        self.thread.join(5)
+
+
+def queue_requests(scheduler, requests, order, errors=None):
+    # requests: [(name, priority, context)]，按顺序排队，全部进入队列后返回
+    threads = []
+    for name, priority, context in requests:
+        def run(name=name, priority=priority, context=context):
+            try:
+                with request_context(context):
+                    with scheduler.slot(BACKEND, priority):
+                        order.append(name)
+            except Exception as e:
+                if errors is None:
+                    raise
+                errors[name] = e
+
+        thread = threading.Thread(target=run, daemon=True)
+        expected = scheduler.queue_depth(BACKEND) + 1
+        thread.start()
+        wait_until(lambda: scheduler.queue_depth(BACKEND) >= expected)
+        threads.append(thread)
+    return threads
+
+
+def test_priority_order(scheduler):
+    holder = Holder(scheduler)
+    order = []
+    threads = queue_requests(scheduler, [
+        ("pregen", Priority.PREGENERATION, None),
+        ("speculative-1", Priority.SPECULATIVE, None),
+        ("summary", Priority.SUMMARY, None),
+        ("speculative-2", Priority.SPECULATIVE, None),
+        ("interactive", Priority.INTERACTIVE, None),
+    ], order)
+    assert scheduler.snapshot()["backends"][BACKEND]["queued_by_priority"] == \
+        {"PREGENERATION": 1, "SPECULATIVE": 2, "SUMMARY": 1, "INTERACTIVE": 1}
+
+    holder.release()
+    for thread in threads:
+        thread.join(5)
+
+    # 优先级相同时先到先得
+    assert order == ["interactive", "summary", "speculative-1", "speculative-2", "pregen"]
+
+
+def test_context_priority_overrides_default(scheduler):
+    holder = Holder(scheduler)
+    order = []
+    threads = queue_requests(scheduler, [
+        ("default", Priority.INTERACTIVE, make_request_context(Priority.PREGENERATION)),
+        ("summary", Priority.SUMMARY, None),
+    ], order)
+    holder.release()
+    for thread in threads:
+        thread.join(5)
+    assert order == ["summary", "default"]
+
+
+def test_promote_moves_queued_request_ahead(scheduler):
+    holder = Holder(scheduler)
+    order = []
+    context = make_request_context(Priority.SPECULATIVE, timeout=60)
+    threads = queue_requests(scheduler, [
+        ("summary", Priority.SUMMARY, None),
+        ("branch", Priority.SPECULATIVE, context),
+    ], order)
+
+    scheduler.promote(context, Priority.INTERACTIVE)
+    holder.release()
+    for thread in threads:
+        thread.join(5)
+
+    assert order == ["branch", "summary"]
+    assert context.deadline is None
+
+
+@pytest.mark.parametrize("default_limit, backend_limits, expected", [
+    (1, {}, 1),
+    (3, {}, 3),
+    (1, {BACKEND: 2}, 2),
+])
+def test_in_flight_limit(scheduler, monkeypatch, default_limit, backend_limits, expected):
+    monkeypatch.setattr(config, "scheduler_max_in_flight", default_limit)
+    monkeypatch.setattr(config, "scheduler_backend_limits", backend_limits)
+    lock = threading.Lock()
+    active, peak = [0], [0]
+
+    def run():
+        with scheduler.slot(BACKEND, Priority.INTERACTIVE):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+
+    threads = [threading.Thread(target=run) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert peak[0] == expected
+    assert scheduler.snapshot()["backends"][BACKEND] == {"in_flight": 0, "queue_depth": 0, "queued_by_priority": {},
+                                                         "limit": expected}
+
+
+def test_backends_are_limited_separately(scheduler):
+    holder = Holder(scheduler)
+    other = Holder(scheduler, backend="http://other")
+    assert scheduler.snapshot()["backends"]["http://other"]["in_flight"] == 1
+    holder.release()
+    other.release()
+
+
+def test_cancelled_while_queued(scheduler):
+    holder = Holder(scheduler)
+    cancel = threading.Event()
+    order, errors = [], dict()
+    threads = queue_requests(scheduler, [
+        ("cancelled", Priority.SPECULATIVE, make_request_context(cancel_event=cancel)),
+        ("kept", Priority.SPECULATIVE, None),
+    ], order, errors)
+
+    cancel.set()
+    threads[0].join(5)
+    holder.release()
+    threads[1].join(5)
+
+    assert isinstance(errors["cancelled"], RequestCancelled)
+    assert order == ["kept"]
+    assert scheduler.stats["cancelled"] == 1
+    assert scheduler.queue_depth() == 0
+
+
+def test_deadline_while_queued(scheduler):
+    holder = Holder(scheduler)
+    order, errors = [], dict()
+    threads = queue_requests(scheduler, [
+        ("late", Priority.SPECULATIVE, make_request_context(timeout=0.05)),
+    ], order, errors)
+    threads[0].join(5)
+    holder.release()
+
+    assert isinstance(errors["late"], DeadlineExceeded)
+    assert order == []
+    assert scheduler.stats["deadline_exceeded"] == 1
+
+
+def test_cancel_does_not_abort_running_request(scheduler):
+    cancel = threading.Event()
+    with request_context(make_request_context(cancel_event=cancel)):
+        with scheduler.slot(BACKEND, Priority.SPECULATIVE):
+            cancel.set()
+    assert scheduler.stats["cancelled"] == 0
+
+
+def test_busy(scheduler):
+    assert not scheduler.busy()
+    pregen = Holder(scheduler, Priority.PREGENERATION)
+    # 只有预生成请求时视为空闲
+    assert not scheduler.busy()
+    order = []
+    threads = queue_requests(scheduler, [("summary", Priority.SUMMARY, None)], order)
+    assert scheduler.busy()
+    assert not scheduler.busy(below=Priority.SUMMARY)
+    pregen.release()
+    threads[0].join(5)
+    assert not scheduler.busy()
+
+    interactive = Holder(scheduler, Priority.INTERACTIVE)
+    assert scheduler.busy(below=Priority.SUMMARY)
+    interactive.release()
+    assert not scheduler.busy()
@@ -0,0 +1,134 @@
+import gzip
+import json
+import sys
+
+import pytest
+
+from src.game import serialization
+from src.game.serialization import GZIP_MAGIC, ZSTD_MAGIC, SAVE_VERSION, decode_state, encode_state, load_state, \
+    migrate, read_save_info, save_state
+
+
+def assert_same_state(loaded, state, legacy=False):
+    assert loaded.game_story == state.game_story
+    assert loaded.current_round == state.current_round
+    assert loaded.inventory == state.inventory
+    assert loaded.records.to_dicts() == state.records.to_dicts()
+    assert loaded.key_information == state.key_information
+    assert loaded.turns == state.turns
+    if legacy:
+        # 旧存档没有summary_cursor，视为已经总结到最后
+        assert loaded.summary_cursor == len(state.records)
+        assert loaded.summary_tiers == []
+    else:
+        assert loaded.summary_cursor == state.summary_cursor
+        assert loaded.summary_tiers == state.summary_tiers
+
+
+def legacy_save(state) -> bytes:
+    # version 1: 每个模型先编码成JSON字符串，外层再编码一次
+    return json.dumps({
+        "game_story": state.game_story.model_dump_json(),
+        "current_round": state.current_round.model_dump_json(),
+        "inventory": [item.model_dump_json() for item in state.inventory.values()],
+        "records": [json.dumps(record) for record in state.records.to_dicts()],
+        "key_information": state.key_information.model_dump_json(),
+    }).encode("utf-8")
+
+
+@pytest.mark.parametrize("compression", ["", "gzip", "zstd"])
+def test_round_trip(game_state, compression):
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    loaded = decode_state(encode_state(game_state, compression=compression))
+    assert_same_state(loaded, game_state)
+    game_state.memory.flush()
+    loaded.memory.flush()
+    assert (loaded.memory.vectors() == game_state.memory.vectors()).all()
+    loaded.close()
+
+
+def test_hashed_vectors_not_saved(game_state):
+    game_state.memory.flush()
+    assert json.loads(encode_state(game_state, compression=""))["memory"] is None
+    loaded = decode_state(encode_state(game_state, compression=""))
+    assert loaded.memory.embedded_count == 0
+    assert len(loaded.memory) == len(game_state.records)
+    loaded.close()
+
+
+def test_persisted_vectors_reused(game_state):
+    game_state.memory.embedder.persist = True
+    data = json.loads(encode_state(game_state, compression=""))
+    assert data["memory"]["count"] == len(game_state.records)
+    loaded = decode_state(encode_state(game_state, compression=""))
+    assert loaded.memory.embedded_count == len(game_state.records)
+    assert (loaded.memory.vectors() == game_state.memory.vectors()).all()
+    loaded.close()
+
+
+def test_encoded_once(game_state):
+    data = json.loads(encode_state(game_state, compression=""))
+    assert data["version"] == SAVE_VERSION
+    assert isinstance(data["game_story"], dict)
+    assert isinstance(data["records"][0], dict)
+
+
+def test_migrates_version_1(game_state, tmp_path):
+    path = tmp_path / "legacy.json"
+    path.write_bytes(legacy_save(game_state))
+
+    loaded = load_state(str(path))
+
+    assert_same_state(loaded, game_state, legacy=True)
+    assert read_save_info(str(path)) == {"title": game_state.game_story.title, "turns": game_state.turns,
+                                         "game_over": False}
+    loaded.close()
+
+
+def test_migrate_leaves_current_version():
+    data = {"version": SAVE_VERSION, "game_story": "not parsed"}
+    assert migrate(data) is data
+
+
+@pytest.mark.parametrize("compression, magic", [("gzip", GZIP_MAGIC), ("zstd", ZSTD_MAGIC)])
+def test_format_sniffed_from_header(game_state, tmp_path, compression, magic):
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    # 文件名与压缩格式无关
+    path = tmp_path / "save.json"
+    save_state(str(path), game_state, compression=compression)
+    assert path.read_bytes().startswith(magic)
+
+    loaded = load_state(str(path))
+
+    assert_same_state(loaded, game_state)
+    assert read_save_info(str(path))["turns"] == game_state.turns
+    loaded.close()
+
+
+def test_plain_save_is_not_decompressed(game_state):
+    data = encode_state(game_state, compression="")
+    assert serialization.decompress(data) is data
+
+
+def test_gzip_legacy_save(game_state):
+    loaded = decode_state(gzip.compress(legacy_save(game_state)))
+    assert_same_state(loaded, game_state, legacy=True)
+    loaded.close()
+
+
+def test_zstd_requires_package(game_state, monkeypatch):
+    # sys.modules中为None时import会抛出ImportError，相当于没有安装zstandard
+    monkeypatch.setitem(sys.modules, "zstandard", None)
+    with pytest.raises(ImportError, match="pip install zstandard"):
+        decode_state(ZSTD_MAGIC + b"payload")
+    with pytest.raises(ImportError, match="pip install zstandard"):
+        encode_state(game_state, compression="zstd")
+    # gzip存档不需要zstandard
+    assert_same_state(decode_state(encode_state(game_state, compression="gzip")), game_state)
+
+
+def test_unknown_compression(game_state):
+    with pytest.raises(ValueError):
+        encode_state(game_state, compression="lz4")
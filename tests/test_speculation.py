@@ -0,0 +1,106 @@
+import random
+import threading
+
+from src.game.model import Choice, GameRound
+from src.game.speculation import Speculator, make_choice_record
+from src.llm.context import ContextWindow
+
+
+def game_round() -> GameRound:
+    return GameRound(narrative="A fork in the road.", game_over=False, choices=[
+        Choice(text="Climb", requires_roll=True, success_threshold=12),
+        Choice(text="Walk around"),
+        Choice(text="Jump", requires_roll=True),
+    ])
+
+
+def echo(player_choice: str) -> GameRound:
+    return GameRound(narrative=player_choice, choices=[Choice(text="Go on")], game_over=False)
+
+
+def rolls(speculate: bool, turns=20) -> list:
+    # 每回合选择需要掷骰的第一个选项，返回实际提交的记录
+    dice = random.Random(42)
+    speculator = Speculator(max_branches=3)
+    records = []
+    for turn in range(turns):
+        current = game_round()
+        if speculate:
+            speculator.start(current, dice, echo)
+        index = turn % 2 * 2
+        record = make_choice_record(current.choices[index], dice)
+        if speculate:
+            branch = speculator.take(index, record)
+            assert branch is not None and branch.result().narrative == str(record)
+        records.append(record)
+    return records
+
+
+def test_preroll_does_not_advance_dice():
+    assert rolls(speculate=True) == rolls(speculate=False)
+
+
+def test_take_requires_matching_roll():
+    dice = random.Random(1)
+    speculator = Speculator()
+    current = game_round()
+    speculator.start(current, dice, echo)
+    other = make_choice_record(current.choices[0], random.Random(2))
+
+    assert speculator.take(0, other) is None
+    assert speculator.stats["misses"] == 1
+    assert speculator.stats["wasted"] == 2
+
+
+def test_take_by_index():
+    dice = random.Random(1)
+    speculator = Speculator()
+    current = game_round()
+    speculator.start(current, dice, echo)
+    record = make_choice_record(current.choices[1], dice)
+
+    branch = speculator.take(1, record)
+
+    assert branch is not None and branch.choice == current.choices[1]
+    assert speculator.take(None) is None
+
+
+def test_discarded_branches_are_cancelled():
+    started, release = threading.Event(), threading.Event()
+
+    def blocking(player_choice):
+        started.set()
+        release.wait(5)
+        return echo(player_choice)
+
+    speculator = Speculator(max_workers=1, max_branches=2)
+    speculator.start(game_round(), random.Random(0), blocking)
+    assert started.wait(5)
+    queued = speculator._branches[1]
+    speculator.discard()
+    release.set()
+    assert queued.future.cancelled() and queued.context.cancel_event.is_set()
+
+
+def test_forked_context_keeps_last_prompt():
+    window = ContextWindow("game_master", num_ctx=1000, num_predict=100)
+    window.record("rules\nturn one")
+    fork = window.fork()
+
+    usage = fork.record("rules\nspeculative branch")
+
+    assert usage["prefix_tokens"] > 0
+    assert window.last_usage["prompt_chars"] == len("rules\nturn one")
+    assert len(window.usage_log) == 1
+    # 真实回合仍然与上一次真实的prompt比较
+    assert window.record("rules\nturn one\nturn two")["prefix_reuse"] > 0.5
+
+
+def test_game_master_fork(game_state):
+    from src.llm.game_master import GameMaster
+
+    game_master = GameMaster(game_state.game_story)
+    fork = game_master.fork()
+
+    assert fork.context is not game_master.context
+    assert fork.llm is game_master.llm and fork.prompt is game_master.prompt